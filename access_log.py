@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger('access')
+
+# Access log configuration
+SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "1.0"))  # fraction of ordinary requests logged
+SLOW_REQUEST_MS = float(os.environ.get("ACCESS_LOG_SLOW_MS", "1000"))  # slower requests are always logged
+LOG_BODIES = os.environ.get("ACCESS_LOG_BODIES", "false").lower() in ("1", "true", "yes")  # debugging only
+BODY_LOG_MAX_BYTES = int(os.environ.get("ACCESS_LOG_BODY_MAX_BYTES", "2048"))
+
+class UpstreamTimings:
+    """Time spent in upstream calls (OpenAI, SMTP) while serving one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            self.seconds[kind] = self.seconds.get(kind, 0.0) + seconds
+
+    def as_fields(self) -> Dict[str, float]:
+        with self._lock:
+            fields = {}
+            for kind, calls in self.calls.items():
+                fields[f"{kind}_calls"] = calls
+                fields[f"{kind}_ms"] = round(self.seconds[kind] * 1000, 1)
+            return fields
+
+# Set for the duration of each request; worker threads see it through copied contexts
+_upstream: contextvars.ContextVar[Optional[UpstreamTimings]] = contextvars.ContextVar('upstream_timings', default=None)
+
+def record_upstream(kind: str, seconds: float) -> None:
+    """Attribute an upstream call to the request being served, if any."""
+    timings = _upstream.get()
+    if timings is not None:
+        timings.add(kind, seconds)
+
+class _CappedTee:
+    """Wraps wsgi.input and keeps a copy of the first max_bytes the application reads."""
+
+    def __init__(self, stream, max_bytes: int):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self.captured = bytearray()
+
+    def _keep(self, data: bytes) -> bytes:
+        room = self._max_bytes - len(self.captured)
+        if room > 0 and data:
+            self.captured += data[:room]
+        return data
+
+    def read(self, *args):
+        return self._keep(self._stream.read(*args))
+
+    def readline(self, *args):
+        return self._keep(self._stream.readline(*args))
+
+    def __iter__(self):
+        for line in self._stream:
+            yield self._keep(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+class _LoggedResponse:
+    """Response iterable that counts bytes sent and logs the request when it is closed."""
+
+    def __init__(self, body: Iterable[bytes], on_close: Callable[[int], None]):
+        self._body = body
+        self._on_close = on_close
+        self.bytes_sent = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close(self.bytes_sent)
+
+class AccessLogMiddleware:
+    """
+    WSGI middleware writing one structured, sampled access-log line per request.
+
+    The line carries method, path, status, duration, request/response byte counts and
+    the time spent in upstream LLM/SMTP calls. Durations and byte counts cover streamed
+    responses until the last chunk is sent. Request bodies are never buffered; with
+    ACCESS_LOG_BODIES enabled, the first ACCESS_LOG_BODY_MAX_BYTES the application reads
+    are logged as well. Errors and slow requests are always logged.
+    """
+
+    def __init__(self, wsgi_app, sample_rate: float = SAMPLE_RATE, log_bodies: bool = LOG_BODIES):
+        self.wsgi_app = wsgi_app
+        self.sample_rate = sample_rate
+        self.log_bodies = log_bodies
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        timings = UpstreamTimings()
+        token = _upstream.set(timings)
+        status = {}
+        tee = None
+        if self.log_bodies:
+            tee = environ['wsgi.input'] = _CappedTee(environ['wsgi.input'], BODY_LOG_MAX_BYTES)
+
+        def capture_status(status_line, headers, exc_info=None):
+            status['code'] = int(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        def finish(bytes_sent: int) -> None:
+            try:
+                _upstream.reset(token)
+            except ValueError:
+                pass  # Closed from another context; nothing left to reset
+            self._log(environ, status.get('code', 500), time.perf_counter() - started, bytes_sent, timings, tee)
+
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except Exception:
+            finish(0)
+            raise
+        return _LoggedResponse(body, finish)
+
+    def _log(self, environ, status: int, duration: float, bytes_sent: int, timings: UpstreamTimings, tee: Optional[_CappedTee]) -> None:
+        duration_ms = duration * 1000
+        if status < 500 and duration_ms < SLOW_REQUEST_MS and random.random() >= self.sample_rate:
+            return
+        entry = {
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'status': status,
+            'duration_ms': round(duration_ms, 1),
+            'request_bytes': int(environ.get('CONTENT_LENGTH') or 0),
+            'response_bytes': bytes_sent,
+            **timings.as_fields()
+        }
+        if tee is not None and tee.captured:
+            entry['body'] = tee.captured.decode('utf-8', errors='replace')
+        logger.info(json.dumps(entry))
+
+def init_app(app) -> None:
+    app.wsgi_app = AccessLogMiddleware(app.wsgi_app)
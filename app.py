@@ -1,86 +1,159 @@
 import os
 import logging
-from flask import Flask, jsonify, request
+import threading
+from typing import Any, Dict, List, Optional
+import click
+from flask import Flask, jsonify
+from flask.cli import with_appcontext
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 from werkzeug.exceptions import HTTPException
+from extensions import database_config, db, login_manager
+from uploads import UploadRequest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class Base(DeclarativeBase):
-    pass
-
-db = SQLAlchemy(model_class=Base)
-app = Flask(__name__)
-
-# Enable CORS
-CORS(app)
-
-# Setup configurations
-app.secret_key = os.environ.get("FLASK_SECRET_KEY", "default-secret-key")
-
-# Configure database URL with proper formatting
-db_url = os.environ.get("DATABASE_URL")
-if db_url and db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Initialize database
-db.init_app(app)
-
-# Request logging
-@app.before_request
-def log_request_info():
-    logger.info('Headers: %s', request.headers)
-    logger.info('Body: %s', request.get_data())
-
-# Error handlers
-@app.errorhandler(400)
-def bad_request_error(error):
-    logger.error(f"400 Bad Request: {error}")
-    return jsonify({"error": str(error)}), 400
-
-@app.errorhandler(404)
-def not_found_error(error):
-    logger.error(f"404 Not Found: {error}")
-    return jsonify({"error": "Resource not found"}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    logger.error(f"500 Internal Server Error: {error}")
-    return jsonify({"error": "Internal server error"}), 500
-
-@app.errorhandler(HTTPException)
-def handle_http_error(error):
-    logger.error(f"HTTP Exception: {error}")
-    response = jsonify({
-        "error": str(error.description),
-        "code": error.code
-    })
-    return response, error.code
-
-@app.errorhandler(Exception)
-def handle_exception(error):
-    logger.error(f"Unhandled Exception: {error}", exc_info=True)
-    return jsonify({
-        "error": "An unexpected error occurred",
-        "details": str(error)
-    }), 500
-
-# Register blueprints
-from routes import upload_bp
-app.register_blueprint(upload_bp)
-
-# Create all database tables
-with app.app_context():
-    import models
-    db.create_all()
+# Importing this module stays cheap: blueprints, background services and the heavy libraries
+# behind them (pandas, PyPDF2, openai) are loaded by create_app() or on first use, and the
+# database schema is created by the `init-db` command instead of at import
+_app: Optional[Flask] = None
+_app_lock = threading.Lock()
+
+@login_manager.user_loader
+def load_user(user_id):
+    from models import User
+    return db.session.get(User, int(user_id))
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """
+    Build and configure the application.
+
+    Args:
+        config: Settings applied on top of the environment-derived configuration
+
+    Returns:
+        The configured Flask app, with blueprints and background services attached
+    """
+    app = Flask(__name__)
+    # Uploads are parsed into per-request spools instead of being saved to a shared directory
+    app.request_class = UploadRequest
+
+    # Enable CORS
+    CORS(app)
+
+    # Setup configurations
+    # Signs login sessions and tracking links, so there is no built-in fallback
+    app.secret_key = os.environ.get("FLASK_SECRET_KEY")
+    # One engine (plus the optional read replica) shared by every model and request
+    app.config.update(database_config())
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_CONTENT_LENGTH", str(64 * 1024 * 1024)))  # 64MB default; sheets and PDFs are streamed
+    if config:
+        app.config.update(config)
+    if not app.secret_key:
+        raise ValueError("FLASK_SECRET_KEY environment variable is not set")
+
+    # Initialize database (shared with the models in models.py)
+    db.init_app(app)
+
+    # Sessions for the optional user accounts (uploads themselves stay anonymous)
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+
+    from jobs import job_queue
+    from tracking import event_buffer, tracking_bp
+    from pdf_store import pdf_cache_retention
+    import access_log
+
+    # Background workers for upload processing
+    job_queue.init_app(app)
+
+    # Buffered ingestion of tracking pixel/click events
+    event_buffer.init_app(app)
+
+    # Retention of the content-hash cache of PDF analyses
+    pdf_cache_retention.init_app(app)
+
+    # Structured, sampled access log (replaces header/body logging on every request)
+    access_log.init_app(app)
+
+    register_error_handlers(app)
+
+    # Register blueprints
+    from routes import upload_bp
+    from auth import auth_bp
+    from dashboard import main_bp
+    from metrics import metrics_bp
+    app.register_blueprint(upload_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(main_bp)
+    app.register_blueprint(tracking_bp)
+    app.register_blueprint(metrics_bp)
+
+    app.cli.add_command(init_db_command)
+    return app
+
+def register_error_handlers(app: Flask) -> None:
+    @app.errorhandler(400)
+    def bad_request_error(error):
+        logger.error(f"400 Bad Request: {error}")
+        return jsonify({"error": str(error)}), 400
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        logger.error(f"404 Not Found: {error}")
+        return jsonify({"error": "Resource not found"}), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        logger.error(f"500 Internal Server Error: {error}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    @app.errorhandler(HTTPException)
+    def handle_http_error(error):
+        logger.error(f"HTTP Exception: {error}")
+        response = jsonify({
+            "error": str(error.description),
+            "code": error.code
+        })
+        return response, error.code
+
+    @app.errorhandler(Exception)
+    def handle_exception(error):
+        logger.error(f"Unhandled Exception: {error}", exc_info=True)
+        return jsonify({
+            "error": "An unexpected error occurred",
+            "details": str(error)
+        }), 500
+
+def init_db() -> List[str]:
+    """
+    Create any missing database tables and upgrade existing ones to the current models.
+    Must run inside an application context.
+
+    Returns:
+        List[str]: The changes made to existing tables
+    """
+    import models  # registers the tables on db.metadata
+    from schema import upgrade_schema
+    db.create_all(bind_key=None)  # primary only; a replica gets its schema from replication
+    return upgrade_schema()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables and upgrade existing ones."""
+    for change in init_db():
+        click.echo(f'Upgraded: {change}')
+    click.echo('Initialized the database.')
+
+def __getattr__(name: str):
+    # `from app import app` (main.py, WSGI servers, `flask --app app`) builds the default app on first access
+    global _app
+    if name == 'app':
+        if _app is None:
+            with _app_lock:
+                if _app is None:
+                    _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1 @@
+"""Reproducible benchmarks against a fake OpenAI server and an SMTP sink; see benchmarks/run.py."""
@@ -0,0 +1,129 @@
+"""
+OpenAI-compatible /v1/chat/completions server with configurable latency and error injection.
+
+Answers email-generation prompts (single and batched) and PDF-analysis prompts with valid
+JSON in the shape the app expects. Run standalone with:
+
+    python -m benchmarks.fake_openai --port 18555 --latency 0.2 --error-rate 0.01
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+EMAIL = {
+    'subject': 'Follow-up on your task',
+    'body': 'Dear colleague,\n\nThis is a synthetic email generated for benchmarking.\n\nBest regards',
+    'tone': 'formal'
+}
+ANALYSIS = {
+    'inconsistencies': ['Costs were reduced while spending increased.'],
+    'logical_fallacies': ['Bandwagon: adopting the framework because everyone else does.'],
+    'unsupported_statements': ['The migration will finish on time.'],
+    'suggestions': ['Publish the migration plan.']
+}
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0}
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def start(self) -> 'FakeOpenAIServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def roll(self):
+        """Pick this request's delay and injected failure, if any."""
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = max(0.0, self.random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            draw = self.random.random()
+            if draw < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return delay, 429
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return delay, 500
+            return delay, 200
+
+def _completion_content(prompt: str) -> dict:
+    if 'Text to analyze' in prompt:
+        return ANALYSIS
+    if '"emails"' in prompt:
+        tasks = json.loads(prompt[prompt.index('['):prompt.index('Return a JSON')].strip())
+        return {'emails': [{'index': task['index'], **EMAIL} for task in tasks]}
+    return EMAIL
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        delay, status = self.server.roll()
+        time.sleep(delay)
+
+        if status != 200:
+            error = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            body = {'error': {'message': f'Injected {error}', 'type': error, 'code': error}}
+            headers = {'Retry-After': '0'} if status == 429 else {}
+        else:
+            prompt = payload['messages'][0]['content']
+            prompt_tokens = len(prompt) // 4
+            body = {
+                'id': 'chatcmpl-bench',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload['model'],
+                'choices': [{
+                    'index': 0,
+                    'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': json.dumps(_completion_content(prompt))}
+                }],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 100, 'total_tokens': prompt_tokens + 100}
+            }
+            headers = {}
+        self._reply(status, body, headers)
+
+    def _reply(self, status: int, body: dict, headers: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=18555)
+    parser.add_argument('--latency', type=float, default=0.2, help='mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='standard deviation of the delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of 429 responses')
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    print(f'Fake OpenAI server listening on {server.base_url}')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
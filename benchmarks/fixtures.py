@@ -0,0 +1,45 @@
+"""Synthetic task sheets and PDFs for the benchmarks."""
+import random
+import pandas as pd
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+VERBS = ['Review', 'Schedule', 'Update', 'Prepare', 'Send', 'Confirm', 'Draft', 'Approve']
+OBJECTS = ['quarterly report', 'team meeting', 'project documentation', 'budget forecast',
+           'release notes', 'client proposal', 'onboarding checklist', 'security audit']
+NAMES = ['Alex Morgan', 'Sam Lee', 'Jordan Kim', 'Taylor Reed', 'Casey Park', 'Robin Diaz']
+SENTENCES = [
+    'Revenue grew in every region, which proves the new pricing strategy is the only reason for success.',
+    'The survey had twelve respondents, so the results clearly apply to all customers.',
+    'Costs were reduced by ten percent while spending on every category increased.',
+    'Experts agree that the migration will finish on time, although no plan has been published.',
+    'The team recommends adopting the framework because everyone else is using it.',
+]
+
+def make_task_sheet(path: str, rows: int, seed: int = 0) -> str:
+    """Write a sheet with the required Task/E-mail/Recipient columns (.xlsx or .csv by extension)."""
+    rng = random.Random(seed)
+    df = pd.DataFrame({
+        'Task': [f'{rng.choice(VERBS)} the {rng.choice(OBJECTS)} #{i}' for i in range(rows)],
+        'E-mail': [f'user{i}@example.com' for i in range(rows)],
+        'Recipient': [rng.choice(NAMES) for _ in range(rows)],
+    })
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+    return path
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 0) -> str:
+    """Write a text PDF of the given number of pages."""
+    rng = random.Random(seed)
+    pdf = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        pdf.drawString(72, y, f'Section {page + 1}')
+        for _ in range(lines_per_page):
+            y -= 17
+            pdf.drawString(72, y, rng.choice(SENTENCES)[:95])
+        pdf.showPage()
+    pdf.save()
+    return path
@@ -0,0 +1,258 @@
+"""
+End-to-end benchmark of /generate-email, /send-email and /upload (Excel and PDF).
+
+The app runs in-process against a local fake OpenAI server and an SMTP sink, so runs are
+reproducible and cost nothing. Each scenario reports throughput, p50/p99 latency and peak
+RSS; save a run with --output and pass it to a later run with --compare to flag regressions.
+
+    python -m benchmarks.run --rows 10000 --pages 300 --latency 0.2 --output base.json
+    python -m benchmarks.run --rows 10000 --pages 300 --latency 0.2 --compare base.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fixtures import make_pdf, make_task_sheet
+from benchmarks.smtp_sink import SMTPSink
+
+# Metrics where a higher value is better; everything else is better lower
+HIGHER_IS_BETTER = {'throughput'}
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def reset_peak_rss() -> None:
+    """Reset the kernel's high-water mark so each scenario reports its own peak (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB since the last reset."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux and bytes on macOS; it cannot be reset
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def run_scenario(name: str, call: Callable[[int], int], requests: int, concurrency: int) -> Dict:
+    """
+    Run call(i) for i in range(requests) on a thread pool and summarize the timings.
+
+    Args:
+        name: Scenario name for the report
+        call: Performs one request and returns how many items it processed
+        requests: Number of calls
+        concurrency: Number of concurrent callers
+
+    Returns:
+        Dict with throughput (items/s), p50/p99 latency (ms), error count and peak RSS (MB)
+    """
+    latencies = []
+    errors = 0
+    items = 0
+    lock = threading.Lock()
+
+    def timed_call(i):
+        nonlocal errors, items
+        started = time.perf_counter()
+        try:
+            processed = call(i)
+        except Exception as e:
+            print(f'  {name} request {i} failed: {e}', file=sys.stderr)
+            processed = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if processed is None:
+                errors += 1
+            else:
+                items += processed
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_call, range(requests)))
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'items': items,
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'throughput': round(items / wall, 2) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+def configure_environment(openai_url: str, smtp_port: int, workdir: str) -> None:
+    """Point the app at the local servers; must run before the app is imported."""
+    os.environ.update({
+        'OPENAI_API_KEY': 'benchmark',
+        'FLASK_SECRET_KEY': 'benchmark',
+        'OPENAI_BASE_URL': openai_url,
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_USE_TLS': 'false',
+        'SMTP_USERNAME': 'benchmark@example.com',
+        'SMTP_PASSWORD': 'benchmark',
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        # Every request must reach the fake server, and the limiter must not be the bottleneck
+        'LLM_CACHE_ENABLED': 'false',
+        'EMAIL_REUSE_TTL': '0',
+        'OPENAI_RPM_LIMIT': '1000000',
+        'OPENAI_TPM_LIMIT': '1000000000',
+        'ACCESS_LOG_SAMPLE_RATE': '0',
+    })
+
+def upload_call(client_for: Callable, path: str, mimetype: str, count_event: str) -> Callable[[int], int]:
+    """Build a call that streams an upload as NDJSON and counts the records of one event type."""
+    def call(_):
+        with open(path, 'rb') as f:
+            response = client_for().post(
+                '/upload?stream=ndjson',
+                data={'file': (f, os.path.basename(path), mimetype)},
+                content_type='multipart/form-data'
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}')
+            lines = response.get_data(as_text=True).splitlines()
+        return sum(1 for line in lines if json.loads(line).get('event') == count_event)
+    return call
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List the metrics that regressed by more than tolerance relative to baseline."""
+    regressions = []
+    for scenario, result in current['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous:
+            continue
+        for metric in ('throughput', 'p50_ms', 'p99_ms', 'peak_rss_mb'):
+            before, after = previous.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            marker = '  REGRESSION' if worse > tolerance else ''
+            print(f'{scenario:>14} {metric:>12}: {before:>10} -> {after:>10} ({change:+.1%}){marker}')
+            if marker:
+                regressions.append(f'{scenario}.{metric}')
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the upload, generation and sending paths.')
+    parser.add_argument('--rows', type=int, default=1000, help='rows in the synthetic task sheet')
+    parser.add_argument('--pages', type=int, default=100, help='pages in the synthetic PDF')
+    parser.add_argument('--requests', type=int, default=200, help='requests for /generate-email and /send-email')
+    parser.add_argument('--uploads', type=int, default=1, help='repetitions of each upload scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--latency', type=float, default=0.05, help='mean fake OpenAI latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='standard deviation of the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of injected 500 responses')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of injected 429 responses')
+    parser.add_argument('--scenarios', default='generate_email,send_email,upload_excel,upload_pdf')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--compare', help='baseline JSON from a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='task-mail-bench-')
+    openai_server = FakeOpenAIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                     rate_limit_rate=args.rate_limit_rate, seed=args.seed).start()
+    smtp_sink = SMTPSink().start()
+    configure_environment(openai_server.base_url, smtp_sink.port, workdir)
+
+    from app import app, init_db  # imported late so the module-level config picks up the environment
+    with app.app_context():
+        init_db()
+    logging.getLogger().setLevel(logging.WARNING)  # per-request INFO logs would dominate the timings
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def post_json(path: str, payload: Dict) -> int:
+        response = client().post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f'HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return 1
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    scenarios = {}
+    if 'generate_email' in selected:
+        scenarios['generate_email'] = (lambda i: post_json('/generate-email', {
+            'task': f'Prepare the quarterly report #{i}', 'recipient': 'Alex Morgan'
+        }), args.requests, args.concurrency)
+    if 'send_email' in selected:
+        scenarios['send_email'] = (lambda i: post_json('/send-email', {
+            'email': f'user{i}@example.com', 'subject': 'Benchmark', 'body': 'Hello from the benchmark.'
+        }), args.requests, args.concurrency)
+    if 'upload_excel' in selected:
+        sheet = make_task_sheet(os.path.join(workdir, 'tasks.xlsx'), args.rows, seed=args.seed)
+        scenarios['upload_excel'] = (upload_call(
+            client, sheet, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'email'
+        ), args.uploads, 1)
+    if 'upload_pdf' in selected:
+        pdf = make_pdf(os.path.join(workdir, 'document.pdf'), args.pages, seed=args.seed)
+        scenarios['upload_pdf'] = (upload_call(client, pdf, 'application/pdf', 'chunk'), args.uploads, 1)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'scenarios': {}
+    }
+    for name, (call, requests, concurrency) in scenarios.items():
+        print(f'Running {name}...', file=sys.stderr)
+        result = run_scenario(name, call, requests, concurrency)
+        report['scenarios'][name] = result
+        print(f"{name:>14}: {result['throughput']:>9} items/s  p50 {result['p50_ms']:>8} ms  "
+              f"p99 {result['p99_ms']:>8} ms  peak RSS {result['peak_rss_mb']:>7} MB  "
+              f"errors {result['errors']}")
+    report['fake_openai'] = dict(openai_server.stats)
+    report['smtp_messages'] = smtp_sink.messages
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+
+    openai_server.shutdown()
+    smtp_sink.shutdown()
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,42 @@
 import os
 import time
-from typing import Optional, Dict, Any
+import asyncio
+import weakref
+import functools
+import threading
+import contextvars
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, List, Tuple
 import json
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError, APIConnectionError, BadRequestError
+from llm_cache import response_cache, make_cache_key
+from rate_limiter import openai_limiter, backoff_delay
+from model_router import ModelRouter
+from access_log import record_upstream
+import metrics
 
-# Initialize OpenAI client
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+
+# The openai SDK is imported on first use (it dominates import time) and the clients are
+# built on first request, so importing this module needs neither the SDK loaded nor a key
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")  # e.g. a local OpenAI-compatible mock server
+
+_openai_client: Optional["OpenAI"] = None
+_openai_client_lock = threading.Lock()
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Connection pool shared by all async requests on an event loop
+HTTP_MAX_CONNECTIONS = int(os.environ.get("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = 60  # seconds an idle connection is kept open
+# HTTP/2 multiplexes concurrent requests over one connection; needs the optional h2 package
+HTTP2_ENABLED = (
+    os.environ.get("OPENAI_HTTP2", "true").lower() in ("1", "true", "yes")
+    and importlib.util.find_spec("h2") is not None
+)
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
 
 # Constants for retry logic and timeouts
 MAX_RETRIES = 3
@@ -17,6 +44,74 @@ INITIAL_RETRY_DELAY = 1
 MAX_RETRY_DELAY = 8
 REQUEST_TIMEOUT = 30  # seconds
 
+# Completion parameters (also part of the response cache key)
+MODELS = ["gpt-4", "gpt-3.5-turbo"]  # Fallback model hierarchy
+TEMPERATURE = 0.7
+MAX_TOKENS = 2000
+
+# Hedged requests: after the primary model passes its rolling p95, race it against the fastest other model
+HEDGING_ENABLED = os.environ.get("OPENAI_HEDGING_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_WORKERS = 64  # threads for primary and hedged calls; calls beyond the limiter's budget just wait
+HEDGE_SPARE_SLOTS = 1  # free limiter slots a hedge must leave to other callers
+
+model_router = ModelRouter(MODELS)
+
+# Instrumentation (see metrics.py)
+request_duration = metrics.histogram('openai_request_duration_seconds', 'Latency of individual OpenAI completion requests.', ['model', 'outcome'])
+retries_total = metrics.counter('openai_retries_total', 'OpenAI request retries by reason.', ['reason'])
+fallbacks_total = metrics.counter('openai_fallback_responses_total', 'Responses produced by a model other than the preferred one.', ['model'])
+hedged_total = metrics.counter('openai_hedged_requests_total', 'Hedged requests sent to a second model.', ['model'])
+hedges_skipped_total = metrics.counter('openai_hedges_skipped_total', 'Hedges not sent because the rate limiter had no spare slots.')
+cache_requests_total = metrics.counter('llm_cache_requests_total', 'Response cache lookups by result.', ['result'])
+tokens_total = metrics.counter('openai_tokens_total', 'Tokens consumed by OpenAI requests.', ['model', 'kind'])
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+# Context windows (tokens) used to size prompts so they fit every fallback model
+MODEL_CONTEXT_WINDOWS = {"gpt-4": 8192, "gpt-3.5-turbo": 16385}
+CHARS_PER_TOKEN = 4  # rough average for English text
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate the number of tokens in text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+@functools.lru_cache(maxsize=None)
+def _tiktoken_encoding(model: str):
+    # The optional tiktoken package gives exact counts; its encodings may need a download
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None  # unknown model, or the encoding couldn't be fetched
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens in text for model (defaults to the preferred model).
+
+    Uses tiktoken when it is installed and falls back to estimate_tokens otherwise.
+    """
+    encoding = _tiktoken_encoding(model or MODELS[0])
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def has_exact_token_counts(model: Optional[str] = None) -> bool:
+    """Whether count_tokens is exact for model (tiktoken is available) rather than an estimate."""
+    return _tiktoken_encoding(model or MODELS[0]) is not None
+
+def prompt_token_budget(model: Optional[str] = None) -> int:
+    """
+    Tokens available for the prompt once the completion (MAX_TOKENS) is reserved.
+
+    Without a model this is the budget of the smallest context window in the fallback
+    hierarchy, so the prompt fits whichever model ends up serving it.
+    """
+    if model is not None:
+        return MODEL_CONTEXT_WINDOWS[model] - MAX_TOKENS
+    return min(MODEL_CONTEXT_WINDOWS[model] for model in MODELS) - MAX_TOKENS
+
 def validate_json_response(content: str) -> Dict[str, Any]:
     """Validate that the response is proper JSON and has expected structure."""
     try:
@@ -27,13 +122,408 @@ def validate_json_response(content: str) -> Dict[str, Any]:
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON response: {str(e)}")
 
-def send_openai_request(prompt: str, retries: int = MAX_RETRIES) -> str:
+class InvalidResponseError(ValueError):
+    """A completion that is empty, cut off, not a JSON object, or fails the caller's validator."""
+    pass
+
+def _response_content(response) -> str:
+    # An unusable answer is retried like one failing the caller's validator, not treated as an API error
+    choice = response.choices[0]
+    if getattr(choice, "finish_reason", None) == "length":
+        raise InvalidResponseError(f"Response was cut off at max_tokens ({MAX_TOKENS})")
+    content = choice.message.content
+    if not content:
+        raise InvalidResponseError("OpenAI returned an empty response")
+    try:
+        validate_json_response(content)
+    except ValueError as e:
+        raise InvalidResponseError(str(e))
+    return content
+
+def _check_response(content: str, validator: Optional[Callable[[str], Any]]) -> None:
+    # Runs before the response is cached, so a malformed answer is never replayed
+    if validator is None:
+        return
+    try:
+        validator(content)
+    except ValueError as e:  # includes json.JSONDecodeError
+        raise InvalidResponseError(str(e))
+
+def _cached_response(models: List[str], prompt: str, validator: Optional[Callable[[str], Any]]) -> Optional[str]:
+    """Return a cached response for prompt from any model, dropping entries that fail validator."""
+    for model in models:
+        key = make_cache_key(model, prompt, TEMPERATURE, MAX_TOKENS)
+        cached = response_cache.get(key)
+        if cached is None:
+            continue
+        try:
+            _check_response(cached, validator)
+        except InvalidResponseError:
+            response_cache.delete(key)
+            continue
+        cache_requests_total.inc(result="hit")
+        return cached
+    cache_requests_total.inc(result="miss")
+    return None
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, if it sent a Retry-After header."""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _retry_delay(error: Exception, retries: int, attempt: int) -> Optional[float]:
+    """
+    Decide what to do after a failed completion attempt; shared by the sync and async paths.
+    
+    Args:
+        error: What the attempt raised
+        retries: Retries remaining
+        attempt: Retries made so far, for exponential backoff
+    
+    Returns:
+        None to move straight on to the next model, otherwise seconds to wait before
+        retrying from the first model
+    
+    Raises:
+        ValueError: If the error can't be retried or retries are exhausted
+    """
+    import openai
+    
+    if isinstance(error, InvalidResponseError):
+        if retries > 0:
+            retries_total.inc(reason="invalid_response")
+            return 0.0  # Ask again; the bad response was not cached
+        raise InvalidResponseError(f"Response failed validation and max retries reached: {str(error)}")
+    
+    if isinstance(error, openai.BadRequestError):
+        if "model" in str(error).lower():
+            retries_total.inc(reason="model_error")
+            return None
+        raise ValueError(f"Invalid request parameters: {str(error)}")
+    
+    if isinstance(error, openai.RateLimitError):
+        if retries > 0:
+            retries_total.inc(reason="rate_limit")
+            # Pause every caller sharing the limiter instead of only this one
+            delay = _retry_after(error)
+            if delay is None:
+                delay = backoff_delay(attempt, INITIAL_RETRY_DELAY, MAX_RETRY_DELAY)
+            openai_limiter.record_throttle(delay)
+            return 0.0  # The limiter holds the retry back
+        raise ValueError("Rate limit exceeded and max retries reached")
+    
+    if isinstance(error, openai.APITimeoutError):
+        if retries > 0:
+            retries_total.inc(reason="timeout")
+            return backoff_delay(0)  # Short delay for timeout
+        raise ValueError("API request timed out and max retries reached")
+    
+    if isinstance(error, openai.APIConnectionError):
+        if retries > 0:
+            retries_total.inc(reason="connection")
+            return backoff_delay(1)  # Longer delay for connection issues
+        raise ValueError("Failed to connect to OpenAI API after multiple attempts")
+    
+    if isinstance(error, openai.APIError):
+        if retries > 0 and getattr(error, "status_code", None) in {500, 502, 503, 504}:
+            retries_total.inc(reason="server_error")
+            return backoff_delay(attempt, INITIAL_RETRY_DELAY, MAX_RETRY_DELAY)
+        raise ValueError(f"OpenAI API error: {str(error)}")
+    
+    raise ValueError(f"Unexpected error while calling OpenAI API: {str(error)}")
+
+def _record_answer(answered_by: str, prompt: str, content: str, use_cache: bool) -> None:
+    if answered_by != MODELS[0]:
+        fallbacks_total.inc(model=answered_by)
+    if use_cache:
+        response_cache.set(make_cache_key(answered_by, prompt, TEMPERATURE, MAX_TOKENS), content)
+
+def _request_completion(model: str, prompt: str, estimated_tokens: int) -> str:
+    """Send one completion request to model and return its validated JSON content."""
+    import openai
+    client = get_openai_client()
+    try:
+        with openai_limiter.slot(estimated_tokens):
+            start_time = time.time()
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    temperature=TEMPERATURE,
+                    max_tokens=MAX_TOKENS,
+                    timeout=REQUEST_TIMEOUT
+                )
+            except Exception:
+                request_duration.observe(time.time() - start_time, model=model, outcome="error")
+                raise
+            finally:
+                record_upstream("llm", time.time() - start_time)
+        request_duration.observe(time.time() - start_time, model=model, outcome="ok")
+        usage = getattr(response, "usage", None)
+        openai_limiter.record_success(estimated_tokens, getattr(usage, "total_tokens", None))
+        if usage is not None:
+            tokens_total.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+            tokens_total.inc(usage.completion_tokens or 0, model=model, kind="completion")
+        
+        # Check for timeout
+        if time.time() - start_time > REQUEST_TIMEOUT:
+            raise openai.APITimeoutError("Request timeout exceeded")
+        
+        content = _response_content(response)
+    except openai.RateLimitError:
+        raise  # Says nothing about the model's health
+    except Exception:
+        model_router.record(model, None, ok=False)
+        raise
+    model_router.record(model, time.time() - start_time, ok=True)
+    return content
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="openai-hedge")
+        return _hedge_executor
+
+def _hedged_completion(primary: str, models: List[str], prompt: str, estimated_tokens: int) -> Tuple[str, str]:
+    """
+    Request a completion from primary, hedging with the fastest other model if it is slow.
+    
+    The first valid response wins; a losing call that has not started is cancelled, one
+    already in flight is abandoned and its result discarded. A blocking call cannot be
+    interrupted, so the loser keeps its limiter slot and thread until it returns; hedges
+    are therefore only sent while openai_limiter has more than HEDGE_SPARE_SLOTS free
+    slots, so they never eat into the concurrency budget other callers are waiting on.
+    If every call fails, the primary model's error is raised.
+    
+    Returns:
+        (model that answered, validated JSON content)
+    """
+    hedge = model_router.hedge_model(primary, models) if HEDGING_ENABLED else None
+    if hedge is None:
+        return primary, _request_completion(primary, prompt, estimated_tokens)
+    
+    executor = _get_hedge_executor()
+    futures = {executor.submit(contextvars.copy_context().run, _request_completion, primary, prompt, estimated_tokens): primary}
+    done, _ = wait(futures, timeout=model_router.hedge_delay(primary))
+    if not done:
+        if openai_limiter.spare_slots() > HEDGE_SPARE_SLOTS:
+            futures[executor.submit(contextvars.copy_context().run, _request_completion, hedge, prompt, estimated_tokens)] = hedge
+            hedged_total.inc(model=hedge)
+        else:
+            hedges_skipped_total.inc()
+    
+    errors: Dict[str, BaseException] = {}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                for loser in pending:
+                    loser.cancel()
+                return futures[future], future.result()
+            errors[futures[future]] = error
+    raise errors.get(primary) or next(iter(errors.values()))
+
+def _require_api_key() -> str:
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY environment variable is not set")
+    return OPENAI_API_KEY
+
+def get_openai_client() -> "OpenAI":
+    """Return the process-wide OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=_require_api_key(), base_url=OPENAI_BASE_URL)
+    return _openai_client
+
+def __getattr__(name: str):
+    # Module-level `openai_client` is kept for callers that used the eager client
+    if name == "openai_client":
+        return get_openai_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """
+    Return the AsyncOpenAI client for the running event loop.
+    
+    Pooled connections belong to the loop that opened them, so each loop gets one client
+    with one keep-alive (and, when h2 is installed, HTTP/2) connection pool that every
+    async request on that loop shares. Close it with close_async_openai_client().
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS
+        
+        # Limits come from the HTTP library the installed SDK is built on, whichever that is
+        Limits = type(DEFAULT_CONNECTION_LIMITS)
+        http_client = DefaultAsyncHttpxClient(
+            http2=HTTP2_ENABLED,
+            limits=Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=REQUEST_TIMEOUT
+        )
+        client = AsyncOpenAI(api_key=_require_api_key(), base_url=OPENAI_BASE_URL, http_client=http_client)
+        _async_clients[loop] = client
+    return client
+
+async def close_async_openai_client() -> None:
+    """
+    Close the running event loop's AsyncOpenAI client and its connection pool.
+    
+    Call this before the loop that used async_send_openai_request shuts down (e.g. at
+    the end of the coroutine passed to asyncio.run); a later request builds a new client.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+async def _async_request_completion(model: str, prompt: str, estimated_tokens: int) -> str:
+    """Asyncio variant of _request_completion."""
+    import openai
+    client = get_async_openai_client()
+    try:
+        async with openai_limiter.async_slot(estimated_tokens):
+            start_time = time.time()
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    temperature=TEMPERATURE,
+                    max_tokens=MAX_TOKENS,
+                    timeout=REQUEST_TIMEOUT
+                )
+            except Exception:
+                request_duration.observe(time.time() - start_time, model=model, outcome="error")
+                raise
+            finally:
+                record_upstream("llm", time.time() - start_time)
+        request_duration.observe(time.time() - start_time, model=model, outcome="ok")
+        usage = getattr(response, "usage", None)
+        openai_limiter.record_success(estimated_tokens, getattr(usage, "total_tokens", None))
+        if usage is not None:
+            tokens_total.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+            tokens_total.inc(usage.completion_tokens or 0, model=model, kind="completion")
+        
+        content = _response_content(response)
+    except openai.RateLimitError:
+        raise  # Says nothing about the model's health
+    except Exception:
+        model_router.record(model, None, ok=False)
+        raise
+    model_router.record(model, time.time() - start_time, ok=True)
+    return content
+
+async def _async_hedged_completion(primary: str, models: List[str], prompt: str, estimated_tokens: int) -> Tuple[str, str]:
+    """
+    Asyncio variant of _hedged_completion; the losing request is cancelled outright. Hedges
+    are held to the same HEDGE_SPARE_SLOTS headroom, since a hedge waiting on a slot only
+    delays other callers.
+    """
+    hedge = model_router.hedge_model(primary, models) if HEDGING_ENABLED else None
+    if hedge is None:
+        return primary, await _async_request_completion(primary, prompt, estimated_tokens)
+    
+    tasks = {asyncio.ensure_future(_async_request_completion(primary, prompt, estimated_tokens)): primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=model_router.hedge_delay(primary))
+        if not done:
+            if openai_limiter.spare_slots() > HEDGE_SPARE_SLOTS:
+                tasks[asyncio.ensure_future(_async_request_completion(hedge, prompt, estimated_tokens))] = hedge
+                hedged_total.inc(model=hedge)
+            else:
+                hedges_skipped_total.inc()
+        
+        errors: Dict[str, BaseException] = {}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return tasks[task], task.result()
+                errors[tasks[task]] = error
+        raise errors.get(primary) or next(iter(errors.values()))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def async_send_openai_request(prompt: str, retries: int = MAX_RETRIES, use_cache: bool = True, validator: Optional[Callable[[str], Any]] = None) -> str:
+    """
+    Asyncio-native send_openai_request sharing its cache, rate limiter and model routing.
+    
+    Requests go through the loop's pooled AsyncOpenAI client and retries back off with
+    asyncio.sleep, so many requests can be in flight without a thread each.
+    
+    Args:
+        prompt: The prompt to send to OpenAI
+        retries: Number of retries remaining
+        use_cache: Whether to read from and write to the response cache
+        validator: Optional check of the response (e.g. parse and schema validation) that
+            raises ValueError; failing responses are retried and never cached
+    
+    Returns:
+        Validated JSON response as a string
+    
+    Raises:
+        ValueError: If the response is invalid or empty, or retries are exhausted
+    """
+    attempt = 0
+    models = model_router.order()
+    estimated_tokens = estimate_tokens(prompt) + MAX_TOKENS
+    
+    if use_cache:
+        cached = _cached_response(models, prompt, validator)
+        if cached is not None:
+            return cached
+    
+    while retries >= 0:
+        for model in models:
+            try:
+                answered_by, content = await _async_hedged_completion(model, models, prompt, estimated_tokens)
+                _check_response(content, validator)
+            except Exception as e:
+                delay = _retry_delay(e, retries, attempt)
+                if delay is None:
+                    continue
+                await asyncio.sleep(delay)
+                attempt += 1
+                retries -= 1
+                break
+            _record_answer(answered_by, prompt, content, use_cache)
+            return content
+        else:
+            retries -= 1  # Every model failed with a model-specific error
+    
+    raise ValueError("Maximum retries reached without successful response")
+
+def send_openai_request(prompt: str, retries: int = MAX_RETRIES, use_cache: bool = True, validator: Optional[Callable[[str], Any]] = None) -> str:
     """
     Send a request to OpenAI API with retry logic, fallback models, and enhanced error handling.
     
+    Responses are served from and stored in the shared response cache unless use_cache is False.
+    Requests that reach the API go through the process-wide openai_limiter, which enforces the
+    RPM/TPM budgets and adapts concurrency to rate-limit responses. Models are tried in the
+    order chosen by model_router, and slow calls are hedged (see _hedged_completion).
+    
     Args:
         prompt: The prompt to send to OpenAI
         retries: Number of retries remaining
+        use_cache: Whether to read from and write to the response cache
+        validator: Optional check of the response (e.g. parse and schema validation) that
+            raises ValueError; failing responses are retried and never cached
     
     Returns:
         Validated JSON response as a string
@@ -42,74 +532,32 @@ def send_openai_request(prompt: str, retries: int = MAX_RETRIES) -> str:
         ValueError: If the response is invalid or empty
         Exception: For other API-related errors after all retries are exhausted
     """
-    retry_delay = INITIAL_RETRY_DELAY
-    models = ["gpt-4", "gpt-3.5-turbo"]  # Fallback model hierarchy
+    attempt = 0
+    models = model_router.order()
+    # OpenAI counts max_tokens against the TPM limit; unused tokens are refunded afterwards
+    estimated_tokens = estimate_tokens(prompt) + MAX_TOKENS
+    
+    if use_cache:
+        cached = _cached_response(models, prompt, validator)
+        if cached is not None:
+            return cached
     
     while retries >= 0:
         for model in models:
             try:
-                start_time = time.time()
-                response = openai_client.chat.completions.create(
-                    model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={"type": "json_object"},
-                    temperature=0.7,
-                    max_tokens=2000,
-                    timeout=REQUEST_TIMEOUT
-                )
-                
-                # Check for timeout
-                if time.time() - start_time > REQUEST_TIMEOUT:
-                    raise APITimeoutError("Request timeout exceeded")
-                
-                # Extract content from response
-                content = response.choices[0].message.content
-                if not content:
-                    raise ValueError("OpenAI returned an empty response")
-                
-                # Validate JSON response
-                validate_json_response(content)
-                return content
-                
-            except BadRequestError as e:
-                if "model" in str(e).lower():
-                    # Model-specific error, try next model
-                    continue
-                raise ValueError(f"Invalid request parameters: {str(e)}")
-                
-            except RateLimitError:
-                if retries > 0:
-                    time.sleep(retry_delay)
-                    retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
-                    retries -= 1
-                    break  # Try again with same model
-                raise ValueError("Rate limit exceeded and max retries reached")
-                
-            except APITimeoutError:
-                if retries > 0:
-                    time.sleep(1)  # Short delay for timeout
-                    retries -= 1
-                    break
-                raise ValueError("API request timed out and max retries reached")
-                
-            except APIConnectionError:
-                if retries > 0:
-                    time.sleep(2)  # Longer delay for connection issues
-                    retries -= 1
-                    break
-                raise ValueError("Failed to connect to OpenAI API after multiple attempts")
-                
-            except APIError as e:
-                if retries > 0 and e.status_code in {500, 502, 503, 504}:
-                    time.sleep(retry_delay)
-                    retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
-                    retries -= 1
-                    break
-                raise ValueError(f"OpenAI API error: {str(e)}")
-                
+                answered_by, content = _hedged_completion(model, models, prompt, estimated_tokens)
+                _check_response(content, validator)
             except Exception as e:
-                raise ValueError(f"Unexpected error while calling OpenAI API: {str(e)}")
-        
-        retries -= 1
+                delay = _retry_delay(e, retries, attempt)
+                if delay is None:
+                    continue  # Model-specific error, try next model
+                time.sleep(delay)
+                attempt += 1
+                retries -= 1
+                break  # Try again from the first model
+            _record_answer(answered_by, prompt, content, use_cache)
+            return content
+        else:
+            retries -= 1  # Every model failed with a model-specific error
     
     raise ValueError("Maximum retries reached without successful response")
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, redirect, render_template, url_for
+from flask_login import current_user, login_required
+from extensions import db, read_session
+from models import GeneratedEmail
+from rollups import DASHBOARD_DAYS, dashboard_stats
+
+main_bp = Blueprint('main', __name__)
+
+RECENT_EMAILS = 20
+
+@main_bp.route('/home')
+def index():
+    return redirect(url_for('upload.index'))
+
+@main_bp.route('/dashboard')
+@login_required
+def dashboard():
+    # Only the logged-in user's own emails; anonymous uploads have no owner to show them to
+    user_id = current_user.id
+    owner = GeneratedEmail.user_id == user_id
+
+    # Read-only page: served from the replica when one is configured
+    with read_session() as session:
+        stats = dashboard_stats(user_id, session=session)
+        recent_emails = session.execute(
+            db.select(GeneratedEmail)
+            .where(owner, GeneratedEmail.created_at >= datetime.utcnow() - timedelta(days=DASHBOARD_DAYS))
+            .order_by(GeneratedEmail.created_at.desc())
+            .limit(RECENT_EMAILS)
+        ).scalars().all()
+
+    return render_template('dashboard.html', recent_emails=recent_emails, **stats)
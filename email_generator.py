@@ -1,6 +1,20 @@
-from typing import Dict, Optional
+import os
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import json
-from chat_request import send_openai_request, validate_json_response
+from chat_request import send_openai_request, async_send_openai_request, validate_json_response, estimate_tokens, prompt_token_budget, MAX_TOKENS, InvalidResponseError
+from utils import iter_bounded
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of generation requests in flight at once
+MAX_IN_FLIGHT = int(os.environ.get("EMAIL_GENERATION_MAX_IN_FLIGHT", "8"))
+
+# Batched generation: several tasks per request to share the instruction preamble
+BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", "5"))  # upper bound on tasks per request; 1 disables batching
+EMAIL_OUTPUT_TOKENS = 350  # expected completion tokens per generated email
+BATCH_OUTPUT_SHARE = 0.8  # share of MAX_TOKENS planned for a batch's emails, leaving room for longer ones
+BATCH_ITEM_OVERHEAD_TOKENS = 15  # JSON keys and punctuation around each task
 
 def validate_email_response(response: Dict) -> None:
     """Validate that the email response contains all required fields."""
@@ -16,7 +30,14 @@ def validate_email_response(response: Dict) -> None:
     if not isinstance(response["tone"], str) or not response["tone"].strip():
         raise ValueError("Email tone is empty or invalid")
 
-def generate_email_from_task(task: str, recipient_name: str, max_retries: int = 3) -> Dict:
+def validate_task_inputs(task: str, recipient_name: str) -> None:
+    """Validate the inputs of a single email generation."""
+    if not task or not task.strip():
+        raise ValueError("Task description cannot be empty")
+    if not recipient_name or not recipient_name.strip():
+        raise ValueError("Recipient name cannot be empty")
+
+def generate_email_from_task(task: str, recipient_name: str, max_retries: int = 3, use_cache: bool = True) -> Dict:
     """
     Generate a professional email based on the task description.
     
@@ -24,6 +45,7 @@ def generate_email_from_task(task: str, recipient_name: str, max_retries: int =
         task: The task description
         recipient_name: Name of the email recipient
         max_retries: Maximum number of retries for API calls
+        use_cache: Whether to reuse a cached response for an identical prompt
     
     Returns:
         Dict containing email subject, body, and tone
@@ -31,12 +53,36 @@ def generate_email_from_task(task: str, recipient_name: str, max_retries: int =
     Raises:
         ValueError: If the response is invalid or required fields are missing
     """
-    if not task or not task.strip():
-        raise ValueError("Task description cannot be empty")
-    if not recipient_name or not recipient_name.strip():
-        raise ValueError("Recipient name cannot be empty")
+    validate_task_inputs(task, recipient_name)
+    prompt = build_email_prompt(task, recipient_name)
+    
+    try:
+        # Get response from OpenAI
+        response_str = send_openai_request(prompt, retries=max_retries, use_cache=use_cache, validator=parse_email_response)
+        return parse_email_response(response_str)
+    
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse email generation response: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Failed to generate email: {str(e)}")
 
-    prompt = f"""
+async def async_generate_email_from_task(task: str, recipient_name: str, max_retries: int = 3, use_cache: bool = True) -> Dict:
+    """Asyncio variant of generate_email_from_task, built on async_send_openai_request."""
+    validate_task_inputs(task, recipient_name)
+    prompt = build_email_prompt(task, recipient_name)
+    
+    try:
+        response_str = await async_send_openai_request(prompt, retries=max_retries, use_cache=use_cache, validator=parse_email_response)
+        return parse_email_response(response_str)
+    
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse email generation response: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Failed to generate email: {str(e)}")
+
+def build_email_prompt(task: str, recipient_name: str) -> str:
+    """Build the single-email generation prompt."""
+    return f"""
     Generate a professional email based on the following task and recipient.
     Task: {task}
     Recipient Name: {recipient_name}
@@ -54,18 +100,183 @@ def generate_email_from_task(task: str, recipient_name: str, max_retries: int =
     3. Tone should match the task's nature and recipient
     4. Use professional language and proper formatting
     """
+
+def parse_email_response(response_str: str) -> Dict:
+    """Parse and validate a single-email generation response."""
+    response = json.loads(response_str)
+    validate_email_response(response)
+    return response
+
+BATCH_PROMPT_TEMPLATE = """
+    Generate one professional email for each of the following tasks and recipients.
+    Tasks:
+    {tasks}
+
+    Return a JSON response with exactly this structure:
+    {{
+        "emails": [
+            {{
+                "index": "The index of the task this email is for",
+                "subject": "Clear and concise email subject line",
+                "body": "Professional email body with proper greeting and closing",
+                "tone": "The overall tone of the email (formal/informal/neutral)"
+            }}
+        ]
+    }}
     
-    try:
-        # Get response from OpenAI
-        response_str = send_openai_request(prompt, retries=max_retries)
-        
-        # Parse and validate response
-        response = json.loads(response_str)
-        validate_email_response(response)
+    Requirements:
+    1. Return exactly one email per task, with the same index as the task
+    2. Subject should be clear and related to the task
+    3. Body must include proper greeting and professional closing
+    4. Tone should match the task's nature and recipient
+    5. Use professional language and proper formatting
+    """
+
+def parse_batch_response(response_str: str) -> List:
+    """Parse a batched generation response and return its 'emails' array."""
+    items = json.loads(response_str).get("emails")
+    if not isinstance(items, list):
+        raise ValueError("Batched response does not contain an 'emails' array")
+    return items
+
+def generate_emails_batch(
+    tasks: List[Tuple[str, str]],
+    max_retries: int = 3,
+    use_cache: bool = True
+) -> List[Union[Dict, Exception]]:
+    """
+    Generate emails for several (task, recipient_name) pairs with a single request.
+    
+    Each element of the returned array is checked with validate_email_response; only the
+    elements that are missing or invalid are regenerated with single-row requests, and a
+    reply that stays unusable (e.g. cut off at MAX_TOKENS) after retries falls back for
+    every row. If
+    the batched request itself fails (connection errors, rate limits, exhausted retries),
+    every row of the batch fails with that error instead of being re-sent one by one.
+    
+    Args:
+        tasks: List of (task, recipient_name) pairs
+        max_retries: Maximum number of retries for API calls
+        use_cache: Whether to reuse a cached response for an identical prompt
+    
+    Returns:
+        List aligned with tasks holding the email dict, or the exception for rows that
+        could not be generated
+    """
+    emails: Dict[int, Union[Dict, Exception]] = {}
+    batch = []
+    for index, (task, recipient_name) in enumerate(tasks):
+        try:
+            validate_task_inputs(task, recipient_name)
+            batch.append({"index": index, "task": task, "recipient_name": recipient_name})
+        except ValueError as e:
+            emails[index] = ValueError(f"Failed to generate email: {str(e)}")
+    
+    if len(batch) > 1:
+        prompt = BATCH_PROMPT_TEMPLATE.format(tasks=json.dumps(batch, ensure_ascii=False, indent=2))
+        try:
+            items = parse_batch_response(
+                send_openai_request(prompt, retries=max_retries, use_cache=use_cache, validator=parse_batch_response)
+            )
+        except InvalidResponseError as e:
+            # The model answered but not in the batched shape (or was cut off); every row is regenerated alone
+            logger.warning(f"Batched email response was unusable, falling back to single requests: {str(e)}")
+            items = []
+        except Exception as e:
+            error = ValueError(f"Failed to generate email: {str(e)}")
+            return [emails.get(index, error) for index in range(len(tasks))]
         
-        return response
+        expected = {item["index"] for item in batch}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index"))
+            except (TypeError, ValueError):
+                continue
+            if index not in expected or index in emails:
+                continue
+            email = {field: item.get(field) for field in ("subject", "body", "tone")}
+            try:
+                validate_email_response(email)
+            except ValueError:
+                continue
+            emails[index] = email
     
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse email generation response: {str(e)}")
-    except Exception as e:
-        raise ValueError(f"Failed to generate email: {str(e)}")
+    # Fall back to single-row requests for the rows the batch did not produce
+    results: List[Union[Dict, Exception]] = []
+    for index, (task, recipient_name) in enumerate(tasks):
+        if index not in emails:
+            try:
+                emails[index] = generate_email_from_task(task, recipient_name, max_retries=max_retries, use_cache=use_cache)
+            except Exception as e:
+                emails[index] = e
+        results.append(emails[index])
+    return results
+
+def iter_task_groups(
+    tasks: Iterable[Tuple[str, str]],
+    batch_size: int = BATCH_SIZE
+) -> Iterator[List[Tuple[int, str, str]]]:
+    """
+    Greedily pack consecutive tasks into groups for batched generation.
+    
+    A group grows until it reaches batch_size, until the expected completions would no
+    longer fit in BATCH_OUTPUT_SHARE of MAX_TOKENS, or until the prompt would exceed the model's token budget,
+    so short tasks are packed densely and long tasks get smaller groups.
+    
+    Yields:
+        Lists of (index, task, recipient_name) tuples
+    """
+    max_items = max(1, min(batch_size, int(MAX_TOKENS * BATCH_OUTPUT_SHARE) // EMAIL_OUTPUT_TOKENS))
+    budget = prompt_token_budget() - estimate_tokens(BATCH_PROMPT_TEMPLATE)
+    
+    group: List[Tuple[int, str, str]] = []
+    used = 0
+    for index, (task, recipient_name) in enumerate(tasks):
+        cost = estimate_tokens(task) + estimate_tokens(recipient_name) + BATCH_ITEM_OVERHEAD_TOKENS
+        if group and (len(group) >= max_items or used + cost > budget):
+            yield group
+            group, used = [], 0
+        group.append((index, task, recipient_name))
+        used += cost
+    if group:
+        yield group
+
+def iter_generated_emails(
+    tasks: Iterable[Tuple[str, str]],
+    max_in_flight: int = MAX_IN_FLIGHT,
+    max_retries: int = 3,
+    batch_size: int = BATCH_SIZE
+) -> Iterator[Tuple[int, Optional[Dict], Optional[Exception]]]:
+    """
+    Generate emails for many (task, recipient_name) pairs with bounded concurrency.
+    
+    Args:
+        tasks: Iterable of (task, recipient_name) pairs; consumed lazily
+        max_in_flight: Maximum number of OpenAI requests running at once
+        max_retries: Maximum number of retries for each API call
+        batch_size: Maximum tasks packed into one request (see iter_task_groups); 1 sends
+            one request per task
+    
+    Yields:
+        (index, email, error) tuples in completion order; email is None when generation failed
+    """
+    def generate(group: List[Tuple[int, str, str]]) -> List[Tuple[int, Union[Dict, Exception]]]:
+        indices = [index for index, _, _ in group]
+        if len(group) == 1:
+            _, task, recipient_name = group[0]
+            try:
+                return [(indices[0], generate_email_from_task(task, recipient_name, max_retries=max_retries))]
+            except Exception as e:
+                return [(indices[0], e)]
+        pairs = [(task, recipient_name) for _, task, recipient_name in group]
+        return list(zip(indices, generate_emails_batch(pairs, max_retries=max_retries)))
+    
+    for _, results, _ in iter_bounded(generate, iter_task_groups(tasks, batch_size), max_in_flight):
+        for index, outcome in results:
+            if isinstance(outcome, Exception):
+                logger.warning(f"Failed to generate email for task: {str(outcome)}")
+                yield index, None, outcome
+            else:
+                yield index, outcome, None
@@ -0,0 +1,129 @@
+import os
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from models import Task, GeneratedEmail
+from rollups import bump_daily_stats
+
+logger = logging.getLogger(__name__)
+
+# Persistence of generated emails
+PERSIST_CHUNK_SIZE = int(os.environ.get("EMAIL_PERSIST_CHUNK_SIZE", "500"))  # rows per bulk insert and commit
+EMAIL_REUSE_TTL = int(os.environ.get("EMAIL_REUSE_TTL", str(7 * 24 * 3600)))  # seconds; 0 disables reuse
+
+def task_lookup_key(task: str, recipient_name: str) -> str:
+    """Hash identifying the (task, recipient) pair an email was generated for."""
+    return hashlib.sha256(f"{task}\x00{recipient_name}".encode("utf-8")).hexdigest()
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def find_fresh_emails(pairs: Iterable[Tuple[str, str]], user_id: Optional[int] = None) -> Dict[str, Tuple[int, Dict]]:
+    """
+    Look up emails generated for user_id (None: anonymous uploads) within EMAIL_REUSE_TTL
+    for (task, recipient_name) pairs.
+
+    Returns:
+        Dict mapping task_lookup_key() to the newest matching email as a
+        (GeneratedEmail id, {'subject', 'body', 'tone'} dict) tuple
+    """
+    if EMAIL_REUSE_TTL <= 0:
+        return {}
+    keys = list({task_lookup_key(task, recipient_name) for task, recipient_name in pairs})
+    cutoff = datetime.utcnow() - timedelta(seconds=EMAIL_REUSE_TTL)
+
+    fresh = {}
+    try:
+        for chunk in _chunks(keys, PERSIST_CHUNK_SIZE):
+            rows = db.session.execute(
+                select(Task.lookup_key, GeneratedEmail.id, GeneratedEmail.subject, GeneratedEmail.content, GeneratedEmail.tone)
+                .join(GeneratedEmail, GeneratedEmail.task_id == Task.id)
+                .where(
+                    Task.lookup_key.in_(chunk),
+                    GeneratedEmail.user_id.is_(None) if user_id is None else GeneratedEmail.user_id == user_id,
+                    GeneratedEmail.created_at >= cutoff,
+                    GeneratedEmail.status != 'failed'
+                )
+                .order_by(GeneratedEmail.created_at, GeneratedEmail.id)
+            )
+            # Later rows are newer and overwrite older ones
+            for key, email_id, subject, body, tone in rows:
+                fresh[key] = (email_id, {'subject': subject, 'body': body, 'tone': tone})
+        db.session.commit()  # end the read transaction so SQLite doesn't hold its lock
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to look up previously generated emails: {str(e)}")
+        db.session.rollback()
+        return {}
+    return fresh
+
+class EmailWriter:
+    """
+    Buffer generated emails and persist them with chunked bulk inserts.
+
+    Each flush writes the buffered Task rows in one multi-row INSERT ... RETURNING (id),
+    then the matching GeneratedEmail rows the same way, bumps the daily 'generated'
+    rollup, and commits. Works on SQLite (3.35+) and Postgres.
+    """
+
+    def __init__(self, chunk_size: int = PERSIST_CHUNK_SIZE, user_id: Optional[int] = None):
+        self.chunk_size = max(1, chunk_size)
+        self.user_id = user_id
+        self.saved = 0
+        self._buffer: List[Tuple[Dict, Dict]] = []
+        self._ids: List[Optional[int]] = []  # ids of emails flushed since the last flush() returned
+
+    def add(self, task: str, email: str, recipient_name: str, generated_email: Dict) -> None:
+        """Queue one generated email, flushing once a full chunk is buffered."""
+        self._buffer.append((
+            {
+                'description': task,
+                'email': email[:120],
+                'recipient': recipient_name[:120],
+                'lookup_key': task_lookup_key(task, recipient_name),
+                'user_id': self.user_id
+            },
+            {
+                'subject': (generated_email.get('subject') or '')[:255],
+                'content': generated_email.get('body') or '',
+                'tone': (generated_email.get('tone') or '')[:20] or None,
+                'user_id': self.user_id,
+                'status': 'draft'
+            }
+        ))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> List[Optional[int]]:
+        """
+        Write everything buffered; a failed chunk is logged and dropped.
+
+        Returns:
+            GeneratedEmail ids of the emails added since the last call, in the order they
+            were added; None for emails in a chunk that failed to save
+        """
+        buffer, self._buffer = self._buffer, []
+        for chunk in _chunks(buffer, self.chunk_size):
+            try:
+                task_ids = db.session.scalars(
+                    insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                    [task_row for task_row, _ in chunk]
+                ).all()
+                email_ids = db.session.scalars(
+                    insert(GeneratedEmail).returning(GeneratedEmail.id, sort_by_parameter_order=True),
+                    [{**email_row, 'task_id': task_id} for (_, email_row), task_id in zip(chunk, task_ids)]
+                ).all()
+                bump_daily_stats({(self.user_id, datetime.utcnow().date()): {'generated': len(chunk)}})
+                db.session.commit()
+                self.saved += len(chunk)
+                self._ids.extend(email_ids)
+            except SQLAlchemyError as e:
+                logger.error(f"Failed to save {len(chunk)} generated emails: {str(e)}")
+                db.session.rollback()
+                self._ids.extend([None] * len(chunk))
+        ids, self._ids = self._ids, []
+        return ids
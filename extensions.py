@@ -1,9 +1,113 @@
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from flask import has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
 from flask_login import LoginManager
+import metrics
+
+# Connection pool for the single engine every model and request shares (ignored for SQLite)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "300"))  # seconds before a connection is replaced
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))  # PostgreSQL only; 0 disables
+REPLICA_BIND = 'replica'  # bind key of the optional read replica (DATABASE_REPLICA_URL)
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
+
+def normalize_database_url(url: Optional[str]) -> Optional[str]:
+    # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+def engine_options(url: Optional[str]) -> Dict[str, Any]:
+    """
+    Engine options for a database URL.
+
+    Server databases get a sized QueuePool and, on PostgreSQL, a server-side statement
+    timeout. SQLite keeps SQLAlchemy's default pool, which has no size settings.
+    """
+    options: Dict[str, Any] = {
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if not url or url.startswith("sqlite"):
+        return options
+    options.update({
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    })
+    if url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+def database_config(url: Optional[str] = None, replica_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Flask-SQLAlchemy settings for the primary database and the optional replica.
+
+    Args:
+        url: Primary database URL (defaults to DATABASE_URL)
+        replica_url: Read replica for read-only queries such as the dashboard (defaults to DATABASE_REPLICA_URL)
+    """
+    url = normalize_database_url(url or os.environ.get("DATABASE_URL"))
+    replica_url = normalize_database_url(replica_url or os.environ.get("DATABASE_REPLICA_URL"))
+    config = {
+        "SQLALCHEMY_DATABASE_URI": url,
+        "SQLALCHEMY_ENGINE_OPTIONS": engine_options(url),
+        "SQLALCHEMY_BINDS": {},
+    }
+    if replica_url:
+        config["SQLALCHEMY_BINDS"][REPLICA_BIND] = {"url": replica_url, **engine_options(replica_url)}
+    return config
+
+@contextmanager
+def read_session() -> Iterator[Session]:
+    """
+    Session for read-only queries, on the replica when one is configured.
+
+    Without a replica this is db.session. Replica sessions are closed on exit; objects
+    loaded through them keep their loaded columns but can't lazy-load relationships.
+    Must run inside an application context.
+    """
+    engine = db.engines.get(REPLICA_BIND)
+    if engine is None:
+        yield db.session
+        return
+    session = Session(bind=engine)
+    try:
+        yield session
+    finally:
+        session.close()
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Connection pool utilization per bind ('default' is the primary). Needs an app context."""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue  # e.g. SQLite's in-memory StaticPool
+        stats[key or "default"] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),  # negative while below pool size
+            "checked_in": pool.checkedin(),
+        }
+    return stats
+
+def _pool_value(bind: str, field: str) -> float:
+    if not has_app_context():
+        return 0
+    return pool_stats().get(bind, {}).get(field, 0)
+
+metrics.gauge('db_pool_size', 'Connections kept in the primary database pool.', lambda: _pool_value("default", "size"))
+metrics.gauge('db_pool_checked_out', 'Primary database connections currently in use.', lambda: _pool_value("default", "checked_out"))
+metrics.gauge('db_pool_overflow', 'Primary database connections open beyond the pool size.', lambda: _pool_value("default", "overflow"))
+metrics.gauge('db_replica_pool_checked_out', 'Read replica connections currently in use.', lambda: _pool_value(REPLICA_BIND, "checked_out"))
@@ -0,0 +1,218 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from typing import IO, Callable, Dict, Optional
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Number of background worker threads processing uploads
+JOB_WORKERS = int(os.environ.get("UPLOAD_JOB_WORKERS", "2"))
+# Queued and running jobs each hold their upload (up to UPLOAD_SPOOL_MAX_SIZE in memory);
+# beyond this many, new uploads are rejected instead of piling up
+MAX_PENDING_JOBS = int(os.environ.get("UPLOAD_JOB_MAX_PENDING", "16"))
+PROGRESS_FLUSH_INTERVAL = 1.0  # seconds between progress writes to the database
+# Fail jobs left queued/running by a previous process at startup; disable when several
+# processes share the database, or one process's start would fail another's live jobs
+RECOVER_STALE_JOBS = os.environ.get("UPLOAD_JOB_RECOVER_ON_START", "true").lower() in ("1", "true", "yes")
+INTERRUPTED_ERROR = 'Job was interrupted by a restart; please upload the file again'
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.enqueue when MAX_PENDING_JOBS jobs are already waiting or running."""
+    pass
+
+class JobProgress:
+    """Thread-safe progress counters for a running job, persisted to the job row periodically."""
+
+    def __init__(self, queue: 'JobQueue', job_id: str):
+        self._queue = queue
+        self._job_id = job_id
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+
+    def set_total(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+        self.flush(force=True)
+
+    def add_total(self, count: int) -> None:
+        with self._lock:
+            self.total += count
+        self.flush()
+
+    def advance(self, succeeded: bool = True) -> None:
+        with self._lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self.flush()
+
+    def flush(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < PROGRESS_FLUSH_INTERVAL:
+                return
+            self._last_flush = now
+            values = {'total': self.total, 'completed': self.completed, 'failed': self.failed}
+        self._queue._update(self._job_id, **values)
+
+class JobQueue:
+    """
+    Local background job queue for upload processing.
+
+    Jobs are recorded in the UploadJob table and executed on an in-process thread pool,
+    so no external broker is needed. Handlers are registered per job kind and are called
+    as handler(upload, filename, progress, user_id=...) with the uploaded file object,
+    which stays in memory until the job runs, and the uploading user's id; they return
+    the final payload or raise an exception carrying an optional status_code attribute.
+
+    Queued uploads don't survive the process, so at startup any job still marked queued
+    or running is failed (see RECOVER_STALE_JOBS) instead of being polled forever.
+    """
+
+    def __init__(self, app=None, max_workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self._handlers: Dict[str, Callable] = {}
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix='upload-job'
+        )
+        app.extensions['job_queue'] = self
+        if RECOVER_STALE_JOBS:
+            self.fail_stale_jobs()
+
+    def fail_stale_jobs(self) -> int:
+        """Mark jobs left queued or running by an earlier process as failed. Returns the count."""
+        from models import UploadJob
+
+        with self._app.app_context():
+            try:
+                failed = db.session.execute(
+                    update(UploadJob)
+                    .where(UploadJob.status.in_(('queued', 'running')))
+                    .values(status='failed', error=INTERRUPTED_ERROR, error_code=500, finished_at=datetime.utcnow())
+                ).rowcount
+                db.session.commit()
+            except SQLAlchemyError as e:
+                # e.g. the schema has not been created yet (flask init-db)
+                db.session.rollback()
+                logger.warning(f"Could not recover stale upload jobs: {str(e)}")
+                return 0
+            finally:
+                db.session.remove()
+        if failed:
+            logger.warning(f"Marked {failed} interrupted upload job(s) as failed")
+        return failed
+
+    def register(self, kind: str, handler: Callable) -> None:
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, filename: str, upload: IO[bytes], job_id: Optional[str] = None, user_id: Optional[int] = None) -> str:
+        """
+        Record a queued job and schedule it on the worker pool; the job owns upload.
+
+        user_id is the uploading user (None for anonymous uploads), captured here because
+        the worker thread has no request context; it is passed on to the handler.
+
+        Returns:
+            The job id
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running; upload is
+                left to the caller
+        """
+        from models import UploadJob
+
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job type: {kind}")
+        if self._executor is None:
+            raise RuntimeError("JobQueue is not initialized with an application")
+
+        with self._pending_lock:
+            if self._pending >= self._max_pending:
+                raise QueueFullError(f"{self._pending} uploads are already being processed")
+            self._pending += 1
+        try:
+            job_id = job_id or new_job_id()
+            db.session.add(UploadJob(id=job_id, kind=kind, filename=filename))
+            db.session.commit()
+            self._executor.submit(self._run, job_id, upload, user_id)
+        except BaseException:
+            self._release()
+            raise
+        return job_id
+
+    def _release(self) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _run(self, job_id: str, upload: IO[bytes], user_id: Optional[int]) -> None:
+        try:
+            self._process(job_id, upload, user_id)
+        finally:
+            self._release()
+
+    def _process(self, job_id: str, upload: IO[bytes], user_id: Optional[int]) -> None:
+        from models import UploadJob
+
+        with self._app.app_context(), closing(upload):
+            job = db.session.get(UploadJob, job_id)
+            if job is None:
+                logger.error(f"Job {job_id} vanished before it could run")
+                return
+            kind, filename = job.kind, job.filename
+            db.session.close()
+            self._update(job_id, status='running', started_at=datetime.utcnow())
+
+            progress = JobProgress(self, job_id)
+            try:
+                result = self._handlers[kind](upload, filename, progress, user_id=user_id)
+                progress.flush(force=True)
+                self._update(job_id, status='succeeded', result=result, finished_at=datetime.utcnow())
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                progress.flush(force=True)
+                self._update(
+                    job_id,
+                    status='failed',
+                    error=str(e),
+                    error_code=getattr(e, 'status_code', 500),
+                    finished_at=datetime.utcnow()
+                )
+
+    def _update(self, job_id: str, **values) -> None:
+        from models import UploadJob
+
+        with self._app.app_context():
+            try:
+                db.session.execute(update(UploadJob).where(UploadJob.id == job_id).values(**values))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to update job {job_id}: {str(e)}")
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+job_queue = JobQueue()
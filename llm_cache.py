@@ -0,0 +1,212 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+MEMORY_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1024"))
+DISK_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3")  # empty string disables the disk tier
+DISK_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_MAX_ENTRIES", "100000"))
+DISK_EVICTION_INTERVAL = 100  # writes between disk eviction passes
+
+def make_cache_key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """Build a content-addressed key from everything that determines the completion."""
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier LRU cache for OpenAI responses with a TTL.
+
+    The first tier is an in-process OrderedDict; the second is a SQLite file shared by
+    every worker process on the box. Both tiers are size bounded and evict the least
+    recently used entries first.
+    """
+
+    def __init__(
+        self,
+        ttl: int = CACHE_TTL,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+        disk_path: Optional[str] = DISK_CACHE_PATH,
+        disk_max_entries: int = DISK_MAX_ENTRIES,
+        enabled: bool = CACHE_ENABLED
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path or None
+        self.disk_max_entries = disk_max_entries
+        self.enabled = enabled
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss or expiry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        entry = self._disk_get(key, now)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+        value, created_at = entry
+        # Keep the disk entry's remaining lifetime rather than starting a new TTL
+        self._memory_set(key, value, created_at + self.ttl)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers."""
+        if not self.enabled:
+            return
+        now = time.time()
+        self._memory_set(key, value, now + self.ttl)
+        self._disk_set(key, value, now)
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def delete(self, key: str) -> None:
+        """Remove key from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            with self._disk_lock:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache delete failed: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        conn = self._connect()
+        if conn is not None:
+            with self._disk_lock:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+
+    def _memory_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the disk tier lazily; disable it for this process if it can't be opened."""
+        if self.disk_path is None:
+            return None
+        with self._disk_lock:
+            if self._disk is None:
+                try:
+                    conn = sqlite3.connect(self.disk_path, timeout=5, check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS llm_cache ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                        "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+                    conn.commit()
+                    self._disk = conn
+                except sqlite3.Error as e:
+                    logger.warning(f"Disabling on-disk LLM cache at {self.disk_path}: {str(e)}")
+                    self.disk_path = None
+                    return None
+            return self._disk
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """Return (value, created_at) for a live disk entry."""
+        conn = self._connect()
+        if conn is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created_at = row
+                if created_at + self.ttl <= now:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return value, created_at
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, value: str, now: float) -> None:
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            with self._disk_lock:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= DISK_EVICTION_INTERVAL:
+                    self._writes_since_eviction = 0
+                    self._evict_disk(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+    def _evict_disk(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the least recently used rows beyond the size bound."""
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        overflow = conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        ).rowcount
+        with self._lock:
+            self._stats["evictions"] += expired + overflow
+
+response_cache = ResponseCache()
+
+metrics.gauge('llm_cache_memory_entries', 'Responses held in the in-memory cache tier.', lambda: response_cache.stats()["memory_entries"])
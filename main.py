@@ -1,6 +1,6 @@
 import os
 import logging
-from app import app
+from app import app, init_db
 
 # Configure logging
 logging.basicConfig(
@@ -15,6 +15,10 @@ if __name__ == "__main__":
         port = int(os.environ.get("PORT", "8080"))
         logger.info(f"Starting server on port {port}")
         
+        # The dev server creates and upgrades the tables itself; other deployments run `flask --app app init-db`
+        with app.app_context():
+            init_db()
+        
         # Run the app with host set to 0.0.0.0 to make it publicly accessible
         app.run(host="0.0.0.0", port=port)
     except ValueError as e:
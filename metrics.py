@@ -0,0 +1,220 @@
+import os
+import time
+import bisect
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from flask import Blueprint, Response
+
+# Instrumentation is decided once at import; when disabled, decorators return the
+# wrapped function itself and recording calls return immediately
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LabelValues = Tuple[str, ...]
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _labels(self, key: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{self._labels(key)} {value}' for key, value in sorted(self._values.items())]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List] = {}  # key -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the with-block."""
+        if not METRICS_ENABLED:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{self.name}_bucket{self._labels(key, {"le": le})} {cumulative}')
+                lines.append(f'{self.name}_sum{self._labels(key)} {total}')
+                lines.append(f'{self.name}_count{self._labels(key)} {count}')
+        return lines
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback when /metrics is scraped."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        return [f'{self.name} {self.callback()}']
+
+_registry: List[_Metric] = []
+_registry_lock = threading.Lock()
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, documentation, labels))
+
+def histogram(name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, labels, buckets))
+
+def gauge(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    return _register(Gauge(name, documentation, callback))
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# Hot-path stages of /upload and /send-email
+stage_duration = histogram('stage_duration_seconds', 'Time spent in each processing stage.', ['stage'])
+
+def timed(stage: str) -> Callable:
+    """Decorator recording each call's duration under stage_duration_seconds{stage=...}."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_duration.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _timed_iter(iterable, spent: List[float]) -> Iterator:
+    # Accumulates the time spent producing each item into spent[0]
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            spent[0] += time.perf_counter() - started
+        yield item
+
+def timed_generator(stage: str, source: Optional[str] = None) -> Callable:
+    """
+    Decorator for generator functions recording the time spent inside the generator.
+
+    Time the consumer spends between items is excluded; one observation is recorded when
+    the generator finishes or is closed. source names an iterable argument the generator
+    pulls its input from (e.g. pages still being extracted); time spent producing that
+    input is excluded too, as it belongs to the producer's own stage.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            upstream = [0.0]
+            if source is not None:
+                bound = signature.bind(*args, **kwargs)
+                value = bound.arguments.get(source)
+                if value is not None and not isinstance(value, (str, bytes)):
+                    bound.arguments[source] = _timed_iter(value, upstream)
+                    args, kwargs = bound.args, bound.kwargs
+            generator = func(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield item
+            except StopIteration:
+                return
+            finally:
+                generator.close()
+                stage_duration.observe(max(0.0, elapsed - upstream[0]), stage=stage)
+        return wrapper
+    return decorator
+
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return Response('metrics are disabled\n', status=404, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
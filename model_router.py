@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# Routing configuration
+STATS_WINDOW = int(os.environ.get("OPENAI_ROUTER_WINDOW", "200"))  # most recent calls kept per model
+MIN_SAMPLES = 20  # calls needed before a model's percentiles are trusted
+ERROR_RATE_THRESHOLD = float(os.environ.get("OPENAI_ROUTER_MAX_ERROR_RATE", "0.5"))
+HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_DELAY = float(os.environ.get("OPENAI_HEDGE_DELAY", "10"))  # seconds, until p95 is known
+
+class ModelStats:
+    """Rolling latency and error-rate window for one model."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        if ok and latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(ok)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def error_rate(self) -> float:
+        if len(self.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+class ModelRouter:
+    """
+    Per-model latency/error tracking used to order models and time hedged requests.
+
+    Models keep their configured preference order unless one's recent error rate passes
+    ERROR_RATE_THRESHOLD, in which case it is moved behind the healthy ones. A call on the
+    primary model is hedged once it runs longer than the model's rolling p95, with a model
+    whose median latency is lower.
+    """
+
+    def __init__(self, models: List[str]):
+        self.models = list(models)
+        self._stats = {model: ModelStats() for model in self.models}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: Optional[float], ok: bool) -> None:
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).record(latency, ok)
+
+    def order(self) -> List[str]:
+        """Models in the order they should be tried."""
+        with self._lock:
+            healthy = [m for m in self.models if self._stats[m].error_rate() <= ERROR_RATE_THRESHOLD]
+            return healthy + [m for m in self.models if m not in healthy]
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait on model before sending a hedged request."""
+        with self._lock:
+            p95 = self._stats[model].percentile(HEDGE_PERCENTILE)
+        return p95 if p95 is not None else DEFAULT_HEDGE_DELAY
+
+    def hedge_model(self, primary: str, candidates: List[str]) -> Optional[str]:
+        """
+        The healthy candidate to hedge primary with: the one with the lowest median latency
+        below primary's. Until either side has enough samples to compare, candidates are
+        taken in preference order. None if no candidate is expected to be faster.
+        """
+        with self._lock:
+            primary_p50 = self._stats[primary].percentile(50)
+            faster, unmeasured = [], []
+            for m in candidates:
+                if m == primary or self._stats[m].error_rate() > ERROR_RATE_THRESHOLD:
+                    continue
+                p50 = self._stats[m].percentile(50)
+                if p50 is None or primary_p50 is None:
+                    unmeasured.append(m)
+                elif p50 < primary_p50:
+                    faster.append((p50, m))
+            if faster:
+                return min(faster, key=lambda option: option[0])[1]
+            return unmeasured[0] if unmeasured else None
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            return {
+                model: {
+                    "p50": stats.percentile(50),
+                    "p95": stats.percentile(95),
+                    "error_rate": stats.error_rate(),
+                    "samples": len(stats.outcomes),
+                }
+                for model, stats in self._stats.items()
+            }
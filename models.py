@@ -17,27 +17,33 @@ class User(UserMixin, db.Model):
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    description = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text, nullable=False)
     email = db.Column(db.String(120), nullable=False)
     recipient = db.Column(db.String(120), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lookup_key = db.Column(db.String(64), index=True)  # SHA-256 of (description, recipient), for reuse lookups
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # NULL for anonymous uploads
     user = db.relationship('User', backref=db.backref('tasks', lazy=True))
 
 class PDFAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, index=True)  # SHA-256 of the file bytes
     filename = db.Column(db.String(255), nullable=False)
-    analysis = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    text = db.Column(db.Text)  # extracted text, reused instead of parsing the same file again
+    analysis = db.Column(db.Text)  # combined analysis JSON; only stored once every chunk succeeded
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # drives retention
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # uploads can be anonymous
     user = db.relationship('User', backref=db.backref('analyses', lazy=True))
 
 class GeneratedEmail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # NULL for anonymous uploads
     user = db.relationship('User', backref=db.backref('emails', lazy=True))
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     subject = db.Column(db.String(255))
+    tone = db.Column(db.String(20))
     status = db.Column(db.String(20), default='draft')  # draft, sent, failed
     sent_at = db.Column(db.DateTime)
     
@@ -46,12 +52,62 @@ class GeneratedEmail(db.Model):
     clicks = db.Column(db.Integer, default=0)
     replies = db.Column(db.Integer, default=0)
     bounces = db.Column(db.Integer, default=0)
+    
+    __table_args__ = (db.Index('ix_generated_email_user_id_created_at', 'user_id', 'created_at'),)
 
 class EmailEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    email_id = db.Column(db.Integer, db.ForeignKey('generated_email.id'), nullable=False)
-    event_type = db.Column(db.String(20), nullable=False)  # open, click, reply, bounce
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    email_id = db.Column(db.Integer, db.ForeignKey('generated_email.id'), nullable=False, index=True)
+    event_type = db.Column(db.String(20), nullable=False, index=True)  # open, click, reply, bounce
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     event_metadata = db.Column(db.JSON)  # Additional event data (e.g., link clicked, device info)
     
     email = db.relationship('GeneratedEmail', backref=db.backref('events', lazy=True))
+
+class DailyEmailStats(db.Model):
+    # Per-user, per-day counters kept up to date by rollups.py so the dashboard never scans events
+    user_id = db.Column(db.Integer, primary_key=True)  # 0 for anonymous uploads
+    day = db.Column(db.Date, primary_key=True)
+    generated = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    opens = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    replies = db.Column(db.Integer, nullable=False, default=0)
+    bounces = db.Column(db.Integer, nullable=False, default=0)
+
+class UploadJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(20), nullable=False)  # excel, pdf
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Progress (rows for Excel jobs, chunks for PDF jobs)
+    total = db.Column(db.Integer, default=0)
+    completed = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    
+    # Outcome
+    result = db.Column(db.JSON)  # Final payload, same shape as the synchronous /upload response
+    error = db.Column(db.Text)
+    error_code = db.Column(db.Integer)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': {
+                'total': self.total or 0,
+                'completed': self.completed or 0,
+                'failed': self.failed or 0
+            },
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
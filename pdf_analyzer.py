@@ -1,15 +1,54 @@
 import os
-import PyPDF2
-from typing import Dict, List, Optional, Generator
+import re
+import math
+import mmap
+import shutil
+import logging
+import multiprocessing
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, List, Optional, Generator, Tuple, Union
 import json
 import time
-from chat_request import send_openai_request, validate_json_response
+from contextlib import closing
+from chat_request import (
+    MODEL_CONTEXT_WINDOWS, send_openai_request, async_send_openai_request, validate_json_response,
+    count_tokens, has_exact_token_counts, prompt_token_budget
+)
+from utils import iter_bounded
+from metrics import timed, timed_generator
 
 # Constants
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-CHUNK_SIZE = 2000  # words per chunk
+MAX_FILE_SIZE = int(os.environ.get("PDF_MAX_FILE_SIZE", str(50 * 1024 * 1024)))  # 50MB; pages are streamed, not buffered
+# Chunks are packed with whole sentences up to the model's prompt budget, measured in tokens
+CHUNK_MAX_TOKENS = int(os.environ.get("PDF_CHUNK_MAX_TOKENS", "0"))  # caps the chunk size; 0 fills the whole prompt budget
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("PDF_CHUNK_OVERLAP_TOKENS", "0"))  # trailing sentences repeated at the start of the next chunk
+CHUNK_MODEL = os.environ.get("PDF_CHUNK_MODEL") or None  # size chunks for this model; default fits every fallback model
+# Share of the budget filled when token counts are estimated (tiktoken missing); dense text undercounts
+CHUNK_ESTIMATE_MARGIN = float(os.environ.get("PDF_CHUNK_ESTIMATE_MARGIN", "0.85"))
+if CHUNK_MODEL is not None and CHUNK_MODEL not in MODEL_CONTEXT_WINDOWS:
+    raise ValueError(f"PDF_CHUNK_MODEL must be one of {', '.join(MODEL_CONTEXT_WINDOWS)}, got {CHUNK_MODEL!r}")
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
 MAX_RETRIES = 3
 TIMEOUT = 30  # seconds
+MAX_WORKERS = int(os.environ.get("PDF_ANALYSIS_MAX_WORKERS", "4"))  # chunks analyzed concurrently
+
+# Multiprocess text extraction for long documents
+MULTIPROCESS_PAGE_THRESHOLD = int(os.environ.get("PDF_MULTIPROCESS_PAGE_THRESHOLD", "50"))
+EXTRACTION_PROCESSES = int(os.environ.get("PDF_EXTRACTION_PROCESSES", str(os.cpu_count() or 1)))
+# Workers are started from a clean server process, not forked from this multi-threaded one
+EXTRACTION_START_METHOD = os.environ.get("PDF_EXTRACTION_START_METHOD", "forkserver")
+MIN_PAGES_PER_TASK = 8
+TASKS_PER_WORKER = 2  # each worker re-opens the PDF per range, so ranges are few and large
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
 
 class PDFAnalysisError(Exception):
     """Custom exception for PDF analysis errors"""
@@ -39,8 +78,110 @@ def check_file_size(file) -> None:
     if size > MAX_FILE_SIZE:
         raise PDFAnalysisError(f"File size exceeds maximum limit of {MAX_FILE_SIZE/1024/1024:.1f}MB")
 
-def extract_text_from_pdf(pdf_file) -> str:
-    """Extract text content from a PDF file with enhanced error handling."""
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Process pool worker: open the PDF independently (memory-mapped) and extract pages [start, end)."""
+    import PyPDF2
+    
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        pdf_reader = PyPDF2.PdfReader(mapped)
+        texts = []
+        for page_index in range(start, end):
+            try:
+                texts.append(pdf_reader.pages[page_index].extract_text() or "")
+            except Exception as e:
+                raise PDFAnalysisError(f"Error extracting text from page {page_index + 1}: {str(e)}")
+        return texts
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            method = EXTRACTION_START_METHOD
+            if method not in multiprocessing.get_all_start_methods():
+                method = "spawn"  # forkserver is POSIX-only
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_PROCESSES,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return _extraction_pool
+
+def _reset_extraction_pool() -> None:
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+def _iter_pages_inline(pdf_reader: "PyPDF2.PdfReader", start: int = 0) -> Generator[str, None, None]:
+    for page_index in range(start, len(pdf_reader.pages)):
+        try:
+            yield pdf_reader.pages[page_index].extract_text()
+        except Exception as e:
+            raise PDFAnalysisError(f"Error extracting text from page {page_index + 1}: {str(e)}")
+
+def _pages_per_task(total_pages: int) -> int:
+    return max(MIN_PAGES_PER_TASK, math.ceil(total_pages / (EXTRACTION_PROCESSES * TASKS_PER_WORKER)))
+
+def _iter_pages_multiprocess(pdf_file, pdf_reader: "PyPDF2.PdfReader") -> Generator[str, None, None]:
+    """
+    Extract page ranges on the process pool and yield page texts in page order.
+    
+    If the pool breaks (e.g. a worker was killed), the pool is replaced for later
+    documents and the remaining pages of this one are extracted inline.
+    """
+    total_pages = len(pdf_reader.pages)
+    path = getattr(pdf_file, 'name', None)
+    temp_path = None
+    if not isinstance(path, str) or not os.path.isfile(path):
+        # Workers open the file themselves, so in-memory uploads are spilled to disk once
+        pdf_file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+            shutil.copyfileobj(pdf_file, temp_file)
+            path = temp_path = temp_file.name
+    
+    pages_per_task = _pages_per_task(total_pages)
+    ranges = iter(range(0, total_pages, pages_per_task))
+    pending = deque()
+    next_page = 0  # first page not yet yielded
+    
+    def submit_next() -> None:
+        start = next(ranges, None)
+        if start is not None:
+            pending.append(pool.submit(_extract_page_range, path, start, min(start + pages_per_task, total_pages)))
+    
+    try:
+        try:
+            pool = _get_extraction_pool()
+            # Keep every worker busy while holding only a bounded number of finished ranges
+            for _ in range(EXTRACTION_PROCESSES * 2):
+                submit_next()
+            while pending:
+                texts = pending.popleft().result()
+                submit_next()
+                for page_text in texts:
+                    next_page += 1
+                    yield page_text
+        except BrokenProcessPool as e:
+            logger.warning(f"PDF extraction pool broke, extracting the remaining pages inline: {str(e)}")
+            _reset_extraction_pool()
+            yield from _iter_pages_inline(pdf_reader, start=next_page)
+    finally:
+        for future in pending:
+            future.cancel()
+        if temp_path:
+            os.remove(temp_path)
+
+@timed_generator('pdf_extract_pages')
+def iter_pdf_pages(pdf_file) -> Generator[str, None, None]:
+    """
+    Yield the text of each page lazily, so later stages can start before the whole
+    document has been parsed. Pages without text are skipped.
+    
+    Documents with at least MULTIPROCESS_PAGE_THRESHOLD pages are extracted on a process
+    pool, since PyPDF2's extraction is CPU-bound and would otherwise run on one core.
+    """
+    import PyPDF2  # imported on first use to keep app startup fast
+    
     try:
         check_file_size(pdf_file)
         
@@ -48,54 +189,172 @@ def extract_text_from_pdf(pdf_file) -> str:
         if not pdf_reader.pages:
             raise PDFAnalysisError("PDF file appears to be empty")
         
-        text = ""
         total_pages = len(pdf_reader.pages)
+        if EXTRACTION_PROCESSES > 1 and total_pages >= MULTIPROCESS_PAGE_THRESHOLD:
+            pages = _iter_pages_multiprocess(pdf_file, pdf_reader)
+        else:
+            pages = _iter_pages_inline(pdf_reader)
         
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            try:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            except Exception as e:
-                raise PDFAnalysisError(f"Error extracting text from page {page_num}: {str(e)}")
-        
-        if not text.strip():
-            raise PDFAnalysisError("No readable text content found in PDF")
-        
-        return text
-    except PyPDF2.PdfReadError as e:
+        for page_text in pages:
+            if page_text:
+                yield page_text
+    except PyPDF2.errors.PdfReadError as e:
         raise PDFAnalysisError(f"Failed to read PDF file: {str(e)}")
     except Exception as e:
         if isinstance(e, PDFAnalysisError):
             raise
         raise PDFAnalysisError(f"Error processing PDF file: {str(e)}")
 
-def chunk_text(text: str) -> Generator[str, None, None]:
-    """Split text into manageable chunks for analysis."""
-    words = text.split()
-    for i in range(0, len(words), CHUNK_SIZE):
-        chunk = ' '.join(words[i:i + CHUNK_SIZE])
-        if chunk.strip():
-            yield chunk
+@timed('extract_text_from_pdf')
+def extract_text_from_pdf(pdf_file) -> str:
+    """Extract text content from a PDF file with enhanced error handling."""
+    text = "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_file))
+    
+    if not text.strip():
+        raise PDFAnalysisError("No readable text content found in PDF")
+    
+    return text
 
-def analyze_document_segment(text_segment: str, max_retries: int = MAX_RETRIES) -> Dict:
-    """Analyze a segment of text with enhanced error handling and timeout."""
-    if not text_segment or not text_segment.strip():
-        raise PDFAnalysisError("Empty text segment provided for analysis")
+def chunk_token_budget(model: Optional[str] = CHUNK_MODEL) -> int:
+    """
+    Tokens of document text per chunk: the prompt budget minus the analysis instructions.
 
-    prompt = f"""
-    Analyze the following text segment for inconsistencies, logical fallacies, and unsupported statements.
-    Return the analysis in JSON format with exactly this structure:
-    {{
-        "inconsistencies": ["List of identified inconsistencies"],
-        "logical_fallacies": ["List of logical fallacies found"],
-        "unsupported_statements": ["List of statements that lack proper support or evidence"],
-        "suggestions": ["List of suggestions for improvement"]
-    }}
+    When token counts are only estimated, just CHUNK_ESTIMATE_MARGIN of that budget is used.
+    """
+    budget = prompt_token_budget(model) - count_tokens(build_analysis_prompt(''), model)
+    if not has_exact_token_counts(model):
+        budget = int(budget * CHUNK_ESTIMATE_MARGIN)
+    if CHUNK_MAX_TOKENS > 0:
+        budget = min(budget, CHUNK_MAX_TOKENS)
+    return max(budget, 1)
 
-    Text to analyze:
-    {text_segment}
+def _iter_sentences(pages: Iterable[str]) -> Generator[Tuple[str, bool], None, None]:
+    """Yield (sentence, starts_paragraph) pairs; each page starts a new paragraph."""
+    for page_text in pages:
+        for paragraph in PARAGRAPH_BREAK.split(page_text):
+            starts_paragraph = True
+            for sentence in SENTENCE_BREAK.split(paragraph):
+                sentence = ' '.join(sentence.split())
+                if sentence:
+                    yield sentence, starts_paragraph
+                    starts_paragraph = False
+
+def _split_sentence(sentence: str, budget: int, model: Optional[str]) -> List[str]:
+    # A sentence too long for a chunk of its own is cut between words
+    pieces: List[str] = []
+    words: List[str] = []
+    used = 0
+    for word in sentence.split():
+        cost = count_tokens(word, model) + 1
+        if words and used + cost > budget:
+            pieces.append(' '.join(words))
+            words, used = [], 0
+        words.append(word)
+        used += cost
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
+
+def _join_sentences(units: List[Tuple[str, int, bool]]) -> str:
+    parts = []
+    for sentence, _, starts_paragraph in units:
+        if parts:
+            parts.append('\n\n' if starts_paragraph else ' ')
+        parts.append(sentence)
+    return ''.join(parts)
+
+@timed_generator('chunk_text', source='text')
+def chunk_text(
+    text: Union[str, Iterable[str]],
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    model: Optional[str] = CHUNK_MODEL
+) -> Generator[str, None, None]:
+    """
+    Split text into chunks of at most max_tokens tokens, cut on sentence boundaries.
+    
+    Sentences are packed greedily. When a chunk is full and its last paragraph break lies
+    in its final quarter, the chunk ends at that break instead and the rest carries over.
+    Each chunk after the first repeats up to overlap_tokens of the previous chunk's
+    trailing sentences. Accepts a whole document or an iterable of page texts; pages are
+    consumed lazily and only the current chunk is held in memory.
+    
+    Args:
+        text: Document text or page texts
+        max_tokens: Token budget per chunk (defaults to chunk_token_budget(model))
+        overlap_tokens: Tokens of context repeated between chunks (defaults to CHUNK_OVERLAP_TOKENS)
+        model: Model whose tokenizer and context window size the chunks
     """
+    budget = max_tokens or chunk_token_budget(model)
+    overlap_tokens = min(CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens, budget // 2)
+    pages = [text] if isinstance(text, str) else text
+    
+    units: List[Tuple[str, int, bool]] = []  # (sentence, tokens, starts_paragraph)
+    used = 0
+    repeated = 0  # leading units carried over as overlap, already sent in the previous chunk
+    
+    for sentence, starts_paragraph in _iter_sentences(pages):
+        tokens = count_tokens(sentence, model) + 1
+        pieces = [(sentence, tokens)] if tokens <= budget else [
+            (piece, count_tokens(piece, model) + 1) for piece in _split_sentence(sentence, budget, model)
+        ]
+        for piece, tokens in pieces:
+            while len(units) > repeated and used + tokens > budget:
+                cut = len(units)
+                prefix = 0
+                for i, (_, unit_tokens, unit_starts_paragraph) in enumerate(units):
+                    if i > repeated and unit_starts_paragraph and prefix >= budget * 3 // 4:
+                        cut = i
+                    prefix += unit_tokens
+                yield _join_sentences(units[:cut])
+                
+                overlap: List[Tuple[str, int, bool]] = []
+                overlap_used = 0
+                for unit in reversed(units[:cut]):
+                    if overlap_used + unit[1] > overlap_tokens:
+                        break
+                    overlap.insert(0, unit)
+                    overlap_used += unit[1]
+                units = overlap + units[cut:]
+                used = sum(unit_tokens for _, unit_tokens, _ in units)
+                repeated = len(overlap)
+            # Overlap gives way when it would push a new sentence out of the chunk
+            while repeated and used + tokens > budget:
+                used -= units.pop(0)[1]
+                repeated -= 1
+            units.append((piece, tokens, starts_paragraph))
+            used += tokens
+            starts_paragraph = False
+    if len(units) > repeated:
+        yield _join_sentences(units)
+
+def _iter_document_chunks(
+    pdf_file,
+    pages: Optional[Iterable[str]] = None,
+    on_total: Optional[Callable[[int], None]] = None
+) -> Generator[str, None, None]:
+    """
+    Extract and chunk a PDF lazily, so analysis can start on the first chunk while later
+    pages are still being parsed.
+
+    Raises:
+        PDFAnalysisError: If the document has no readable text
+    """
+    total = 0
+    for chunk in chunk_text(iter_pdf_pages(pdf_file) if pages is None else pages):
+        total += 1
+        yield chunk
+    if not total:
+        raise PDFAnalysisError("No readable text content found in PDF")
+    if on_total:
+        on_total(total)
+
+def analyze_document_segment(text_segment: str, max_retries: int = MAX_RETRIES, use_cache: bool = True) -> Dict:
+    """Analyze a segment of text with enhanced error handling and timeout; identical segments are served from the response cache unless use_cache is False."""
+    if not text_segment or not text_segment.strip():
+        raise PDFAnalysisError("Empty text segment provided for analysis")
+
+    prompt = build_analysis_prompt(text_segment)
     
     start_time = time.time()
     try:
@@ -103,57 +362,125 @@ def analyze_document_segment(text_segment: str, max_retries: int = MAX_RETRIES)
         if time.time() - start_time > TIMEOUT:
             raise PDFAnalysisError("Analysis timeout exceeded")
             
-        response_str = send_openai_request(prompt, retries=max_retries)
-        
-        # Parse and validate response
-        response = json.loads(response_str)
-        validate_analysis_response(response)
-        
-        return response
+        response_str = send_openai_request(prompt, retries=max_retries, use_cache=use_cache, validator=parse_analysis_response)
+        return parse_analysis_response(response_str)
     except json.JSONDecodeError as e:
         raise PDFAnalysisError(f"Failed to parse analysis response: {str(e)}")
     except Exception as e:
         raise PDFAnalysisError(f"Failed to analyze text segment: {str(e)}")
 
-def analyze_pdf_document(pdf_file) -> Dict:
-    """Analyze entire PDF document with comprehensive error handling and chunking."""
+async def async_analyze_document_segment(text_segment: str, max_retries: int = MAX_RETRIES, use_cache: bool = True) -> Dict:
+    """Asyncio variant of analyze_document_segment, built on async_send_openai_request."""
+    if not text_segment or not text_segment.strip():
+        raise PDFAnalysisError("Empty text segment provided for analysis")
+    
     try:
-        # Extract text with size validation
-        text = extract_text_from_pdf(pdf_file)
-        
-        # Process text in chunks
-        analysis_results = []
-        failed_chunks = 0
-        for chunk in chunk_text(text):
-            try:
-                result = analyze_document_segment(chunk)
-                analysis_results.append(result)
-            except Exception as e:
+        response_str = await async_send_openai_request(
+            build_analysis_prompt(text_segment), retries=max_retries, use_cache=use_cache, validator=parse_analysis_response
+        )
+        return parse_analysis_response(response_str)
+    except json.JSONDecodeError as e:
+        raise PDFAnalysisError(f"Failed to parse analysis response: {str(e)}")
+    except Exception as e:
+        raise PDFAnalysisError(f"Failed to analyze text segment: {str(e)}")
+
+def build_analysis_prompt(text_segment: str) -> str:
+    """Build the analysis prompt for one text segment."""
+    return f"""
+    Analyze the following text segment for inconsistencies, logical fallacies, and unsupported statements.
+    Return the analysis in JSON format with exactly this structure:
+    {{
+        "inconsistencies": ["List of identified inconsistencies"],
+        "logical_fallacies": ["List of logical fallacies found"],
+        "unsupported_statements": ["List of statements that lack proper support or evidence"],
+        "suggestions": ["List of suggestions for improvement"]
+    }}
+
+    Text to analyze:
+    {text_segment}
+    """
+
+def parse_analysis_response(response_str: str) -> Dict:
+    """Parse and validate a segment analysis response."""
+    response = json.loads(response_str)
+    validate_analysis_response(response)
+    return response
+
+def iter_chunk_analyses(
+    pdf_file,
+    max_workers: int = MAX_WORKERS,
+    pages: Optional[Iterable[str]] = None,
+    on_total: Optional[Callable[[int], None]] = None
+) -> Generator[Tuple[int, Optional[Dict], Optional[Exception]], None, None]:
+    """
+    Extract and analyze a PDF, running up to max_workers chunk analyses concurrently.
+    
+    Pages are extracted and chunked as the workers need them, so analysis overlaps parsing;
+    on_total is called with the chunk count once the last chunk has been cut. Pass pages
+    (page texts, e.g. a cached extraction) to analyze those instead of parsing pdf_file.
+    
+    Yields (chunk_index, result, error) in completion order; result is None for a failed
+    chunk. Raises PDFAnalysisError once more than MAX_RETRIES chunks have failed, after
+    cancelling the chunks that have not started yet.
+    """
+    chunks = _iter_document_chunks(pdf_file, pages, on_total)
+    failed_chunks = 0
+    with closing(iter_bounded(analyze_document_segment, chunks, max_workers)) as analyses:
+        for index, result, error in analyses:
+            if error is not None:
                 failed_chunks += 1
                 if failed_chunks > MAX_RETRIES:
                     raise PDFAnalysisError("Too many failed analysis attempts")
-                continue
+            yield index, result, error
+
+def combine_analysis_results(analysis_results: List[Dict]) -> Dict:
+    """Merge per-chunk analyses in order, dropping duplicate findings."""
+    combined_results = {
+        "inconsistencies": [],
+        "logical_fallacies": [],
+        "unsupported_statements": [],
+        "suggestions": []
+    }
+    
+    for result in analysis_results:
+        for key in combined_results:
+            combined_results[key].extend(result.get(key, []))
+    
+    # Remove duplicates while preserving order
+    for key in combined_results:
+        combined_results[key] = list(dict.fromkeys(combined_results[key]))
+    
+    return combined_results
+
+def analyze_pdf_document(
+    pdf_file,
+    on_chunk: Optional[Callable[[bool], None]] = None,
+    pages: Optional[Iterable[str]] = None,
+    on_total: Optional[Callable[[int], None]] = None
+) -> Dict:
+    """
+    Analyze entire PDF document with comprehensive error handling and chunking.
+    
+    Args:
+        pdf_file: Binary file object containing the PDF
+        on_chunk: Optional callback invoked with True/False as each chunk succeeds or fails
+        pages: Optional page texts to analyze instead of parsing pdf_file
+        on_total: Optional callback invoked with the chunk count once the whole document is chunked
+    """
+    try:
+        analysis_results = {}
+        for index, result, error in iter_chunk_analyses(pdf_file, pages=pages, on_total=on_total):
+            if on_chunk:
+                on_chunk(error is None)
+            if error is None:
+                analysis_results[index] = result
         
         if not analysis_results:
             raise PDFAnalysisError("Failed to analyze any segments of the document")
         
-        # Combine results
-        combined_results = {
-            "inconsistencies": [],
-            "logical_fallacies": [],
-            "unsupported_statements": [],
-            "suggestions": []
-        }
-        
-        for result in analysis_results:
-            for key in combined_results:
-                combined_results[key].extend(result.get(key, []))
-        
-        # Remove duplicates while preserving order
-        for key in combined_results:
-            combined_results[key] = list(dict.fromkeys(combined_results[key]))
-        
-        return combined_results
+        # Chunks finish out of order; merge them in document order
+        analysis_results = [analysis_results[index] for index in sorted(analysis_results)]
+        return combine_analysis_results(analysis_results)
         
     except PDFAnalysisError:
         raise
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from models import PDFAnalysis
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed cache of PDF extractions and analyses
+PDF_CACHE_TTL = int(os.environ.get("PDF_CACHE_TTL", str(30 * 24 * 3600)))  # seconds since last use; 0 disables the cache
+PDF_CACHE_MAX_ENTRIES = int(os.environ.get("PDF_CACHE_MAX_ENTRIES", "1000"))
+PDF_CACHE_EVICTION_INTERVAL = float(os.environ.get("PDF_CACHE_EVICTION_INTERVAL", "3600"))  # seconds between retention passes
+HASH_BLOCK_SIZE = 1024 * 1024
+
+cache_requests_total = metrics.counter('pdf_cache_requests_total', 'PDF cache lookups by result.', ['result'])
+
+def pdf_content_hash(upload: IO[bytes]) -> str:
+    """SHA-256 of a binary file object's bytes; the file is rewound afterwards."""
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for block in iter(lambda: upload.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    upload.seek(0)
+    return digest.hexdigest()
+
+class PDFCacheEntry:
+    """
+    Cached extraction and analysis of one PDF, keyed by the SHA-256 of its bytes.
+
+    analysis is the stored combined result, if any. pages() yields the stored text when
+    there is one, otherwise it extracts the upload with PyPDF2 and records the text so
+    save() can store it; a document whose analysis failed is then re-analyzed without
+    being parsed again. Text from an extraction that stopped part way is never stored.
+    """
+
+    def __init__(self, digest: str, filename: str, text: Optional[str] = None, analysis: Optional[Dict] = None):
+        self.digest = digest
+        self.filename = filename
+        self.analysis = analysis
+        self._text = text
+        self._extracted: List[str] = []
+        self._extraction_complete = False
+
+    @classmethod
+    def lookup(cls, upload: IO[bytes], filename: str) -> 'PDFCacheEntry':
+        """Hash upload and load its cache entry (an empty one on a miss or when disabled)."""
+        digest = pdf_content_hash(upload)
+        if PDF_CACHE_TTL <= 0:
+            return cls(digest, filename)
+        try:
+            row = db.session.execute(
+                select(PDFAnalysis.id, PDFAnalysis.text, PDFAnalysis.analysis).where(PDFAnalysis.content_hash == digest)
+            ).first()
+            if row is not None:
+                db.session.execute(update(PDFAnalysis).where(PDFAnalysis.id == row.id).values(last_used_at=datetime.utcnow()))
+            db.session.commit()  # end the transaction so SQLite doesn't hold its lock
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to look up cached PDF analysis: {str(e)}")
+            db.session.rollback()
+            row = None
+
+        if row is None:
+            cache_requests_total.inc(result="miss")
+            return cls(digest, filename)
+        cache_requests_total.inc(result="hit" if row.analysis else "text_hit")
+        return cls(digest, filename, row.text, json.loads(row.analysis) if row.analysis else None)
+
+    def pages(self, upload: IO[bytes]) -> Iterable[str]:
+        """Page texts to analyze: the stored extraction, or upload's pages as they are extracted."""
+        if self._text is not None:
+            return [self._text]
+        return self._record(upload)
+
+    def _record(self, upload: IO[bytes]) -> Iterator[str]:
+        from pdf_analyzer import iter_pdf_pages
+
+        for page_text in iter_pdf_pages(upload):
+            self._extracted.append(page_text)
+            yield page_text
+        self._extraction_complete = True
+
+    def save(self, analysis: Optional[Dict] = None) -> None:
+        """
+        Store the extracted text and, if given, the combined analysis.
+
+        Only pass an analysis built from every chunk; partial results are not cached.
+        """
+        if PDF_CACHE_TTL <= 0:
+            return
+        if self._text is not None:
+            text = self._text
+        elif self._extraction_complete:
+            text = "\n".join(self._extracted)
+        else:
+            return
+        if not text.strip():
+            return
+        values = {
+            'filename': self.filename[:255],
+            'text': text,
+            'last_used_at': datetime.utcnow()
+        }
+        if analysis is not None:
+            values['analysis'] = json.dumps(analysis)
+        try:
+            existing = db.session.execute(
+                select(PDFAnalysis.id).where(PDFAnalysis.content_hash == self.digest)
+            ).scalar()
+            if existing is None:
+                db.session.add(PDFAnalysis(content_hash=self.digest, **values))
+            else:
+                db.session.execute(update(PDFAnalysis).where(PDFAnalysis.id == existing).values(**values))
+            db.session.commit()
+        except SQLAlchemyError as e:
+            # e.g. a concurrent upload of the same file stored it first
+            logger.warning(f"Failed to cache PDF analysis: {str(e)}")
+            db.session.rollback()
+
+def evict_pdf_cache(ttl: int = PDF_CACHE_TTL, max_entries: int = PDF_CACHE_MAX_ENTRIES) -> int:
+    """
+    Delete entries unused for ttl seconds, then the least recently used beyond max_entries.
+
+    Returns:
+        Number of entries deleted
+    """
+    deleted = db.session.execute(
+        delete(PDFAnalysis).where(PDFAnalysis.last_used_at < datetime.utcnow() - timedelta(seconds=ttl))
+    ).rowcount or 0
+    overflow = db.session.execute(
+        select(PDFAnalysis.id).order_by(PDFAnalysis.last_used_at.desc(), PDFAnalysis.id.desc()).offset(max_entries)
+    ).scalars().all()
+    if overflow:
+        deleted += db.session.execute(delete(PDFAnalysis).where(PDFAnalysis.id.in_(overflow))).rowcount or 0
+    db.session.commit()
+    return deleted
+
+class PDFCacheRetention:
+    """Background thread applying evict_pdf_cache every PDF_CACHE_EVICTION_INTERVAL seconds."""
+
+    def __init__(self, interval: float = PDF_CACHE_EVICTION_INTERVAL):
+        self.interval = interval
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self._app = app
+        if PDF_CACHE_TTL <= 0 or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pdf-cache-retention', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self._app.app_context():
+                    deleted = evict_pdf_cache()
+                if deleted:
+                    logger.info(f"Evicted {deleted} cached PDF analyses")
+            except Exception as e:
+                logger.error(f"PDF cache retention pass failed: {str(e)}")
+
+pdf_cache_retention = PDFCacheRetention()
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Client-side budgets for the OpenAI API (set to match the account's rate limits)
+REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_RPM_LIMIT", "500"))
+TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TPM_LIMIT", "40000"))
+MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "16"))
+MIN_CONCURRENCY = 1
+DECREASE_FACTOR = 0.5  # multiplicative decrease of the concurrency limit on a 429
+THROTTLE_COOLDOWN = 1.0  # seconds during which further 429s don't shrink the limit again
+ASYNC_POLL_INTERVAL = 0.05  # seconds between checks while an async caller waits for a free slot
+
+def backoff_delay(attempt: int, initial: float = 1, maximum: float = 8) -> float:
+    """Exponential backoff with full jitter, so retrying callers don't wake up together."""
+    return random.uniform(0, min(maximum, initial * (2 ** attempt)))
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute's worth of capacity."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0  # units per second
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self._level >= amount else (amount - self._level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self._level = min(self.capacity, self._level + amount)
+
+class RateLimiter:
+    """
+    Process-wide requests-per-minute and tokens-per-minute limiter with AIMD concurrency.
+
+    Callers reserve a request slot together with an estimate of the tokens it will use.
+    The number of concurrent requests grows by roughly one per limit's worth of successful
+    calls and is halved on a rate-limit response, and a 429 also pauses every caller until
+    the server's retry window has passed, so parallel workers don't stampede the API.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_concurrency: int = MAX_CONCURRENCY,
+        min_concurrency: int = MIN_CONCURRENCY
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._limit)
+
+    @contextmanager
+    def slot(self, estimated_tokens: int) -> Iterator[None]:
+        """Block until a request using estimated_tokens may be sent, and hold a concurrency slot."""
+        self.acquire(estimated_tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self, estimated_tokens: int) -> AsyncIterator[None]:
+        """Asyncio variant of slot() that waits without blocking the event loop."""
+        await self.acquire_async(estimated_tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, estimated_tokens: int) -> None:
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._try_acquire(estimated_tokens, started)
+                if wait == 0:
+                    return
+                self._cond.wait(wait)
+
+    async def acquire_async(self, estimated_tokens: int) -> None:
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._try_acquire(estimated_tokens, started)
+            if wait == 0:
+                return
+            await asyncio.sleep(ASYNC_POLL_INTERVAL if wait is None else wait)
+
+    def _try_acquire(self, estimated_tokens: int, started: float) -> Optional[float]:
+        """Take a slot if one is free (returns 0), else the seconds to wait (None: until a release)."""
+        now = time.monotonic()
+        wait = self._paused_until - now
+        if wait > 0:
+            return wait
+        if self._in_flight >= int(self._limit):
+            return None
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+        self._in_flight += 1
+        self._stats["requests"] += 1
+        self._stats["waited_seconds"] += now - started
+        return 0
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record_success(self, estimated_tokens: Optional[int] = None, used_tokens: Optional[int] = None) -> None:
+        """Additively grow the concurrency limit and refund tokens reserved but not used."""
+        with self._cond:
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            if estimated_tokens is not None and used_tokens is not None and used_tokens < estimated_tokens:
+                self.tokens.give(estimated_tokens - used_tokens)
+            self._cond.notify_all()
+
+    def record_throttle(self, retry_after: float) -> None:
+        """Shrink the concurrency limit and pause all callers for retry_after seconds."""
+        with self._cond:
+            now = time.monotonic()
+            self._stats["throttled"] += 1
+            if now - self._last_decrease >= THROTTLE_COOLDOWN:
+                self._limit = max(float(self.min_concurrency), self._limit * DECREASE_FACTOR)
+                self._last_decrease = now
+                logger.warning(f"OpenAI rate limit hit, concurrency limit lowered to {int(self._limit)}")
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+    def spare_slots(self) -> int:
+        """Concurrency slots free right now (none while callers are paused after a 429)."""
+        with self._cond:
+            if self._paused_until > time.monotonic():
+                return 0
+            return max(0, int(self._limit) - self._in_flight)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["concurrency_limit"] = int(self._limit)
+            stats["in_flight"] = self._in_flight
+        return stats
+
+openai_limiter = RateLimiter()
+
+metrics.gauge('openai_concurrency_limit', 'Current adaptive limit on concurrent OpenAI requests.', lambda: openai_limiter.concurrency_limit)
+metrics.gauge('openai_requests_in_flight', 'OpenAI requests currently holding a limiter slot.', lambda: openai_limiter.stats()["in_flight"])
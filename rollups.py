@@ -0,0 +1,183 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from extensions import db
+from models import DailyEmailStats, EmailEvent, GeneratedEmail
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_USER_ID = 0  # rollup bucket for emails without a user
+DASHBOARD_DAYS = int(os.environ.get("DASHBOARD_DAYS", "30"))  # days of rollups summed on the dashboard
+COUNTERS = ('generated', 'sent', 'failed', 'opens', 'clicks', 'replies', 'bounces')
+EVENT_COUNTERS = {'open': 'opens', 'click': 'clicks', 'reply': 'replies', 'bounce': 'bounces'}
+
+Increments = Dict[Tuple[Optional[int], date], Dict[str, int]]
+
+def bump_daily_stats(increments: Increments) -> None:
+    """
+    Add counts to the (user, day) rollup rows in the current transaction; the caller commits.
+
+    Args:
+        increments: Maps (user_id, day) to {counter: amount}; a None user_id is counted
+            under ANONYMOUS_USER_ID
+    """
+    rows = [
+        {'user_id': user_id or ANONYMOUS_USER_ID, 'day': day, **{c: counts.get(c, 0) for c in COUNTERS}}
+        for (user_id, day), counts in increments.items()
+        if any(counts.values())
+    ]
+    if not rows:
+        return
+
+    table = DailyEmailStats.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        upsert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['user_id', 'day'],
+            set_={c: table.c[c] + upsert.excluded[c] for c in COUNTERS}
+        )
+        db.session.execute(upsert, rows)
+        return
+
+    # Other databases: update in place, inserting the rows that don't exist yet
+    for row in rows:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.user_id == row['user_id'], table.c.day == row['day'])
+            .values({c: table.c[c] + row[c] for c in COUNTERS})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table), row)
+
+def _email_owners(email_ids: Iterable[int]) -> Dict[int, Optional[int]]:
+    """Map existing GeneratedEmail ids to their user_id."""
+    ids = list(set(email_ids))
+    if not ids:
+        return {}
+    return dict(db.session.execute(
+        select(GeneratedEmail.id, GeneratedEmail.user_id).where(GeneratedEmail.id.in_(ids))
+    ).all())
+
+def record_events(events: List[Dict]) -> int:
+    """
+    Ingest EmailEvent rows and update every counter they affect in one transaction.
+
+    Events are bulk inserted, the per-email counters on GeneratedEmail are bumped with one
+    aggregated UPDATE per counter, and the owners' daily rollups are upserted. Events for
+    unknown emails are dropped.
+
+    Args:
+        events: Dicts with 'email_id', 'event_type' and optionally 'timestamp' and
+            'event_metadata'
+
+    Returns:
+        Number of events recorded
+    """
+    owners = _email_owners(event['email_id'] for event in events)
+    rows = []
+    per_email: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    increments: Increments = defaultdict(lambda: defaultdict(int))
+    for event in events:
+        if event['email_id'] not in owners:
+            continue
+        timestamp = event.get('timestamp') or datetime.utcnow()
+        rows.append({
+            'email_id': event['email_id'],
+            'event_type': event['event_type'],
+            'timestamp': timestamp,
+            'event_metadata': event.get('event_metadata')
+        })
+        counter = EVENT_COUNTERS.get(event['event_type'])
+        if counter:
+            per_email[counter][event['email_id']] += 1
+            increments[(owners[event['email_id']], timestamp.date())][counter] += 1
+    if not rows:
+        return 0
+
+    try:
+        db.session.execute(insert(EmailEvent), rows)
+        table = GeneratedEmail.__table__
+        for counter, counts in per_email.items():
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('target_id'))
+                .values({counter: func.coalesce(table.c[counter], 0) + bindparam('amount')}),
+                [{'target_id': email_id, 'amount': amount} for email_id, amount in counts.items()]
+            )
+        bump_daily_stats(increments)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+def record_send_results(results: List[Tuple[Optional[int], bool]]) -> None:
+    """
+    Count sent/failed emails in today's rollups and mark the GeneratedEmail rows sent.
+
+    Args:
+        results: (email_id, succeeded) pairs; email_id may be None for emails that were
+            not generated from an upload
+    """
+    owners = _email_owners(email_id for email_id, _ in results if email_id is not None)
+    now = datetime.utcnow()
+    increments: Increments = defaultdict(lambda: defaultdict(int))
+    updates = []
+    for email_id, succeeded in results:
+        increments[(owners.get(email_id), now.date())]['sent' if succeeded else 'failed'] += 1
+        if email_id in owners:
+            updates.append({
+                'target_id': email_id,
+                'status': 'sent' if succeeded else 'failed',
+                'sent_at': now if succeeded else None
+            })
+
+    try:
+        if updates:
+            table = GeneratedEmail.__table__
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('target_id'))
+                .values(status=bindparam('status'), sent_at=bindparam('sent_at')),
+                updates
+            )
+        bump_daily_stats(increments)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to record email send results: {str(e)}")
+        db.session.rollback()
+
+def dashboard_stats(user_id: Optional[int], days: int = DASHBOARD_DAYS, session: Optional[Session] = None) -> Dict:
+    """
+    Sum a user's rollups over the last days days.
+
+    Reads at most days rows, however many emails and events there are.
+
+    Args:
+        user_id: Owner of the rollups (None for anonymous uploads)
+        days: Number of days to include, today included
+        session: Session to read with, e.g. from read_session() (defaults to db.session)
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    table = DailyEmailStats.__table__
+    totals = (session or db.session).execute(
+        select(*(func.coalesce(func.sum(table.c[c]), 0).label(c) for c in COUNTERS))
+        .where(table.c.user_id == (user_id or ANONYMOUS_USER_ID), table.c.day >= since)
+    ).one()._asdict()
+
+    sent = totals['sent']
+    return {
+        'total_emails': totals['generated'],
+        'sent_emails': sent,
+        'open_rate': round(100 * totals['opens'] / sent, 1) if sent else 0,
+        'click_rate': round(100 * totals['clicks'] / sent, 1) if sent else 0,
+        'total_opens': totals['opens'],
+        'total_clicks': totals['clicks'],
+        'total_replies': totals['replies']
+    }
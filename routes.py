@@ -1,65 +1,414 @@
-import os
 import re
-from flask import Blueprint, request, jsonify, render_template
-import pandas as pd
+import json
+import logging
+from itertools import chain
+from flask import Blueprint, Response, request, jsonify, render_template, url_for, stream_with_context
+from flask_login import current_user
 from werkzeug.utils import secure_filename
-from email_generator import generate_email_from_task
-from pdf_analyzer import analyze_pdf_document, PDFAnalysisError
-from utils import send_email
+from email_generator import generate_email_from_task, iter_generated_emails
+from pdf_analyzer import analyze_pdf_document, iter_chunk_analyses, combine_analysis_results, PDFAnalysisError
+from utils import send_email, send_emails
+from extensions import db
+from sheet_reader import REQUIRED_COLUMNS, iter_task_batches, validate_header
+from jobs import QueueFullError, job_queue, new_job_id
+from uploads import take_upload
+from models import UploadJob
+from email_store import EmailWriter, find_fresh_emails, task_lookup_key
+from pdf_store import PDFCacheEntry
+from rollups import record_send_results
+from tracking import track_links, tracked_html
+from metrics import timed
+
+logger = logging.getLogger(__name__)
 
 # Create a Blueprint for our routes
 upload_bp = Blueprint('upload', __name__)
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'pdf'}
-REQUIRED_COLUMNS = ['Task', 'E-mail', 'Recipient']
+# Uploads are processed from memory (or a private spool file), never a shared directory
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'pdf'}
+PREVIEW_ROWS = 5
+QUEUE_FULL_RETRY_AFTER = 5  # seconds suggested to clients when the job queue is full
 
-# Create uploads directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Streaming response formats for /upload?stream=<format>
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def validate_columns(df):
-    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+    validate_header(df.columns)
     return True
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def validate_email(email):
+    import pandas as pd
+    
     if pd.isna(email):
         return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, str(email)) is not None
+    return EMAIL_PATTERN.match(str(email)) is not None
 
-def clean_dataframe(df):
-    # Replace NaN values with empty strings
-    df = df.fillna('')
+@timed('clean_dataframe')
+def clean_dataframe(df, seen=None):
+    """
+    Normalize, validate and de-duplicate task rows in one vectorized pass.
+    
+    Tasks and recipient names get their whitespace collapsed and e-mail addresses are
+    lower-cased. Rows with an empty task are filtered out; rows with an invalid e-mail
+    address or repeating an earlier (task, e-mail) pair are dropped and reported.
+    
+    Args:
+        df: DataFrame with the REQUIRED_COLUMNS, indexed by position below the header
+        seen: Optional dict mapping (task, e-mail) keys to the sheet row where they first
+            appeared; pass the same dict for every batch of a sheet to catch duplicates
+            across batches. Updated in place.
     
-    # Convert all values to strings and strip whitespace
-    for col in df.columns:
-        df[col] = df[col].astype(str).str.strip()
+    Returns:
+        Tuple of (clean_df, filtered_rows, row_errors) where row_errors is a list of
+        {'row', 'column', 'value', 'error'} dicts using spreadsheet row numbers
+    """
+    df = df[REQUIRED_COLUMNS].fillna('').astype(str)
+    df = df.assign(**{
+        'Task': df['Task'].str.replace(r'\s+', ' ', regex=True).str.strip(),
+        'Recipient': df['Recipient'].str.replace(r'\s+', ' ', regex=True).str.strip(),
+        'E-mail': df['E-mail'].str.strip().str.lower()
+    })
     
     # Filter out rows with empty tasks
     original_rows = len(df)
     df = df[df['Task'].str.len() > 0]
     filtered_rows = original_rows - len(df)
     
-    # Validate email addresses on remaining rows
-    invalid_emails = df[~df['E-mail'].apply(validate_email)].index.tolist()
-    if invalid_emails:
-        raise ValueError(f"Invalid email addresses found in rows: {[i+2 for i in invalid_emails]}")
+    # Spreadsheet row numbers: 1-based plus the header row
+    sheet_rows = df.index.to_series() + 2
     
-    return df, filtered_rows
+    invalid = ~df['E-mail'].str.match(EMAIL_PATTERN)
+    
+    # Compare tasks case-insensitively; invalid rows don't count as first occurrences
+    valid_rows = sheet_rows[~invalid]
+    key = (df['Task'].str.casefold() + '\x00' + df['E-mail'])[~invalid]
+    first_row = valid_rows.groupby(key).transform('min')
+    if seen:
+        first_row = key.map(seen).fillna(first_row)
+    is_duplicate = first_row != valid_rows
+    duplicate = is_duplicate.reindex(df.index, fill_value=False)
+    if seen is not None:
+        seen.update(zip(key[~is_duplicate], valid_rows[~is_duplicate]))
+    
+    row_errors = [
+        {'row': int(row), 'column': 'E-mail', 'value': value, 'error': 'Invalid email address'}
+        for row, value in zip(sheet_rows[invalid], df.loc[invalid, 'E-mail'])
+    ]
+    row_errors.extend(
+        {'row': int(row), 'column': 'Task', 'value': value, 'error': f'Duplicate of row {int(first)}'}
+        for row, value, first in zip(sheet_rows[duplicate], df.loc[duplicate, 'Task'], first_row[is_duplicate])
+    )
+    row_errors.sort(key=lambda error: error['row'])
+    
+    return df[~(invalid | duplicate)], filtered_rows, row_errors
+
+def close_upload(upload):
+    """Safely release an uploaded file's buffer."""
+    try:
+        upload.close()
+    except Exception as e:
+        logger.warning(f"Failed to close upload: {str(e)}")
+
+class UploadProcessingError(Exception):
+    """Raised when an uploaded file cannot be processed; carries the HTTP status to report."""
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
 
-def cleanup_file(filepath):
-    """Safely clean up uploaded file."""
+def iter_pdf_upload(upload, filename):
+    """
+    Analyze an uploaded PDF (a binary file object, closed when done), yielding a start
+    record before parsing begins and then one record per chunk as soon as its analysis
+    is ready. Chunks are analyzed while later pages are still being parsed; a plan record
+    carrying the chunk count follows once the whole document has been chunked.
+    
+    A file analyzed before is answered from the PDF cache with a single chunk record
+    carrying the combined results and 'cached': True.
+    """
     try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        cache = PDFCacheEntry.lookup(upload, filename)
+        yield {'event': 'start', 'type': 'pdf_analysis'}
+        if cache.analysis is not None:
+            yield {'event': 'plan', 'chunks': 1}
+            yield {'event': 'chunk', 'index': 0, 'results': cache.analysis, 'cached': True}
+            return
+        
+        results = {}
+        failures = 0
+        complete = False
+        totals = []  # filled by iter_chunk_analyses once the last chunk has been cut
+        try:
+            analyses = iter_chunk_analyses(upload, pages=cache.pages(upload), on_total=totals.append)
+            for index, result, error in analyses:
+                if totals:
+                    yield {'event': 'plan', 'chunks': totals.pop()}
+                if error is not None:
+                    failures += 1
+                    yield {'event': 'failure', 'index': index, 'error': str(error)}
+                else:
+                    results[index] = result
+                    yield {'event': 'chunk', 'index': index, 'results': result}
+            complete = not failures
+        finally:
+            # Only a fully analyzed document gets its combined results cached
+            cache.save(combine_analysis_results([results[index] for index in sorted(results)]) if complete else None)
+    except PDFAnalysisError as pe:
+        raise UploadProcessingError(str(pe), 400)
     except Exception as e:
-        print(f"Warning: Failed to clean up file {filepath}: {str(e)}")
+        raise UploadProcessingError(f'PDF analysis failed: {str(e)}', 500)
+    finally:
+        close_upload(upload)
+
+def iter_excel_upload(upload, filename, user_id=None):
+    """
+    Process an uploaded task sheet (.xlsx, .xls or .csv) as it is read.
+    
+    upload is a binary file object (closed when done); filename picks the sheet reader.
+    Generated emails are saved for user_id (None for anonymous uploads).
+    
+    Yields a start record once the header has been validated, a batch record with the
+    row counts, row errors and preview rows of each batch as it is read, and one record
+    per row as soon as its email is generated (in completion order). Rows are fed into
+    email generation while later batches are still being read.
+    
+    Rows whose (task, recipient) already has a fresh GeneratedEmail of the same user reuse
+    it instead of being regenerated (their records carry 'reused': True); newly generated
+    emails are saved as Task/GeneratedEmail rows as they arrive. Every email record carries
+    the GeneratedEmail 'email_id' (None if it could not be saved), which /send-email and
+    /send-emails use for tracking and send status.
+    """
+    import pandas as pd  # imported on first upload to keep app startup fast
+    
+    try:
+        batches = iter_task_batches(upload, filename=filename)
+        first_batch = next(batches, None)
+        
+        yield {
+            'event': 'start',
+            'type': 'excel_processing',
+            'columns': REQUIRED_COLUMNS
+        }
+        
+        pending_rows = {}
+        batch_records = []
+        reused_records = []
+        writer = EmailWriter(user_id=user_id)
+        
+        def row_record(index, row):
+            return {
+                'index': index,
+                'task': row['Task'],
+                'recipient': row['Recipient'],
+                'email': row['E-mail']
+            }
+        
+        def tasks():
+            if first_batch is None:
+                return
+            seen = {}
+            index = 0
+            generated = 0
+            for batch in chain([first_batch], batches):
+                df, filtered_rows, row_errors = clean_dataframe(batch, seen=seen)
+                rows = df.to_dict('records')
+                fresh = find_fresh_emails(((row['Task'], row['Recipient']) for row in rows), user_id)
+                batch_records.append({
+                    'event': 'batch',
+                    'rows': len(rows),
+                    'filtered_rows': filtered_rows,
+                    'invalid_rows': row_errors,
+                    'preview': rows[:PREVIEW_ROWS]
+                })
+                for row in rows:
+                    reused = fresh.get(task_lookup_key(row['Task'], row['Recipient']))
+                    if reused is not None:
+                        email_id, email = reused
+                        reused_records.append({
+                            'event': 'email', **row_record(index, row), 'email_id': email_id, 'generated_email': email, 'reused': True
+                        })
+                    else:
+                        # iter_generated_emails numbers only the rows sent for generation
+                        pending_rows[generated] = (index, row)
+                        generated += 1
+                        yield row['Task'], row['Recipient']
+                    index += 1
+        
+        def drain():
+            # A batch record always precedes the emails of its rows
+            while batch_records:
+                yield batch_records.pop(0)
+            while reused_records:
+                yield reused_records.pop(0)
+        
+        try:
+            for generated, email, error in iter_generated_emails(tasks()):
+                yield from drain()
+                
+                index, row = pending_rows.pop(generated)
+                record = row_record(index, row)
+                if error is not None:
+                    yield {'event': 'failure', **record, 'error': str(error)}
+                else:
+                    # Saved as it arrives so the record carries the id /send-email tracks it by;
+                    # the insert is negligible next to the generation itself
+                    writer.add(row['Task'], row['E-mail'], row['Recipient'], email)
+                    email_id, = writer.flush()
+                    yield {'event': 'email', **record, 'email_id': email_id, 'generated_email': email}
+            
+            # Trailing batches without rows to generate
+            yield from drain()
+        finally:
+            writer.flush()
+    except pd.errors.EmptyDataError:
+        raise UploadProcessingError('The Excel file is empty', 400)
+    except pd.errors.ParserError:
+        raise UploadProcessingError('Failed to parse Excel file. Please ensure it is a valid Excel file.', 400)
+    except Exception as e:
+        raise UploadProcessingError(f'Excel processing failed: {str(e)}', 500)
+    finally:
+        close_upload(upload)
+
+def process_pdf_file(upload, filename, progress=None, user_id=None):
+    """Analyze an uploaded PDF and build the /upload response payload, reusing cached results."""
+    try:
+        cache = PDFCacheEntry.lookup(upload, filename)
+        if cache.analysis is not None:
+            return {
+                'type': 'pdf_analysis',
+                'results': cache.analysis,
+                'cached': True
+            }
+        
+        failures = 0
+        
+        def on_chunk(succeeded):
+            nonlocal failures
+            failures += not succeeded
+            if progress:
+                progress.advance(succeeded)
+        
+        analysis_results = None
+        try:
+            analysis_results = analyze_pdf_document(
+                upload,
+                on_chunk=on_chunk,
+                pages=cache.pages(upload),
+                on_total=progress.set_total if progress else None
+            )
+        finally:
+            # The extracted text is kept even when the analysis fails, so a retry skips parsing
+            cache.save(None if failures else analysis_results)
+        return {
+            'type': 'pdf_analysis',
+            'results': analysis_results
+        }
+    except PDFAnalysisError as pe:
+        raise UploadProcessingError(str(pe), 400)
+    except Exception as e:
+        raise UploadProcessingError(f'PDF analysis failed: {str(e)}', 500)
+    finally:
+        close_upload(upload)
+
+def process_excel_file(upload, filename, progress=None, user_id=None):
+    """Generate emails for every task in an uploaded sheet (saved for user_id) and build the /upload response payload."""
+    payload = None
+    emails = {}
+    
+    for record in iter_excel_upload(upload, filename, user_id):
+        event = record.pop('event')
+        if event == 'start':
+            payload = {**record, 'rows': 0, 'filtered_rows': 0, 'invalid_rows': [], 'preview': []}
+            continue
+        
+        if event == 'batch':
+            payload['rows'] += record['rows']
+            payload['filtered_rows'] += record['filtered_rows']
+            payload['invalid_rows'].extend(record['invalid_rows'])
+            payload['preview'].extend(record['preview'][:PREVIEW_ROWS - len(payload['preview'])])
+            if progress:
+                progress.add_total(record['rows'])
+            continue
+        
+        index = record.pop('index')
+        if event == 'email':
+            emails[index] = record
+        if progress:
+            progress.advance(event == 'email')
+    
+    if not emails:
+        raise UploadProcessingError('Excel processing failed: Failed to generate any emails from the Excel data', 500)
+    
+    # Rows finish out of order; report them in sheet order
+    payload['generated_emails'] = [emails[index] for index in sorted(emails)]
+    return payload
+
+def format_stream_record(record, stream_format):
+    """Serialize one streamed record as an NDJSON line or a Server-Sent Event."""
+    data = json.dumps(record, default=str)
+    if stream_format == 'sse':
+        return f"event: {record['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def stream_upload(kind, upload, filename, stream_format, user_id=None):
+    """Process an upload inline and stream each result to the client as soon as it is ready."""
+    records = iter_pdf_upload(upload, filename) if kind == 'pdf' else iter_excel_upload(upload, filename, user_id)
+    
+    # Run up to the start record eagerly so validation errors still get a proper status code
+    try:
+        start = next(records)
+    except UploadProcessingError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    
+    def generate():
+        summary = {'event': 'summary', 'type': start['type']}
+        if kind == 'excel':
+            summary.update({'rows': 0, 'filtered_rows': 0, 'invalid_rows': 0})
+        succeeded = 0
+        failures = 0
+        chunk_results = []
+        
+        yield format_stream_record(start, stream_format)
+        try:
+            for record in records:
+                if record['event'] == 'batch':
+                    summary['rows'] += record['rows']
+                    summary['filtered_rows'] += record['filtered_rows']
+                    summary['invalid_rows'] += len(record['invalid_rows'])
+                elif record['event'] == 'failure':
+                    failures += 1
+                elif record['event'] != 'plan':
+                    succeeded += 1
+                    if kind == 'pdf':
+                        chunk_results.append((record['index'], record['results']))
+                yield format_stream_record(record, stream_format)
+        except UploadProcessingError as e:
+            summary['error'] = str(e)
+        
+        summary.update({'succeeded': succeeded, 'failures': failures})
+        if kind == 'pdf':
+            summary['chunks'] = succeeded + failures
+            summary['results'] = combine_analysis_results([results for _, results in sorted(chunk_results)])
+        if not succeeded and 'error' not in summary:
+            summary['error'] = ('Failed to analyze any segments of the document' if kind == 'pdf'
+                                else 'Failed to generate any emails from the Excel data')
+        yield format_stream_record(summary, stream_format)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_FORMATS[stream_format],
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+job_queue.register('pdf', process_pdf_file)
+job_queue.register('excel', process_excel_file)
 
 @upload_bp.route('/')
 def index():
@@ -77,72 +426,56 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
     
+    stream_format = request.args.get('stream')
+    if stream_format and stream_format not in STREAM_FORMATS:
+        return jsonify({'error': f"Unsupported stream format. Use one of: {', '.join(STREAM_FORMATS)}"}), 400
+    
     filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    kind = 'pdf' if filename.lower().endswith('.pdf') else 'excel'
+    
+    # The spooled upload is handed over as-is: no copy to disk and no shared file name
+    job_id = new_job_id()
+    upload = take_upload(file)
+    # Uploads stay open to anonymous users; a logged-in user's emails show on their dashboard
+    user_id = current_user.id if current_user.is_authenticated else None
     
     try:
-        file.save(filepath)
-        
-        if filename.lower().endswith('.pdf'):
-            try:
-                # Handle PDF analysis with improved error handling
-                analysis_results = analyze_pdf_document(open(filepath, 'rb'))
-                return jsonify({
-                    'type': 'pdf_analysis',
-                    'results': analysis_results
-                })
-            except PDFAnalysisError as pe:
-                return jsonify({'error': str(pe)}), 400
-            except Exception as e:
-                return jsonify({'error': f'PDF analysis failed: {str(e)}'}), 500
-        else:
-            try:
-                # Handle Excel file
-                df = pd.read_excel(filepath)
-                validate_columns(df)
-                df = df[REQUIRED_COLUMNS]
-                df, filtered_rows = clean_dataframe(df)
-                
-                emails = []
-                for _, row in df.iterrows():
-                    try:
-                        email = generate_email_from_task(
-                            task=str(row['Task']),
-                            recipient_name=str(row['Recipient'])
-                        )
-                        emails.append({
-                            'task': row['Task'],
-                            'recipient': row['Recipient'],
-                            'email': row['E-mail'],
-                            'generated_email': email
-                        })
-                    except Exception as e:
-                        print(f"Warning: Failed to generate email for task: {str(e)}")
-                        continue
-                
-                if not emails:
-                    raise ValueError("Failed to generate any emails from the Excel data")
-                
-                return jsonify({
-                    'type': 'excel_processing',
-                    'columns': REQUIRED_COLUMNS,
-                    'rows': len(df),
-                    'filtered_rows': filtered_rows,
-                    'preview': df.head().to_dict('records'),
-                    'generated_emails': emails
-                })
-            except pd.errors.EmptyDataError:
-                return jsonify({'error': 'The Excel file is empty'}), 400
-            except pd.errors.ParserError:
-                return jsonify({'error': 'Failed to parse Excel file. Please ensure it is a valid Excel file.'}), 400
-            except Exception as e:
-                return jsonify({'error': f'Excel processing failed: {str(e)}'}), 500
-                
+        if stream_format:
+            return stream_upload(kind, upload, filename, stream_format, user_id)
+        job_queue.enqueue(kind, filename, upload, job_id=job_id, user_id=user_id)
+    except QueueFullError:
+        close_upload(upload)
+        response = jsonify({'error': 'Too many uploads are being processed; retry shortly or upload with ?stream=ndjson'})
+        response.headers['Retry-After'] = str(QUEUE_FULL_RETRY_AFTER)
+        return response, 503
     except Exception as e:
+        close_upload(upload)
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
-    finally:
-        # Always clean up the uploaded file
-        cleanup_file(filepath)
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('upload.job_status', job_id=job_id),
+        'result_url': url_for('upload.job_result', job_id=job_id)
+    }), 202
+
+@upload_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = db.session.get(UploadJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@upload_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = db.session.get(UploadJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'succeeded':
+        return jsonify(job.result)
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), job.error_code or 500
+    return jsonify(job.to_dict()), 202
 
 @upload_bp.route('/send-email', methods=['POST'])
 def send_single_email():
@@ -151,13 +484,56 @@ def send_single_email():
         if not data or not all(key in data for key in ['email', 'subject', 'body']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        send_email(data['email'], data['subject'], data['body'])
+        # Emails generated from an upload get click-tracking links and an open-tracking pixel
+        body, html = data['body'], None
+        if data.get('email_id') is not None:
+            body = track_links(body, data['email_id'])
+            html = tracked_html(body, data['email_id'])
+        try:
+            send_email(data['email'], data['subject'], body, html)
+        except Exception:
+            record_send_results([(data.get('email_id'), False)])
+            raise
+        record_send_results([(data.get('email_id'), True)])
         return jsonify({'message': 'Email sent successfully'})
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to send email: {str(e)}'}), 500
 
+@upload_bp.route('/send-emails', methods=['POST'])
+def send_batch_emails():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('emails'), list) or not data['emails']:
+        return jsonify({'error': 'Request body must contain a non-empty "emails" list'}), 400
+    if not all(isinstance(item, dict) for item in data['emails']):
+        return jsonify({'error': 'Each entry in "emails" must be an object'}), 400
+    
+    # Emails generated from an upload get click-tracking links and an open-tracking pixel
+    messages = []
+    for item in data['emails']:
+        if item.get('email_id') is not None and isinstance(item.get('body'), str):
+            body = track_links(item['body'], item['email_id'])
+            item = {**item, 'body': body, 'html': tracked_html(body, item['email_id'])}
+        messages.append(item)
+    try:
+        results = send_emails(messages)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to send emails: {str(e)}'}), 500
+    
+    record_send_results([
+        (item.get('email_id'), result['status'] == 'sent')
+        for item, result in zip(data['emails'], results)
+    ])
+    sent = sum(1 for result in results if result['status'] == 'sent')
+    return jsonify({
+        'sent': sent,
+        'failed': len(results) - sent,
+        'results': results
+    })
+
 @upload_bp.route('/generate-email', methods=['POST'])
 def generate_email():
     data = request.get_json()
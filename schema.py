@@ -0,0 +1,130 @@
+import logging
+from typing import List
+from sqlalchemy import Table, Text, inspect, text
+from sqlalchemy.engine import Connection
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# db.create_all only creates missing tables, so columns, indexes and relaxed NOT NULL constraints
+# added to existing models are applied here by `init-db` on databases created by older releases.
+
+# Columns removed from the models, dropped from existing tables (table -> column names)
+DROPPED_COLUMNS = {
+    'upload_job': ['filepath'],  # uploads are handed to the job in memory
+}
+
+def upgrade_schema() -> List[str]:
+    """
+    Bring existing tables in line with the models. Must run inside an application context,
+    after the missing tables have been created.
+
+    Adds missing columns (backfilling NOT NULL ones from their defaults) and indexes, drops
+    NOT NULL constraints the models no longer have and the columns in DROPPED_COLUMNS, and
+    widens VARCHAR columns that are now Text.
+    SQLite cannot alter columns, so tables needing that are rebuilt and their rows copied over.
+
+    Returns:
+        List[str]: A description of each change made; empty when the schema is current
+    """
+    import models  # registers the tables on db.metadata
+    changes = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            changes.extend(_upgrade_table(conn, table))
+    for change in changes:
+        logger.info(f"Schema upgrade: {change}")
+    return changes
+
+def _upgrade_table(conn: Connection, table: Table) -> List[str]:
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {column['name']: column for column in inspector.get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    relaxed = [
+        column for column in table.columns
+        if column.name in existing and column.nullable and not column.primary_key and not existing[column.name]['nullable']
+    ]
+    widened = [
+        column for column in table.columns
+        if column.name in existing and isinstance(column.type, Text) and not isinstance(existing[column.name]['type'], Text)
+    ]
+    dropped = [name for name in DROPPED_COLUMNS.get(table.name, []) if name in existing]
+    sqlite = conn.dialect.name == 'sqlite'
+    if sqlite:
+        widened = []  # SQLite does not enforce VARCHAR lengths
+
+    if sqlite and relaxed:
+        # The rebuilt table only has the model's columns, so dropped columns go with the old one
+        _rebuild_sqlite_table(conn, table, existing)
+        return [f"rebuilt {table.name} (added {_names(missing)}; dropped NOT NULL on {_names(relaxed)})"]
+
+    changes = []
+    quote = conn.dialect.identifier_preparer.quote
+    for name in dropped:
+        conn.execute(text(f"ALTER TABLE {quote(table.name)} DROP COLUMN {quote(name)}"))  # SQLite 3.35+
+        changes.append(f"dropped {table.name}.{name}")
+    for column in missing:
+        conn.execute(text(
+            f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(conn.dialect)}"
+        ))
+        if not column.nullable and column.default is not None:
+            conn.execute(
+                text(f"UPDATE {quote(table.name)} SET {quote(column.name)} = :value"),
+                {"value": _default_value(column)}
+            )
+            if not sqlite:
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(column.name)} SET NOT NULL"))
+        changes.append(f"added {table.name}.{column.name}")
+    for column in relaxed:
+        conn.execute(text(f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(column.name)} DROP NOT NULL"))
+        changes.append(f"dropped NOT NULL on {table.name}.{column.name}")
+    for column in widened:
+        conn.execute(text(
+            f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(column.name)} TYPE {column.type.compile(conn.dialect)}"
+        ))
+        changes.append(f"widened {table.name}.{column.name}")
+
+    existing_indexes = {index['name'] for index in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing_indexes:
+            index.create(conn)
+            changes.append(f"created index {index.name}")
+    return changes
+
+def _rebuild_sqlite_table(conn: Connection, table: Table, existing: dict) -> None:
+    """Recreate a table from its model and copy the rows over, keeping foreign keys that point at it."""
+    old_name = f"{table.name}__old"
+    quote = conn.dialect.identifier_preparer.quote
+    # Stop SQLite from rewriting other tables' foreign keys to follow the renamed table
+    conn.execute(text("PRAGMA legacy_alter_table = ON"))
+    try:
+        conn.execute(text(f"ALTER TABLE {quote(table.name)} RENAME TO {quote(old_name)}"))
+        for index in inspect(conn).get_indexes(old_name):
+            conn.execute(text(f"DROP INDEX {quote(index['name'])}"))
+        table.create(conn)
+
+        columns, values, params = [], [], {}
+        for column in table.columns:
+            if column.name in existing:
+                columns.append(quote(column.name))
+                values.append(quote(column.name))
+            elif not column.nullable and column.default is not None:
+                columns.append(quote(column.name))
+                values.append(f":{column.name}")
+                params[column.name] = _default_value(column)
+        conn.execute(
+            text(f"INSERT INTO {quote(table.name)} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {quote(old_name)}"),
+            params
+        )
+        conn.execute(text(f"DROP TABLE {quote(old_name)}"))
+    finally:
+        conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+
+def _default_value(column):
+    default = column.default
+    return default.arg(None) if default.is_callable else default.arg
+
+def _names(columns) -> str:
+    return ", ".join(column.name for column in columns) or "nothing"
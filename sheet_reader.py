@@ -0,0 +1,104 @@
+import os
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Sequence, Union
+
+# pandas and openpyxl are imported inside the readers so importing this module stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+
+REQUIRED_COLUMNS = ['Task', 'E-mail', 'Recipient']
+BATCH_SIZE = int(os.environ.get("SHEET_BATCH_SIZE", "500"))  # rows per DataFrame batch
+
+def validate_header(header: Sequence) -> List[int]:
+    """Check the header row for the required columns and return their positions."""
+    names = [str(name).strip() if name is not None else '' for name in header]
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in names]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+    return [names.index(col) for col in REQUIRED_COLUMNS]
+
+def _iter_xlsx_batches(source: Union[str, IO[bytes]], batch_size: int) -> Iterator["pd.DataFrame"]:
+    """Stream rows with openpyxl's read-only mode, keeping only the required columns."""
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        positions = validate_header(header)
+
+        batch, index = [], []
+        # Index rows by their position below the header, as pd.read_excel would
+        for row_number, row in enumerate(rows):
+            values = [row[pos] if pos < len(row) else None for pos in positions]
+            if all(value is None for value in values):
+                continue
+            batch.append(values)
+            index.append(row_number)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=REQUIRED_COLUMNS, index=index)
+                batch, index = [], []
+        if batch:
+            yield pd.DataFrame(batch, columns=REQUIRED_COLUMNS, index=index)
+    finally:
+        workbook.close()
+
+def _rewind(source: Union[str, IO[bytes]]) -> None:
+    # The header is read separately, so file objects are rewound before the data pass
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+def _required_columns(header: Sequence) -> List:
+    # Names as pandas reads them, so headers with stray whitespace still match
+    return [header[pos] for pos in validate_header(header)]
+
+def _select_required(df: "pd.DataFrame", columns: List) -> "pd.DataFrame":
+    return df[columns].set_axis(REQUIRED_COLUMNS, axis=1)
+
+def _iter_csv_batches(source: Union[str, IO[bytes]], batch_size: int) -> Iterator["pd.DataFrame"]:
+    import pandas as pd
+
+    columns = _required_columns(pd.read_csv(source, nrows=0, encoding='utf-8-sig').columns)
+    _rewind(source)
+    for df in pd.read_csv(
+        source,
+        usecols=columns,
+        dtype=str,
+        encoding='utf-8-sig',
+        chunksize=batch_size
+    ):
+        yield _select_required(df, columns)
+
+def _iter_xls_batches(source: Union[str, IO[bytes]], batch_size: int) -> Iterator["pd.DataFrame"]:
+    import pandas as pd
+
+    # Legacy .xls has no streaming reader; load only the required columns
+    columns = _required_columns(pd.read_excel(source, nrows=0).columns)
+    _rewind(source)
+    df = _select_required(pd.read_excel(source, usecols=columns), columns)
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+def iter_task_batches(source: Union[str, IO[bytes]], batch_size: Optional[int] = None, filename: Optional[str] = None) -> Iterator["pd.DataFrame"]:
+    """
+    Read a task sheet in batches of at most batch_size rows.
+
+    .xlsx files are streamed with openpyxl in read-only mode and CSV files with pandas'
+    chunked reader, so memory stays bounded by the batch size. The header is validated
+    before any data rows are read. Each batch holds only REQUIRED_COLUMNS and is indexed
+    by the row's position below the header.
+
+    Args:
+        source: Path of the uploaded sheet, or a seekable binary file object
+        batch_size: Rows per batch (defaults to BATCH_SIZE)
+        filename: Original file name, used to pick the reader (required for file objects)
+    """
+    batch_size = batch_size or BATCH_SIZE
+    extension = (filename or source).rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return _iter_csv_batches(source, batch_size)
+    if extension == 'xls':
+        return _iter_xls_batches(source, batch_size)
+    return _iter_xlsx_batches(source, batch_size)
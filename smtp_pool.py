@@ -0,0 +1,230 @@
+import os
+import time
+import atexit
+import smtplib
+import logging
+import threading
+from email.message import Message
+from typing import List, Optional
+from access_log import record_upstream
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# SMTP server and pool configuration
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
+POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", "4"))
+MAX_MESSAGES_PER_CONNECTION = int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+KEEPALIVE_INTERVAL = 30  # seconds idle before a connection is checked with NOOP
+CONNECT_TIMEOUT = 30  # seconds
+CHECKOUT_TIMEOUT = 60  # seconds to wait for a free connection
+
+class PooledConnection:
+    """An authenticated SMTP session plus the bookkeeping the pool needs."""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self) -> None:
+        try:
+            self.server.quit()
+        except Exception as e:
+            logger.warning(f"Error while closing SMTP connection: {str(e)}")
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of persistent SMTP connections.
+
+    Connections are opened on demand (EHLO, STARTTLS, LOGIN once per connection) and reused
+    for later messages. Idle connections are probed with NOOP before reuse, dropped sessions
+    are reopened transparently, and each connection is recycled after max_messages sends.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        use_tls: bool = SMTP_USE_TLS,
+        size: int = POOL_SIZE,
+        max_messages: int = MAX_MESSAGES_PER_CONNECTION,
+        keepalive_interval: float = KEEPALIVE_INTERVAL,
+        timeout: float = CONNECT_TIMEOUT
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = max(1, size)
+        self.max_messages = max_messages
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    @timed('send_email')
+    def send(self, msg: Message) -> None:
+        """Send a message over a pooled connection, reconnecting once if the session was dropped."""
+        started = time.monotonic()
+        try:
+            self._send(msg)
+        finally:
+            record_upstream("smtp", time.monotonic() - started)
+
+    def _send(self, msg: Message) -> None:
+        conn = self._checkout()
+        try:
+            try:
+                self._send_on(conn, msg)
+            except smtplib.SMTPServerDisconnected:
+                logger.info("SMTP connection dropped, reconnecting")
+                conn.close()
+                conn = None
+                conn = self._connect()
+                self._send_on(conn, msg)
+        except ValueError:
+            # Refused messages leave the session usable
+            self._release(conn, reuse=True)
+            raise
+        except smtplib.SMTPServerDisconnected:
+            logger.error("Server disconnected unexpectedly")
+            self._release(conn, reuse=False)
+            raise ValueError("Email server disconnected unexpectedly")
+        except Exception as e:
+            logger.error(f"Unexpected error while sending email: {str(e)}")
+            self._release(conn, reuse=False)
+            raise ValueError(f"Failed to send email: {str(e)}")
+        self._release(conn, reuse=True)
+
+    def close(self) -> None:
+        """Close all idle connections; connections in use are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _send_on(self, conn: PooledConnection, msg: Message) -> None:
+        recipient = msg['To']
+        try:
+            conn.server.send_message(msg)
+        except smtplib.SMTPRecipientsRefused:
+            logger.error(f"Recipient refused: {recipient}")
+            raise ValueError("Email was refused by recipient server")
+        except smtplib.SMTPSenderRefused:
+            logger.error("Sender address refused")
+            raise ValueError("Sender email address was refused")
+        except smtplib.SMTPDataError as e:
+            logger.error(f"SMTP data error: {str(e)}")
+            raise ValueError(f"Error sending email data: {str(e)}")
+        finally:
+            conn.messages_sent += 1
+            conn.last_used = time.monotonic()
+
+    def _connect(self) -> PooledConnection:
+        server = None
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()  # Initial EHLO
+            if self.use_tls:
+                server.starttls()  # Enable TLS
+                server.ehlo()  # Second EHLO after TLS
+
+            try:
+                server.login(self.username, self.password)
+            except smtplib.SMTPAuthenticationError:
+                logger.error("SMTP authentication failed")
+                raise ValueError("Failed to authenticate with SMTP server. Please check your credentials.")
+
+            return PooledConnection(server)
+        except ValueError:
+            self._close_server(server)
+            raise
+        except smtplib.SMTPConnectError:
+            logger.error("Failed to connect to SMTP server")
+            self._close_server(server)
+            raise ValueError("Could not connect to email server")
+        except smtplib.SMTPException as e:
+            logger.error(f"SMTP handshake failed: {str(e)}")
+            self._close_server(server)
+            raise ValueError(f"Failed to send email: {str(e)}")
+        except OSError:
+            logger.error("Failed to connect to SMTP server")
+            self._close_server(server)
+            raise ValueError("Could not connect to email server")
+
+    def _checkout(self) -> PooledConnection:
+        if not self._slots.acquire(timeout=CHECKOUT_TIMEOUT):
+            raise ValueError("Timed out waiting for a free SMTP connection")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if time.monotonic() - conn.last_used < self.keepalive_interval or conn.is_alive():
+                    return conn
+                conn.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: Optional[PooledConnection], reuse: bool) -> None:
+        """Return a connection to the pool (or close it) and free its slot."""
+        try:
+            if conn is None:
+                return
+            if reuse and conn.messages_sent < self.max_messages:
+                with self._lock:
+                    if not self._closed:
+                        self._idle.append(conn)
+                        return
+            conn.close()
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close_server(server: Optional[smtplib.SMTP]) -> None:
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+_pool: Optional[SMTPConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_smtp_pool(username: str, password: str) -> SMTPConnectionPool:
+    """Return the process-wide pool, rebuilding it if the server or credentials changed."""
+    global _pool
+    with _pool_lock:
+        config = (SMTP_HOST, SMTP_PORT, username, password)
+        if _pool is None or (_pool.host, _pool.port, _pool.username, _pool.password) != config:
+            if _pool is not None:
+                _pool.close()
+            _pool = SMTPConnectionPool(SMTP_HOST, SMTP_PORT, username, password, use_tls=SMTP_USE_TLS)
+        return _pool
+
+@atexit.register
+def _close_pool() -> None:
+    if _pool is not None:
+        _pool.close()
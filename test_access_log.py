@@ -0,0 +1,64 @@
+import io
+import json
+import unittest
+from access_log import AccessLogMiddleware, record_upstream
+from utils import iter_bounded
+
+def run(middleware, body=b'', path='/x'):
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body)
+    }
+    response = middleware(environ, lambda status, headers, exc_info=None: None)
+    chunks = list(response)
+    response.close()
+    return b''.join(chunks)
+
+def entries(logs):
+    return [json.loads(record.getMessage()) for record in logs.records]
+
+class TestAccessLog(unittest.TestCase):
+    def test_logs_structured_line_with_upstream_timings(self):
+        def app(environ, start_response):
+            environ['wsgi.input'].read()
+            # Upstream calls made on worker threads are attributed to this request
+            list(iter_bounded(lambda seconds: record_upstream('llm', seconds), [0.25, 0.5], 2))
+            record_upstream('smtp', 0.1)
+            start_response('201 Created', [])
+            return [b'hello', b' world']
+
+        with self.assertLogs('access', 'INFO') as logs:
+            self.assertEqual(run(AccessLogMiddleware(app), body=b'secret payload'), b'hello world')
+        entry = entries(logs)[0]
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('POST', '/x', 201))
+        self.assertEqual((entry['request_bytes'], entry['response_bytes']), (14, 11))
+        self.assertEqual((entry['llm_calls'], entry['llm_ms']), (2, 750.0))
+        self.assertEqual(entry['smtp_calls'], 1)
+        self.assertNotIn('body', entry)
+
+    def test_body_logging_is_capped(self):
+        def app(environ, start_response):
+            environ['wsgi.input'].read()
+            start_response('200 OK', [])
+            return [b'ok']
+
+        with self.assertLogs('access', 'INFO') as logs:
+            run(AccessLogMiddleware(app, log_bodies=True), body=b'x' * 10000)
+        self.assertEqual(len(entries(logs)[0]['body']), 2048)
+
+    def test_sampling_keeps_errors(self):
+        def app(environ, start_response):
+            status = '500 Internal Server Error' if environ['PATH_INFO'] == '/fail' else '200 OK'
+            start_response(status, [])
+            return [b'']
+
+        middleware = AccessLogMiddleware(app, sample_rate=0)
+        with self.assertLogs('access', 'INFO') as logs:
+            run(middleware, path='/ok')
+            run(middleware, path='/fail')
+        self.assertEqual([entry['path'] for entry in entries(logs)], ['/fail'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import json
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+os.environ.setdefault('LLM_CACHE_PATH', '')
+
+import chat_request
+from email_generator import async_generate_email_from_task
+from pdf_analyzer import async_analyze_document_segment
+
+EMAIL = {"subject": "Project update", "body": "Dear Alex, here is the update. Best regards", "tone": "formal"}
+ANALYSIS = {"inconsistencies": [], "logical_fallacies": [], "unsupported_statements": ["x"], "suggestions": []}
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /chat/completions endpoint."""
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        MockOpenAIHandler.requests.append(payload)
+        prompt = payload['messages'][0]['content']
+        content = ANALYSIS if 'Text to analyze' in prompt else EMAIL
+        body = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload['model'],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(content)}
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestAsyncClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockOpenAIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        MockOpenAIHandler.requests.clear()
+        patcher = mock.patch.object(chat_request, 'OPENAI_BASE_URL', self.base_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_requests_share_one_client(self):
+        async def run():
+            tasks = [async_generate_email_from_task(f"Task {i}", "Alex", use_cache=False) for i in range(10)]
+            emails = await asyncio.gather(*tasks)
+            client = chat_request.get_async_openai_client()
+            shared = client is chat_request.get_async_openai_client()
+            await chat_request.close_async_openai_client()
+            return emails, shared, client
+
+        emails, shared, client = asyncio.run(run())
+        self.assertEqual(emails, [EMAIL] * 10)
+        self.assertTrue(shared)
+        self.assertTrue(client.is_closed())
+        self.assertEqual(len(MockOpenAIHandler.requests), 10)
+        self.assertEqual(MockOpenAIHandler.requests[0]['response_format'], {"type": "json_object"})
+
+    def test_async_analyze_document_segment(self):
+        result = asyncio.run(async_analyze_document_segment("Some text to check.", use_cache=False))
+        self.assertEqual(result, ANALYSIS)
+
+    def test_async_validation_errors(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(async_generate_email_from_task("", "Alex"))
+        self.assertEqual(MockOpenAIHandler.requests, [])
+
+class TestRetryDelay(unittest.TestCase):
+    def error(self, cls, status_code, message='error'):
+        response = mock.Mock(status_code=status_code, headers={'retry-after': '7'})
+        return cls(message, response=response, body=None)
+
+    def test_model_errors_move_to_the_next_model(self):
+        import openai
+        self.assertIsNone(chat_request._retry_delay(self.error(openai.BadRequestError, 400, 'model not found'), 3, 0))
+        with self.assertRaises(ValueError):
+            chat_request._retry_delay(self.error(openai.BadRequestError, 400, 'bad messages'), 3, 0)
+
+    def test_rate_limits_throttle_the_shared_limiter(self):
+        import openai
+        with mock.patch.object(chat_request.openai_limiter, 'record_throttle') as throttle:
+            self.assertEqual(chat_request._retry_delay(self.error(openai.RateLimitError, 429), 3, 0), 0.0)
+        throttle.assert_called_once_with(7.0)
+        with self.assertRaises(ValueError):
+            chat_request._retry_delay(self.error(openai.RateLimitError, 429), 0, 3)
+
+    def test_server_errors_back_off_until_retries_run_out(self):
+        import openai
+        self.assertGreater(chat_request._retry_delay(self.error(openai.InternalServerError, 503), 2, 1), 0)
+        with self.assertRaises(ValueError):
+            chat_request._retry_delay(self.error(openai.InternalServerError, 503), 0, 3)
+        with self.assertRaises(chat_request.InvalidResponseError):
+            chat_request._retry_delay(chat_request.InvalidResponseError('missing subject'), 0, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+import pdf_analyzer
+from chat_request import count_tokens
+from pdf_analyzer import chunk_text, chunk_token_budget, iter_chunk_analyses, PDFAnalysisError
+
+def paragraph(number, sentences=30):
+    return " ".join(f"Sentence {number}.{i} has a few words in it." for i in range(sentences))
+
+class TestChunker(unittest.TestCase):
+    def test_chunks_fit_the_budget_and_end_on_sentences(self):
+        text = "\n\n".join(paragraph(p) for p in range(10))
+        chunks = list(chunk_text(text, max_tokens=200, overlap_tokens=0))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), 200)
+            self.assertTrue(chunk.endswith('in it.'))
+        # Nothing is lost or repeated without overlap
+        self.assertEqual(' '.join(' '.join(chunks).split()), ' '.join(text.split()))
+
+    def test_short_document_is_one_chunk(self):
+        pages = [paragraph(0, 5), paragraph(1, 5)]
+        chunks = list(chunk_text(pages))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].split('\n\n'), pages)
+
+    def test_prefers_paragraph_breaks_near_the_end_of_a_chunk(self):
+        text = paragraph(0, 16) + "\n\n" + paragraph(1, 16)
+        first = next(chunk_text(text, max_tokens=220, overlap_tokens=0))
+        self.assertEqual(first, paragraph(0, 16))
+
+    def test_overlap_repeats_trailing_sentences(self):
+        text = paragraph(0, 60)
+        chunks = list(chunk_text(text, max_tokens=200, overlap_tokens=30))
+        self.assertGreater(len(chunks), 1)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            first_sentence = chunk.split('. ')[0] + '.'
+            self.assertIn(first_sentence, previous)
+            self.assertLessEqual(count_tokens(chunk), 200)
+
+    def test_long_sentence_is_split_between_words(self):
+        chunks = list(chunk_text("word " * 500, max_tokens=50))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(len(chunk.split()) for chunk in chunks), 500)
+
+    def test_budget_leaves_room_for_prompt_and_completion(self):
+        self.assertGreater(chunk_token_budget(), 0)
+        self.assertLess(chunk_token_budget(), chunk_token_budget('gpt-3.5-turbo'))
+
+    def test_estimated_counts_leave_a_safety_margin(self):
+        with mock.patch.object(pdf_analyzer, 'has_exact_token_counts', return_value=True):
+            exact = chunk_token_budget()
+        with mock.patch.object(pdf_analyzer, 'has_exact_token_counts', return_value=False):
+            self.assertEqual(chunk_token_budget(), int(exact * pdf_analyzer.CHUNK_ESTIMATE_MARGIN))
+
+class TestChunkAnalyses(unittest.TestCase):
+    ANALYSIS = {"inconsistencies": [], "logical_fallacies": [], "unsupported_statements": [], "suggestions": []}
+
+    def test_analysis_starts_before_the_document_is_chunked(self):
+        pulled = []
+        pages_pulled_at_start = []
+        totals = []
+
+        def pages():
+            for number in range(4):
+                pulled.append(number)
+                yield paragraph(number)
+
+        def analyze(chunk):
+            pages_pulled_at_start.append(len(pulled))
+            return self.ANALYSIS
+
+        with mock.patch.object(pdf_analyzer, 'CHUNK_MAX_TOKENS', 300), \
+                mock.patch.object(pdf_analyzer, 'analyze_document_segment', side_effect=analyze):
+            results = list(iter_chunk_analyses(None, max_workers=1, pages=pages(), on_total=totals.append))
+        self.assertEqual(totals, [len(results)])
+        self.assertLess(pages_pulled_at_start[0], 4)
+
+    def test_documents_without_text_are_rejected(self):
+        totals = []
+        with self.assertRaises(PDFAnalysisError):
+            list(iter_chunk_analyses(None, pages=["", "   "], on_total=totals.append))
+        self.assertEqual(totals, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from flask import Flask
+from app import init_db
+from extensions import REPLICA_BIND, db, database_config, engine_options, pool_stats, read_session
+from models import UploadJob
+from jobs import INTERRUPTED_ERROR, JobQueue
+
+class TestDatabaseConfig(unittest.TestCase):
+    def test_server_databases_get_a_sized_pool_and_statement_timeout(self):
+        options = engine_options('postgresql://user@db/app')
+        self.assertIn('pool_size', options)
+        self.assertIn('max_overflow', options)
+        self.assertIn('statement_timeout', options['connect_args']['options'])
+
+    def test_sqlite_keeps_the_default_pool(self):
+        options = engine_options('sqlite:///app.db')
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('connect_args', options)
+
+    def test_replica_bind_and_legacy_postgres_scheme(self):
+        config = database_config('postgres://user@primary/app', 'postgres://user@replica/app')
+        self.assertEqual(config['SQLALCHEMY_DATABASE_URI'], 'postgresql://user@primary/app')
+        self.assertEqual(config['SQLALCHEMY_BINDS'][REPLICA_BIND]['url'], 'postgresql://user@replica/app')
+        self.assertEqual(database_config('sqlite://')['SQLALCHEMY_BINDS'], {})
+
+class TestReadReplica(unittest.TestCase):
+    def setUp(self):
+        # The replica is a second engine on the same file, standing in for a streaming replica
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        url = f'sqlite:///{path}'
+        self.app = Flask(__name__)
+        self.app.config.update(database_config(url, url))
+        db.init_app(self.app)
+        with self.app.app_context():
+            init_db()
+
+    def test_read_session_uses_the_replica(self):
+        with self.app.app_context():
+            db.session.add(UploadJob(id='replica-job', kind='excel', filename='tasks.xlsx'))
+            db.session.commit()
+            with read_session() as session:
+                self.assertIs(session.get_bind(), db.engines[REPLICA_BIND])
+                self.assertEqual(session.get(UploadJob, 'replica-job').filename, 'tasks.xlsx')
+            self.assertIn(REPLICA_BIND, pool_stats())
+            db.session.remove()
+
+class TestJobRecovery(unittest.TestCase):
+    def test_jobs_interrupted_by_a_restart_are_failed(self):
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        app = Flask(__name__)
+        app.config.update(database_config(f'sqlite:///{path}'))
+        db.init_app(app)
+        with app.app_context():
+            init_db()
+            for status in ('queued', 'running', 'succeeded'):
+                db.session.add(UploadJob(id=f'{status}-job', kind='pdf', filename='doc.pdf', status=status))
+            db.session.commit()
+            db.session.remove()
+
+        queue = JobQueue()
+        queue.init_app(app)  # a fresh process starting up
+        self.addCleanup(queue._executor.shutdown)
+
+        with app.app_context():
+            jobs = {job.id: job for job in db.session.execute(db.select(UploadJob)).scalars()}
+            self.assertEqual(jobs['queued-job'].status, 'failed')
+            self.assertEqual(jobs['running-job'].status, 'failed')
+            self.assertEqual(jobs['running-job'].error, INTERRUPTED_ERROR)
+            self.assertEqual(jobs['succeeded-job'].status, 'succeeded')
+            self.assertEqual(queue.fail_stale_jobs(), 0)
+            db.session.remove()
+
+BASELINE_SCHEMA = [
+    "CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, "
+    "email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL)",
+    "CREATE TABLE task (id INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, email VARCHAR(120) NOT NULL, "
+    "recipient VARCHAR(120) NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id))",
+    "CREATE TABLE pdf_analysis (id INTEGER PRIMARY KEY, filename VARCHAR(255) NOT NULL, analysis TEXT NOT NULL, "
+    "user_id INTEGER NOT NULL REFERENCES user (id))",
+    "CREATE TABLE generated_email (id INTEGER PRIMARY KEY, task_id INTEGER NOT NULL REFERENCES task (id), "
+    "content TEXT NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id), created_at DATETIME NOT NULL, "
+    "subject VARCHAR(255), status VARCHAR(20), sent_at DATETIME, opens INTEGER, clicks INTEGER, replies INTEGER, bounces INTEGER)",
+    "CREATE TABLE upload_job (id VARCHAR(32) PRIMARY KEY, kind VARCHAR(20) NOT NULL, filename VARCHAR(255) NOT NULL, "
+    "filepath VARCHAR(512) NOT NULL, status VARCHAR(20) NOT NULL, created_at DATETIME NOT NULL, started_at DATETIME, "
+    "finished_at DATETIME, total INTEGER, completed INTEGER, failed INTEGER, result JSON, error TEXT, error_code INTEGER)",
+    "INSERT INTO user VALUES (1, 'owner', 'owner@example.com', 'x')",
+    "INSERT INTO task VALUES (1, 'Send the update', 'alex@example.com', 'Alex', 1)",
+    "INSERT INTO pdf_analysis VALUES (1, 'report.pdf', '{}', 1)",
+    "INSERT INTO generated_email VALUES (1, 1, 'Hello', 1, '2024-01-01 00:00:00', 'Hi', 'sent', NULL, 0, 0, 0, 0)",
+]
+
+class TestSchemaUpgrade(unittest.TestCase):
+    def test_tables_from_an_older_release_are_upgraded(self):
+        from sqlalchemy import inspect, text
+        from models import GeneratedEmail, PDFAnalysis, Task, UploadJob
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        app = Flask(__name__)
+        app.config.update(database_config(f'sqlite:///{path}'))
+        db.init_app(app)
+        with app.app_context():
+            with db.engine.begin() as conn:
+                for statement in BASELINE_SCHEMA:
+                    conn.execute(text(statement))
+            self.assertTrue(init_db())
+            self.assertEqual(init_db(), [])  # idempotent
+
+            inspector = inspect(db.engine)
+            self.assertIn('ix_task_lookup_key', {index['name'] for index in inspector.get_indexes('task')})
+            self.assertIn('ix_pdf_analysis_content_hash', {index['name'] for index in inspector.get_indexes('pdf_analysis')})
+            self.assertEqual(
+                [fk['referred_table'] for fk in inspector.get_foreign_keys('generated_email') if 'task_id' in fk['constrained_columns']],
+                ['task']
+            )
+            self.assertNotIn('filepath', {column['name'] for column in inspector.get_columns('upload_job')})
+
+            # Old rows survive, and the relaxed columns accept anonymous rows
+            self.assertEqual(db.session.get(Task, 1).description, 'Send the update')
+            self.assertIsNotNone(db.session.get(PDFAnalysis, 1).last_used_at)
+            self.assertEqual(db.session.get(GeneratedEmail, 1).status, 'sent')
+            db.session.add(Task(description='Anonymous', email='a@example.com', recipient='Sam', lookup_key='k'))
+            db.session.add(PDFAnalysis(content_hash='h', filename='doc.pdf', text='text'))
+            db.session.add(UploadJob(id='upgraded-job', kind='excel', filename='tasks.xlsx'))
+            db.session.commit()
+            db.session.remove()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+import chat_request
+import email_generator
+from chat_request import InvalidResponseError, prompt_token_budget
+from email_generator import generate_emails_batch, iter_task_groups
+
+def email(subject):
+    return {"subject": subject, "body": "Dear Alex, here it is. Best regards", "tone": "formal"}
+
+TASKS = [("Task A", "Alex"), ("Task B", "Alex"), ("Task C", "Alex")]
+
+class TestTaskGroups(unittest.TestCase):
+    def test_groups_are_bounded_by_batch_size(self):
+        groups = list(iter_task_groups([("Short task", "Alex")] * 7, batch_size=3))
+        self.assertEqual([len(group) for group in groups], [3, 3, 1])
+        self.assertEqual([index for group in groups for index, _, _ in group], list(range(7)))
+
+    def test_groups_are_bounded_by_completion_tokens(self):
+        # Only BATCH_OUTPUT_SHARE of MAX_TOKENS is planned for completions, leaving headroom
+        max_items = int(email_generator.MAX_TOKENS * email_generator.BATCH_OUTPUT_SHARE) // email_generator.EMAIL_OUTPUT_TOKENS
+        groups = list(iter_task_groups([("Short task", "Alex")] * 20, batch_size=100))
+        self.assertEqual(max(len(group) for group in groups), max_items)
+
+    def test_long_tasks_get_smaller_groups(self):
+        long_task = "word " * (prompt_token_budget() // 3)  # ~40% of the prompt budget each
+        groups = list(iter_task_groups([(long_task, "Alex")] * 3, batch_size=5))
+        self.assertEqual([len(group) for group in groups], [2, 1])
+
+class TestGenerateEmailsBatch(unittest.TestCase):
+    def test_full_batch_makes_one_request(self):
+        response = json.dumps({"emails": [dict(email(f"S{i}"), index=i) for i in range(3)]})
+        with mock.patch.object(email_generator, 'send_openai_request', return_value=response) as send, \
+                mock.patch.object(email_generator, 'generate_email_from_task') as single:
+            results = generate_emails_batch(TASKS, use_cache=False)
+        self.assertEqual(results, [email("S0"), email("S1"), email("S2")])
+        send.assert_called_once()
+        single.assert_not_called()
+
+    def test_only_missing_and_invalid_elements_fall_back(self):
+        response = json.dumps({"emails": [
+            dict(email("S0"), index=0),
+            {"index": 1, "subject": "", "body": "", "tone": ""},  # fails validation; 2 is missing
+        ]})
+        with mock.patch.object(email_generator, 'send_openai_request', return_value=response), \
+                mock.patch.object(email_generator, 'generate_email_from_task', side_effect=lambda task, *a, **k: email(task)) as single:
+            results = generate_emails_batch(TASKS, use_cache=False)
+        self.assertEqual(results, [email("S0"), email("Task B"), email("Task C")])
+        self.assertEqual([call.args[0] for call in single.call_args_list], ["Task B", "Task C"])
+
+    def test_request_failure_fails_the_group_without_fallback(self):
+        with mock.patch.object(email_generator, 'send_openai_request', side_effect=ValueError("Rate limit exceeded and max retries reached")), \
+                mock.patch.object(email_generator, 'generate_email_from_task') as single:
+            results = generate_emails_batch(TASKS + [("", "Alex")], use_cache=False)
+        single.assert_not_called()
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertIn("Rate limit", str(results[0]))
+        self.assertIn("Task description cannot be empty", str(results[3]))
+
+    def test_unusable_batch_response_falls_back_per_element(self):
+        with mock.patch.object(email_generator, 'send_openai_request', side_effect=InvalidResponseError("no 'emails' array")), \
+                mock.patch.object(email_generator, 'generate_email_from_task', side_effect=lambda task, *a, **k: email(task)) as single:
+            results = generate_emails_batch(TASKS, use_cache=False)
+        self.assertEqual(results, [email(task) for task, _ in TASKS])
+        self.assertEqual(single.call_count, 3)
+
+    def test_truncated_batch_response_is_retried_then_falls_back(self):
+        truncated = SimpleNamespace(
+            choices=[SimpleNamespace(finish_reason='stop', message=SimpleNamespace(content='{"emails": [{"index": 0, "subject": "a", "body": "b'))],
+            usage=None
+        )
+        create = mock.Mock(return_value=truncated)
+        with mock.patch.object(chat_request, 'HEDGING_ENABLED', False), \
+                mock.patch.object(chat_request.openai_client.chat.completions, 'create', create), \
+                mock.patch.object(email_generator, 'generate_email_from_task', side_effect=lambda task, *a, **k: email(task)) as single:
+            results = generate_emails_batch(TASKS[:2], max_retries=1, use_cache=False)
+        self.assertEqual(results, [email("Task A"), email("Task B")])
+        self.assertEqual(single.call_count, 2)
+        self.assertEqual(create.call_count, 2)  # the first attempt and one retry
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,25 @@
 import unittest
+import io
 import os
+import json
+import time
 import tempfile
+import uuid
+from unittest import mock
 import pandas as pd
 from flask import url_for
-from app import app
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+
+from app import app, init_db
+from routes import clean_dataframe
 
 class TestFileUpload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            init_db()
+
     def setUp(self):
         app.config['TESTING'] = True
         app.config['WTF_CSRF_ENABLED'] = False
@@ -13,6 +27,18 @@ class TestFileUpload(unittest.TestCase):
         self.test_uploads_dir = 'uploads'
         os.makedirs(self.test_uploads_dir, exist_ok=True)
 
+    def wait_for_job(self, response, timeout=120):
+        # Uploads are processed in the background; poll the job until it finishes
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.client.get(f'/jobs/{job_id}').get_json()
+            if status['status'] in ('succeeded', 'failed'):
+                break
+            time.sleep(0.5)
+        return self.client.get(f'/jobs/{job_id}/result')
+
     def create_test_excel(self):
         # Create a temporary Excel file
         df = pd.DataFrame({
@@ -42,12 +68,100 @@ class TestFileUpload(unittest.TestCase):
                 data={'file': (f, 'test_tasks.xlsx')},
                 content_type='multipart/form-data'
             )
+            response = self.wait_for_job(response)
             self.assertEqual(response.status_code, 200)
             data = response.get_json()
             self.assertEqual(data['type'], 'excel_processing')
             self.assertIn('generated_emails', data)
             self.assertTrue(len(data['generated_emails']) > 0)
 
+    def test_excel_upload_stream(self):
+        excel_file = self.create_test_excel()
+        with open(excel_file, 'rb') as f:
+            response = self.client.post(
+                '/upload?stream=ndjson',
+                data={'file': (f, 'test_tasks.xlsx')},
+                content_type='multipart/form-data'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            self.assertEqual(records[0]['event'], 'start')
+            self.assertEqual(records[-1]['event'], 'summary')
+            self.assertEqual(records[-1]['rows'], 2)
+            self.assertEqual(records[-1]['succeeded'] + records[-1]['failures'], 2)
+
+    def test_generated_emails_are_persisted_and_reused(self):
+        task = f'Send the onboarding checklist {uuid.uuid4().hex}'
+        csv_file = os.path.join(self.test_uploads_dir, 'tasks.csv')
+        pd.DataFrame({'Task': [task], 'E-mail': ['new@example.com'], 'Recipient': ['Sam']}).to_csv(csv_file, index=False)
+        email = {'subject': 'Onboarding', 'body': 'Dear Sam, please see the checklist. Regards', 'tone': 'formal'}
+        
+        generated = []
+        
+        def fake_generation(tasks):
+            for index, pair in enumerate(tasks):
+                generated.append(pair)
+                yield index, email, None
+        
+        def upload():
+            with open(csv_file, 'rb') as f:
+                response = self.client.post(
+                    '/upload?stream=ndjson',
+                    data={'file': (f, 'tasks.csv')},
+                    content_type='multipart/form-data'
+                )
+            records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            return [record for record in records if record['event'] == 'email']
+        
+        with mock.patch('routes.iter_generated_emails', side_effect=fake_generation):
+            first = upload()
+            second = upload()
+        
+        self.assertEqual(first[0]['generated_email'], email)
+        self.assertNotIn('reused', first[0])
+        self.assertEqual(second[0]['generated_email'], email)
+        self.assertTrue(second[0]['reused'])
+        # The second upload had nothing left to generate
+        self.assertEqual(generated, [(task, 'Sam')])
+        with app.app_context():
+            from models import Task, GeneratedEmail
+            from extensions import db
+            saved = db.session.execute(
+                db.select(GeneratedEmail).join(Task, GeneratedEmail.task_id == Task.id).where(Task.description == task)
+            ).scalars().all()
+            self.assertEqual(len(saved), 1)
+            self.assertEqual(saved[0].subject, 'Onboarding')
+        # Both records carry the id /send-email tracks the saved email by
+        self.assertEqual(first[0]['email_id'], saved[0].id)
+        self.assertEqual(second[0]['email_id'], saved[0].id)
+
+    def test_same_name_uploads_do_not_collide(self):
+        # Both uploads are named tasks.csv and queued before either runs; one is forced to spill to disk
+        tasks = [f'Review the release notes {uuid.uuid4().hex}', f'Approve the budget {uuid.uuid4().hex}']
+        email = {'subject': 'Hello', 'body': 'Dear Sam, hello. Regards', 'tone': 'formal'}
+        
+        def fake_generation(pairs):
+            for index, pair in enumerate(pairs):
+                yield index, {**email, 'subject': pair[0]}, None
+        
+        def upload(task):
+            data = pd.DataFrame({'Task': [task], 'E-mail': ['sam@example.com'], 'Recipient': ['Sam']}).to_csv(index=False)
+            return self.client.post(
+                '/upload',
+                data={'file': (io.BytesIO(data.encode()), 'tasks.csv')},
+                content_type='multipart/form-data'
+            )
+        
+        with mock.patch('routes.iter_generated_emails', side_effect=fake_generation):
+            first = upload(tasks[0])
+            with mock.patch('uploads.SPOOL_MAX_SIZE', 16):
+                second = upload(tasks[1])
+            results = [self.wait_for_job(first).get_json(), self.wait_for_job(second).get_json()]
+        
+        self.assertEqual([result['generated_emails'][0]['task'] for result in results], tasks)
+        self.assertEqual([result['generated_emails'][0]['generated_email']['subject'] for result in results], tasks)
+
     def test_pdf_upload(self):
         pdf_file = self.create_test_pdf()
         with open(pdf_file, 'rb') as f:
@@ -56,12 +170,42 @@ class TestFileUpload(unittest.TestCase):
                 data={'file': (f, 'test_document.pdf')},
                 content_type='multipart/form-data'
             )
+            response = self.wait_for_job(response)
             self.assertEqual(response.status_code, 200)
             data = response.get_json()
             self.assertEqual(data['type'], 'pdf_analysis')
             self.assertIn('results', data)
             self.assertTrue(isinstance(data['results'], dict))
 
+    def test_pdf_upload_stream(self):
+        pdf_file = self.create_test_pdf()
+        analysis = {"inconsistencies": [], "logical_fallacies": [], "unsupported_statements": ["x"], "suggestions": []}
+        with open(pdf_file, 'rb') as f, mock.patch('pdf_analyzer.analyze_document_segment', return_value=analysis):
+            response = self.client.post(
+                '/upload?stream=ndjson',
+                data={'file': (f, 'test_document.pdf')},
+                content_type='multipart/form-data'
+            )
+            records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        # The chunk count arrives in a plan record once chunking is done, after the early start record
+        self.assertEqual(records[0], {'event': 'start', 'type': 'pdf_analysis'})
+        plans = [record for record in records if record['event'] == 'plan']
+        self.assertEqual(len(plans), 1)
+        self.assertEqual(records[-1]['event'], 'summary')
+        self.assertEqual(plans[0]['chunks'], records[-1]['chunks'])
+        self.assertEqual(records[-1]['succeeded'], plans[0]['chunks'])
+
+    def test_full_job_queue_rejects_uploads(self):
+        excel_file = self.create_test_excel()
+        with open(excel_file, 'rb') as f, mock.patch('routes.job_queue._max_pending', 0):
+            response = self.client.post(
+                '/upload',
+                data={'file': (f, 'test_tasks.xlsx')},
+                content_type='multipart/form-data'
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
     def test_invalid_file(self):
         temp_txt = os.path.join(self.test_uploads_dir, 'test.txt')
         with open(temp_txt, 'w') as f:
@@ -81,5 +225,42 @@ class TestFileUpload(unittest.TestCase):
             os.remove(os.path.join(self.test_uploads_dir, file))
         os.rmdir(self.test_uploads_dir)
 
+class TestCleanDataframe(unittest.TestCase):
+    def batch(self, rows, start):
+        return pd.DataFrame(rows, columns=['Task', 'E-mail', 'Recipient'], index=range(start, start + len(rows)))
+
+    def test_rows_are_validated_and_deduplicated_across_batches(self):
+        seen = {}
+        df, filtered_rows, row_errors = clean_dataframe(self.batch([
+            ['Send  report ', 'A@Example.com ', ' Sam '],
+            ['', 'b@example.com', 'Blank'],
+            ['Call Bob', 'not-an-email', 'Bob'],
+            ['send REPORT', 'a@example.com', 'Sam'],
+            ['Call Bob', 'bob@example.com', 'Bob'],
+        ], 0), seen=seen)
+        self.assertEqual(filtered_rows, 1)
+        self.assertEqual(row_errors, [
+            {'row': 4, 'column': 'E-mail', 'value': 'not-an-email', 'error': 'Invalid email address'},
+            {'row': 5, 'column': 'Task', 'value': 'send REPORT', 'error': 'Duplicate of row 2'},
+        ])
+        self.assertEqual(df.values.tolist(), [
+            ['Send report', 'a@example.com', 'Sam'],
+            ['Call Bob', 'bob@example.com', 'Bob'],
+        ])
+        self.assertEqual(list(df.index), [0, 4])
+
+        # A later batch of the same sheet: duplicates point back at the first batch
+        df, filtered_rows, row_errors = clean_dataframe(self.batch([
+            ['Call Bob', 'BOB@example.com', 'Bob'],
+            [None, 'c@example.com', 'Cy'],
+            ['Plan sprint', 'c@example.com', 'Cy'],
+        ], 5), seen=seen)
+        self.assertEqual(filtered_rows, 1)
+        self.assertEqual(row_errors, [
+            {'row': 7, 'column': 'Task', 'value': 'Call Bob', 'error': 'Duplicate of row 6'},
+        ])
+        self.assertEqual(df.values.tolist(), [['Plan sprint', 'c@example.com', 'Cy']])
+        self.assertEqual(list(df.index), [7])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+import chat_request
+from llm_cache import ResponseCache
+from email_generator import build_email_prompt, generate_email_from_task
+
+EMAIL = {"subject": "Project update", "body": "Dear Alex, here is the update. Best regards", "tone": "formal"}
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+
+    def make_cache(self, **kwargs):
+        return ResponseCache(ttl=100, disk_path=self.path, enabled=True, **kwargs)
+
+    def test_hit_and_miss(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['memory_hits'], stats['stores']), (1, 1, 1))
+
+    def test_entries_expire(self):
+        cache = self.make_cache()
+        with mock.patch('llm_cache.time.time', return_value=1000.0):
+            cache.set('key', 'value')
+        with mock.patch('llm_cache.time.time', return_value=1099.0):
+            self.assertEqual(cache.get('key'), 'value')
+        with mock.patch('llm_cache.time.time', return_value=1100.0):
+            self.assertIsNone(cache.get('key'))
+
+    def test_disk_hit_keeps_remaining_ttl(self):
+        with mock.patch('llm_cache.time.time', return_value=1000.0):
+            self.make_cache().set('key', 'value')
+
+        # A second process finds the entry on disk 90s later; it must still expire at 1100
+        cache = self.make_cache()
+        with mock.patch('llm_cache.time.time', return_value=1090.0):
+            self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        with mock.patch('llm_cache.time.time', return_value=1100.0):
+            self.assertIsNone(cache.get('key'))
+
+    def test_delete_removes_both_tiers(self):
+        cache = self.make_cache()
+        cache.set('key', 'value')
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertIsNone(self.make_cache().get('key'))
+
+class TestResponseValidation(unittest.TestCase):
+    def setUp(self):
+        cache = ResponseCache(disk_path=None, enabled=True)
+        patcher = mock.patch.object(chat_request, 'response_cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = cache
+
+    def test_invalid_response_is_retried_and_not_cached(self):
+        responses = [json.dumps({"subject": "hi"}), json.dumps(EMAIL)]
+        with mock.patch.object(chat_request, '_hedged_completion', side_effect=lambda model, *args: (model, responses.pop(0))) as completion:
+            self.assertEqual(generate_email_from_task("Send the update", "Alex"), EMAIL)
+            self.assertEqual(completion.call_count, 2)
+            # The valid answer is cached and served without another call
+            self.assertEqual(generate_email_from_task("Send the update", "Alex"), EMAIL)
+            self.assertEqual(completion.call_count, 2)
+
+    def test_cached_invalid_response_is_dropped(self):
+        prompt_key = chat_request.make_cache_key(
+            chat_request.MODELS[0], build_email_prompt("Send the update", "Alex"),
+            chat_request.TEMPERATURE, chat_request.MAX_TOKENS
+        )
+        self.cache.set(prompt_key, json.dumps({"subject": "hi"}))
+        with mock.patch.object(chat_request, '_hedged_completion', return_value=(chat_request.MODELS[0], json.dumps(EMAIL))) as completion:
+            self.assertEqual(generate_email_from_task("Send the update", "Alex"), EMAIL)
+        completion.assert_called_once()
+        self.assertEqual(json.loads(self.cache.get(prompt_key)), EMAIL)
+
+    def test_persistently_invalid_response_fails(self):
+        with mock.patch.object(chat_request, '_hedged_completion', return_value=(chat_request.MODELS[0], json.dumps({"subject": "hi"}))):
+            with self.assertRaises(ValueError):
+                generate_email_from_task("Send the update", "Alex", max_retries=1)
+        self.assertEqual(self.cache.stats()['stores'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import time
+import unittest
+from unittest import mock
+import metrics
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+
+from app import app
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_and_histogram_exposition(self):
+        requests = metrics.Counter('test_requests_total', 'Requests.', ['route'])
+        latency = metrics.Histogram('test_latency_seconds', 'Latency.', buckets=(0.1, 1))
+        requests.inc(route='/a')
+        requests.inc(2, route='/a')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        lines = requests.render() + latency.render()
+        self.assertIn('# TYPE test_requests_total counter', lines)
+        self.assertIn('test_requests_total{route="/a"} 3', lines)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('test_latency_seconds_count 3', lines)
+
+    def test_timed_generator_records_one_observation(self):
+        @metrics.timed_generator('test_stage')
+        def numbers():
+            yield from range(3)
+
+        self.assertEqual(list(numbers()), [0, 1, 2])
+        self.assertIn('stage_duration_seconds_count{stage="test_stage"} 1', metrics.stage_duration.render())
+
+    def test_timed_generator_excludes_its_source(self):
+        @metrics.timed_generator('test_source_stage', source='items')
+        def doubled(items):
+            for item in items:
+                yield item * 2
+
+        def slow_items():
+            for item in range(3):
+                time.sleep(0.05)
+                yield item
+
+        with mock.patch.object(metrics.stage_duration, 'observe') as observe:
+            self.assertEqual(list(doubled(slow_items())), [0, 2, 4])
+        elapsed = observe.call_args.args[0]
+        self.assertLess(elapsed, 0.05)
+
+    def test_disabled_instrumentation_is_free(self):
+        def work():
+            return 42
+
+        with mock.patch.object(metrics, 'METRICS_ENABLED', False):
+            self.assertIs(metrics.timed('test_disabled')(work), work)
+            counter = metrics.Counter('test_disabled_total', 'Disabled.')
+            counter.inc()
+            self.assertEqual(counter.render()[2:], [])
+
+    def test_metrics_endpoint(self):
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('# TYPE openai_request_duration_seconds histogram', body)
+        self.assertIn('openai_concurrency_limit ', body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+os.environ.setdefault('LLM_CACHE_PATH', '')
+
+import chat_request
+from model_router import ModelRouter, MIN_SAMPLES
+from rate_limiter import RateLimiter
+
+def fake_completion(delays):
+    """Stand-in for chat.completions.create that sleeps a per-model delay."""
+    def create(model, **kwargs):
+        time.sleep(delays[model])
+        message = SimpleNamespace(content='{"model": "%s"}' % model)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+    return create
+
+class TestModelRouter(unittest.TestCase):
+    def test_unhealthy_model_is_demoted(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        self.assertEqual(router.order(), ['gpt-4', 'gpt-3.5-turbo'])
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4', None, ok=False)
+        self.assertEqual(router.order(), ['gpt-3.5-turbo', 'gpt-4'])
+
+    def test_hedge_delay_tracks_p95(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        for i in range(100):
+            router.record('gpt-4', i / 100, ok=True)
+        self.assertAlmostEqual(router.hedge_delay('gpt-4'), 0.95)
+        self.assertEqual(router.hedge_model('gpt-4', router.order()), 'gpt-3.5-turbo')
+
+    def test_only_faster_models_are_hedged_with(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo', 'gpt-4o'])
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4', 0.5, ok=True)
+            router.record('gpt-3.5-turbo', 1.0, ok=True)
+        # gpt-4o has no samples yet, so it is tried rather than the measured, slower model
+        self.assertEqual(router.hedge_model('gpt-4', router.order()), 'gpt-4o')
+        self.assertIsNone(router.hedge_model('gpt-4', ['gpt-4', 'gpt-3.5-turbo']))
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4o', 0.2, ok=True)
+        self.assertEqual(router.hedge_model('gpt-4', router.order()), 'gpt-4o')
+        self.assertIsNone(router.hedge_model('gpt-4o', router.order()))
+
+    def test_slow_primary_is_hedged(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4', 0.05, ok=True)
+        create = fake_completion({'gpt-4': 1.0, 'gpt-3.5-turbo': 0.01})
+        with mock.patch.object(chat_request, 'model_router', router), \
+                mock.patch.object(chat_request.openai_client.chat.completions, 'create', side_effect=create):
+            start = time.monotonic()
+            model, content = chat_request._hedged_completion('gpt-4', router.order(), 'prompt', 10)
+            elapsed = time.monotonic() - start
+        self.assertEqual(model, 'gpt-3.5-turbo')
+        self.assertEqual(content, '{"model": "gpt-3.5-turbo"}')
+        self.assertLess(elapsed, 0.5)
+
+    def test_no_hedge_without_spare_limiter_slots(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4', 0.05, ok=True)
+        # The primary holds one of two slots; a hedge would take the last one
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=2)
+        create = mock.Mock(side_effect=fake_completion({'gpt-4': 0.3, 'gpt-3.5-turbo': 0.01}))
+        with mock.patch.object(chat_request, 'model_router', router), \
+                mock.patch.object(chat_request, 'openai_limiter', limiter), \
+                mock.patch.object(chat_request.openai_client.chat.completions, 'create', create):
+            model, _ = chat_request._hedged_completion('gpt-4', router.order(), 'prompt', 10)
+        self.assertEqual(model, 'gpt-4')
+        self.assertEqual(create.call_count, 1)
+
+    def test_async_hedges_need_spare_limiter_slots(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        for _ in range(MIN_SAMPLES):
+            router.record('gpt-4', 0.05, ok=True)
+        delays = {'gpt-4': 0.3, 'gpt-3.5-turbo': 0.01}
+
+        async def create(model, **kwargs):
+            await asyncio.sleep(delays[model])
+            message = SimpleNamespace(content='{"model": "%s"}' % model)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')], usage=None)
+
+        for max_concurrency, expected in ((2, 'gpt-4'), (3, 'gpt-3.5-turbo')):
+            limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=max_concurrency)
+            client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=mock.AsyncMock(side_effect=create))))
+            with mock.patch.object(chat_request, 'model_router', router), \
+                    mock.patch.object(chat_request, 'openai_limiter', limiter), \
+                    mock.patch.object(chat_request, 'get_async_openai_client', return_value=client):
+                model, _ = asyncio.run(chat_request._async_hedged_completion('gpt-4', router.order(), 'prompt', 10))
+            self.assertEqual(model, expected)
+
+    def test_fast_primary_is_not_hedged(self):
+        router = ModelRouter(['gpt-4', 'gpt-3.5-turbo'])
+        create = mock.Mock(side_effect=fake_completion({'gpt-4': 0.01, 'gpt-3.5-turbo': 0.01}))
+        with mock.patch.object(chat_request, 'model_router', router), \
+                mock.patch.object(chat_request.openai_client.chat.completions, 'create', create):
+            model, _ = chat_request._hedged_completion('gpt-4', router.order(), 'prompt', 10)
+        self.assertEqual(model, 'gpt-4')
+        self.assertEqual(create.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
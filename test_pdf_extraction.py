@@ -0,0 +1,59 @@
+import io
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+import pdf_analyzer
+from pdf_analyzer import iter_pdf_pages
+
+def make_pdf(pages):
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for page in range(pages):
+        c.drawString(100, 750, f"Page {page + 1} of the extraction test.")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+class BrokenPool:
+    """Stands in for a process pool whose workers have died."""
+    def submit(self, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+class TestMultiprocessExtraction(unittest.TestCase):
+    PAGES = 20
+
+    def setUp(self):
+        self.data = make_pdf(self.PAGES)
+        with mock.patch.object(pdf_analyzer, 'EXTRACTION_PROCESSES', 1):
+            self.expected = list(iter_pdf_pages(io.BytesIO(self.data)))
+        self.assertEqual(len(self.expected), self.PAGES)
+        for name, value in (('MULTIPROCESS_PAGE_THRESHOLD', 2), ('EXTRACTION_PROCESSES', 2), ('MIN_PAGES_PER_TASK', 3)):
+            patcher = mock.patch.object(pdf_analyzer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(pdf_analyzer._reset_extraction_pool)
+
+    def test_process_pool_matches_inline_extraction(self):
+        with mock.patch.object(pdf_analyzer, '_iter_pages_inline', wraps=pdf_analyzer._iter_pages_inline) as inline:
+            pages = list(iter_pdf_pages(io.BytesIO(self.data)))
+        self.assertEqual(pages, self.expected)
+        inline.assert_not_called()
+        self.assertEqual(pdf_analyzer._extraction_pool._mp_context.get_start_method(), pdf_analyzer.EXTRACTION_START_METHOD)
+
+    def test_ranges_are_sized_per_worker(self):
+        self.assertEqual(pdf_analyzer._pages_per_task(self.PAGES), 5)  # 2 workers x 2 ranges each
+        self.assertEqual(pdf_analyzer._pages_per_task(4), 3)
+
+    def test_broken_pool_falls_back_to_inline_extraction(self):
+        with mock.patch.object(pdf_analyzer, '_get_extraction_pool', return_value=BrokenPool()), \
+                mock.patch.object(pdf_analyzer, '_reset_extraction_pool') as reset:
+            pages = list(iter_pdf_pages(io.BytesIO(self.data)))
+        self.assertEqual(pages, self.expected)
+        reset.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import unittest
+import io
+from datetime import datetime, timedelta
+from unittest import mock
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+
+from app import app, init_db
+from extensions import db
+from models import PDFAnalysis
+from pdf_store import PDFCacheEntry, evict_pdf_cache, pdf_content_hash
+import routes
+
+def make_pdf(text):
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, invariant=1)
+    c.drawString(100, 750, text)
+    c.save()
+    return buffer.getvalue()
+
+class TestPDFCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            init_db()
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.session.execute(db.delete(PDFAnalysis))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def test_second_upload_is_served_from_cache(self):
+        data = make_pdf("Quarterly revenue grew by ten percent.")
+        analysis = {'unsupported_statements': ['Revenue grew by ten percent'], 'suggestions': ['Cite the source']}
+        with mock.patch('pdf_analyzer.analyze_document_segment', return_value=analysis) as analyze:
+            first = routes.process_pdf_file(io.BytesIO(data), 'report.pdf')
+            self.assertEqual(analyze.call_count, 1)
+            second = routes.process_pdf_file(io.BytesIO(data), 'copy-of-report.pdf')
+            self.assertEqual(analyze.call_count, 1)
+
+        self.assertNotIn('cached', first)
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['results'], first['results'])
+        row = db.session.execute(db.select(PDFAnalysis)).scalar_one()
+        self.assertEqual(row.content_hash, pdf_content_hash(io.BytesIO(data)))
+        self.assertIn('Quarterly revenue', row.text)
+
+    def test_failed_analysis_keeps_text_only(self):
+        data = make_pdf("Statements that fail to analyze.")
+        with mock.patch('pdf_analyzer.analyze_document_segment', side_effect=ValueError("model unavailable")):
+            with self.assertRaises(routes.UploadProcessingError):
+                routes.process_pdf_file(io.BytesIO(data), 'report.pdf')
+
+        entry = PDFCacheEntry.lookup(io.BytesIO(data), 'report.pdf')
+        self.assertIsNone(entry.analysis)
+        with mock.patch('pdf_analyzer.iter_pdf_pages') as extract:
+            pages = list(entry.pages(io.BytesIO(data)))
+        extract.assert_not_called()
+        self.assertIn('Statements that fail', pages[0])
+
+    def test_eviction_by_age_and_count(self):
+        now = datetime.utcnow()
+        for i in range(5):
+            db.session.add(PDFAnalysis(
+                content_hash=f'{i:064x}', filename=f'{i}.pdf', text='text',
+                last_used_at=now - timedelta(days=i * 10)
+            ))
+        db.session.commit()
+
+        self.assertEqual(evict_pdf_cache(ttl=25 * 24 * 3600, max_entries=10), 2)
+        self.assertEqual(evict_pdf_cache(ttl=25 * 24 * 3600, max_entries=2), 1)
+        remaining = db.session.execute(db.select(PDFAnalysis.filename).order_by(PDFAnalysis.filename)).scalars().all()
+        self.assertEqual(remaining, ['0.pdf', '1.pdf'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import threading
+import unittest
+from rate_limiter import RateLimiter, TokenBucket, backoff_delay
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_wait_time(self):
+        bucket = TokenBucket(60)  # one unit per second
+        now = time.monotonic()
+        self.assertEqual(bucket.wait_time(60, now), 0)
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(2, now), 2, delta=0.05)
+        # Requests larger than the bucket wait for a full bucket instead of forever
+        self.assertAlmostEqual(bucket.wait_time(1000, now), 60, delta=0.05)
+
+    def test_aimd_concurrency(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=8)
+        limiter.record_throttle(0)
+        self.assertEqual(limiter.concurrency_limit, 4)
+        # A burst of 429s from the same window only halves the limit once
+        limiter.record_throttle(0)
+        self.assertEqual(limiter.concurrency_limit, 4)
+        for _ in range(40):
+            limiter.record_success()
+        self.assertEqual(limiter.concurrency_limit, 8)
+
+    def test_concurrency_is_capped(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=2)
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            with limiter.slot(10):
+                with lock:
+                    peak.append(limiter.stats()["in_flight"])
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(limiter.stats()["requests"], 6)
+
+    def test_throttle_pauses_callers(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6)
+        limiter.record_throttle(0.2)
+        start = time.monotonic()
+        with limiter.slot(10):
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_spare_slots(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=4)
+        with limiter.slot(10):
+            self.assertEqual(limiter.spare_slots(), 3)
+        limiter.record_throttle(10)
+        self.assertEqual(limiter.spare_slots(), 0)  # paused callers leave nothing to spare
+
+    def test_backoff_delay_is_jittered_and_capped(self):
+        delays = [backoff_delay(10, initial=1, maximum=8) for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 8 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
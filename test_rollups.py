@@ -0,0 +1,133 @@
+import io
+import os
+import time
+import uuid
+import unittest
+from unittest import mock
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+
+from app import app, init_db
+from extensions import db
+from models import GeneratedEmail, EmailEvent, User
+from email_store import EmailWriter
+from rollups import dashboard_stats, record_events, record_send_results
+
+class TestRollups(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            init_db()
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def create_emails(self, count):
+        writer = EmailWriter()
+        for i in range(count):
+            writer.add(f'Rollup task {i}', 'rollup@example.com', 'Robin',
+                       {'subject': f'Subject {i}', 'body': 'Dear Robin, hello. Regards', 'tone': 'formal'})
+        writer.flush()
+        return db.session.execute(
+            db.select(GeneratedEmail.id).order_by(GeneratedEmail.id.desc()).limit(count)
+        ).scalars().all()
+
+    def test_counters_follow_events(self):
+        before = dashboard_stats(None)
+        email_ids = self.create_emails(2)
+
+        record_send_results([(email_ids[0], True), (email_ids[1], True), (None, False)])
+        recorded = record_events([
+            {'email_id': email_ids[0], 'event_type': 'open'},
+            {'email_id': email_ids[0], 'event_type': 'open'},
+            {'email_id': email_ids[1], 'event_type': 'click'},
+            {'email_id': 10 ** 9, 'event_type': 'open'}  # unknown email, dropped
+        ])
+        self.assertEqual(recorded, 3)
+
+        after = dashboard_stats(None)
+        self.assertEqual(after['total_emails'] - before['total_emails'], 2)
+        self.assertEqual(after['sent_emails'] - before['sent_emails'], 2)
+        self.assertEqual(after['total_opens'] - before['total_opens'], 2)
+        self.assertEqual(after['total_clicks'] - before['total_clicks'], 1)
+
+        email = db.session.get(GeneratedEmail, email_ids[0])
+        self.assertEqual((email.opens, email.status), (2, 'sent'))
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(
+            db.session.execute(db.select(db.func.count()).where(EmailEvent.email_id == email_ids[0])).scalar(),
+            2
+        )
+
+    def test_dashboard_requires_login(self):
+        self.create_emails(1)
+        response = self.client.get('/dashboard')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login', response.headers['Location'])
+
+    def create_user(self, username):
+        user = db.session.execute(db.select(User).filter_by(username=username)).scalar()
+        if user is None:
+            user = User(username=username, email=f'{username}@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+        return user
+
+    def log_in(self, user):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+
+    def test_dashboard_shows_only_own_emails(self):
+        user = self.create_user('rollup-owner')
+        self.create_emails(1)  # anonymous upload, 'Subject 0'
+        writer = EmailWriter(user_id=user.id)
+        writer.add('Owned task', 'rollup@example.com', 'Robin',
+                   {'subject': 'Owned subject', 'body': 'Dear Robin, hello. Regards', 'tone': 'formal'})
+        writer.flush()
+
+        self.log_in(user)
+        response = self.client.get('/dashboard')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Owned subject', response.data)
+        self.assertNotIn(b'Subject 0', response.data)
+
+    def test_uploads_by_a_logged_in_user_reach_their_dashboard(self):
+        user = self.create_user(f'uploader-{uuid.uuid4().hex[:8]}')
+        self.log_in(user)
+        email = {'subject': 'Uploaded subject', 'body': 'Dear Sam, hello. Regards', 'tone': 'formal'}
+
+        def fake_generation(pairs):
+            for index, _ in enumerate(pairs):
+                yield index, email, None
+
+        def upload(query=''):
+            sheet = f"Task,E-mail,Recipient\nUpload task {uuid.uuid4().hex},sam@example.com,Sam\n"
+            return self.client.post(
+                f'/upload{query}',
+                data={'file': (io.BytesIO(sheet.encode()), 'tasks.csv')},
+                content_type='multipart/form-data'
+            )
+
+        with mock.patch('routes.iter_generated_emails', side_effect=fake_generation):
+            upload('?stream=ndjson').get_data()
+            # Queued uploads run on a worker thread, without the request's login
+            job_id = upload().get_json()['job_id']
+            deadline = time.time() + 30
+            while self.client.get(f'/jobs/{job_id}').get_json()['status'] not in ('succeeded', 'failed') and time.time() < deadline:
+                time.sleep(0.1)
+
+        self.assertEqual(dashboard_stats(user.id)['total_emails'], 2)
+        response = self.client.get('/dashboard')
+        self.assertIn(b'<p class="card-text display-6">2</p>', response.data)
+        self.assertIn(b'Uploaded subject', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import io
+import unittest
+from unittest import mock
+import pandas as pd
+from sheet_reader import REQUIRED_COLUMNS, iter_task_batches
+
+ROWS = [[f'Task {i}', f'user{i}@example.com', f'Recipient {i}'] for i in range(5)]
+
+class TestSheetBatches(unittest.TestCase):
+    def assertBatches(self, batches, sizes):
+        self.assertEqual([len(batch) for batch in batches], sizes)
+        for batch in batches:
+            self.assertEqual(list(batch.columns), REQUIRED_COLUMNS)
+        # Rows keep their position below the header across batches
+        self.assertEqual([index for batch in batches for index in batch.index], list(range(len(ROWS))))
+        self.assertEqual([row for batch in batches for row in batch.values.tolist()], ROWS)
+
+    def test_csv_is_read_in_batches(self):
+        data = "Recipient,Notes, Task ,E-mail \n" + "".join(f"{r},note,{t},{e}\n" for t, e, r in ROWS)
+        batches = list(iter_task_batches(io.BytesIO(data.encode()), batch_size=2, filename='tasks.csv'))
+        self.assertBatches(batches, [2, 2, 1])
+
+    def test_xls_is_read_in_batches(self):
+        sheet = pd.DataFrame([[r, 'note', t, e] for t, e, r in ROWS], columns=['Recipient', 'Notes', ' Task ', 'E-mail'])
+
+        def read_excel(source, nrows=None, usecols=None):
+            # Stands in for the .xls engine, which is an optional dependency
+            df = sheet if usecols is None else sheet[[column for column in sheet.columns if column in usecols]]
+            return df.head(nrows) if nrows is not None else df
+
+        with mock.patch('pandas.read_excel', side_effect=read_excel):
+            batches = list(iter_task_batches(io.BytesIO(b'xls'), batch_size=2, filename='tasks.xls'))
+        self.assertBatches(batches, [2, 2, 1])
+
+    def test_xlsx_is_read_in_batches(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.append([' Task', 'E-mail', 'Recipient '])
+        for row in ROWS:
+            workbook.active.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        batches = list(iter_task_batches(buffer, batch_size=2, filename='tasks.xlsx'))
+        self.assertBatches(batches, [2, 2, 1])
+
+    def test_missing_columns_are_reported(self):
+        with self.assertRaisesRegex(ValueError, 'Missing required columns: E-mail'):
+            list(iter_task_batches(io.BytesIO(b"Task,Recipient\na,b\n"), filename='tasks.csv'))
+
+if __name__ == '__main__':
+    unittest.main()
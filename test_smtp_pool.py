@@ -0,0 +1,94 @@
+import unittest
+import os
+import socket
+from unittest import mock
+import smtp_pool
+from utils import build_message, send_emails
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:  # pragma: no cover
+    Controller = None
+
+class RecordingHandler:
+    """Collects delivered messages and the client connection each one arrived on."""
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.peer, envelope.rcpt_tos))
+        return '250 OK'
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@unittest.skipIf(Controller is None, "aiosmtpd is not installed")
+class TestSMTPConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.port = free_port()
+        self.controller = Controller(
+            self.handler,
+            hostname='127.0.0.1',
+            port=self.port,
+            authenticator=accept_any_login,
+            auth_require_tls=False
+        )
+        self.controller.start()
+        self.pool = smtp_pool.SMTPConnectionPool(
+            '127.0.0.1', self.port, 'sender@example.com', 'secret',
+            use_tls=False, size=2, max_messages=3
+        )
+
+    def tearDown(self):
+        self.pool.close()
+        self.controller.stop()
+
+    def send(self, recipient):
+        self.pool.send(build_message('sender@example.com', recipient, 'Subject', 'Body'))
+
+    def test_reuses_connection(self):
+        for i in range(3):
+            self.send(f'user{i}@example.com')
+        self.assertEqual(len(self.handler.messages), 3)
+        self.assertEqual(len({peer for peer, _ in self.handler.messages}), 1)
+
+    def test_recycles_after_message_cap(self):
+        for i in range(4):
+            self.send(f'user{i}@example.com')
+        peers = [peer for peer, _ in self.handler.messages]
+        self.assertEqual(len(set(peers)), 2)
+        self.assertEqual(peers[0], peers[2])
+        self.assertNotEqual(peers[2], peers[3])
+
+    def test_reconnects_after_disconnect(self):
+        self.send('first@example.com')
+        # Drop the idle session underneath the pool
+        self.pool._idle[0].server.sock.close()
+        self.send('second@example.com')
+        self.assertEqual(len(self.handler.messages), 2)
+
+    def test_batch_send_reports_per_recipient(self):
+        credentials = {'SMTP_USERNAME': 'sender@example.com', 'SMTP_PASSWORD': 'secret'}
+        with mock.patch.dict(os.environ, credentials), \
+                mock.patch.multiple(smtp_pool, SMTP_HOST='127.0.0.1', SMTP_PORT=self.port, SMTP_USE_TLS=False):
+            try:
+                results = send_emails([
+                    {'email': 'a@example.com', 'subject': 'Hi', 'body': 'One'},
+                    {'email': 'not-an-email', 'subject': 'Hi', 'body': 'Two'},
+                    {'email': 'c@example.com', 'subject': 'Hi', 'body': 'Three'}
+                ])
+            finally:
+                smtp_pool._close_pool()
+        self.assertEqual([r['status'] for r in results], ['sent', 'failed', 'sent'])
+        self.assertIn('Invalid recipient', results[1]['error'])
+        self.assertEqual(len(self.handler.messages), 2)
+
+if __name__ == '__main__':
+    unittest.main()
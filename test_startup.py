@@ -0,0 +1,43 @@
+import os
+import sys
+import json
+import unittest
+import subprocess
+
+# Seconds a cold `import app` plus create_app() may take; generous enough for slow CI hosts
+IMPORT_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "2.0"))
+HEAVY_MODULES = ('pandas', 'openpyxl', 'PyPDF2', 'openai')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+flask_app = app.create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+class TestStartup(unittest.TestCase):
+    def probe(self):
+        # A fresh interpreter, so modules imported by other tests don't hide a slow import
+        env = {key: value for key, value in os.environ.items() if key != 'OPENAI_API_KEY'}
+        env.setdefault('DATABASE_URL', 'sqlite://')
+        env.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_create_app_defers_heavy_imports(self):
+        result = self.probe()
+        self.assertEqual(result['loaded'], [])
+
+    def test_import_time_budget(self):
+        # Best of three, so one slow run on a busy machine doesn't fail the build
+        seconds = min(self.probe()['seconds'] for _ in range(3))
+        self.assertLess(seconds, IMPORT_BUDGET, f'import app + create_app() took {seconds:.2f}s')
+
+if __name__ == '__main__':
+    unittest.main()
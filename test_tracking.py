@@ -0,0 +1,84 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+
+from app import app, init_db
+from extensions import db
+from models import GeneratedEmail
+from email_store import EmailWriter
+from tracking import EventBuffer, event_buffer, events_dropped_total, tracking_pixel_url, track_links
+
+class TestTracking(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            init_db()
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with app.app_context():
+            writer = EmailWriter()
+            writer.add('Tracking task', 'track@example.com', 'Tess',
+                       {'subject': 'Tracked', 'body': 'Dear Tess, see https://example.com/a. Regards', 'tone': 'formal'})
+            self.email_id, = writer.flush()
+
+    def counters(self):
+        with app.app_context():
+            email = db.session.get(GeneratedEmail, self.email_id)
+            return email.opens, email.clicks
+
+    def test_pixel_and_click_are_counted_in_batches(self):
+        with app.test_request_context():
+            pixel = tracking_pixel_url(self.email_id)
+            body = track_links('Details: https://example.com/report?id=1 thanks', self.email_id)
+        link = body.split()[1]
+
+        for _ in range(3):
+            response = self.client.get(pixel)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'image/gif')
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], 'https://example.com/report?id=1')
+
+        event_buffer.flush()
+        self.assertEqual(self.counters(), (3, 1))
+
+    def test_sent_emails_carry_tracked_links_and_the_pixel(self):
+        with mock.patch('utils.get_smtp_credentials', return_value=('sender@example.com', 'secret')), \
+                mock.patch('utils.get_smtp_pool') as get_pool:
+            response = self.client.post('/send-email', json={
+                'email': 'track@example.com', 'subject': 'Tracked',
+                'body': 'See https://example.com/a', 'email_id': self.email_id
+            })
+        self.assertEqual(response.status_code, 200)
+        message = get_pool.return_value.send.call_args[0][0]
+        plain, html = [part.get_payload(decode=True).decode() for part in message.get_payload()]
+        self.assertIn('/t/c/', plain)
+        self.assertNotIn('https://example.com/a', plain)
+        self.assertIn('/t/o/', html)
+        self.assertIn('<a href="http://localhost/t/c/', html)
+
+        self.client.get(html.split('<img src="', 1)[1].split('"', 1)[0])
+        event_buffer.flush()
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_forged_tokens_are_ignored(self):
+        self.assertEqual(self.client.get('/t/o/forged.gif').status_code, 200)
+        self.assertEqual(self.client.get('/t/c/forged').status_code, 404)
+        event_buffer.flush()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_full_buffer_drops_instead_of_blocking(self):
+        buffer = EventBuffer(maxsize=2)
+        buffer._thread = object()  # keep the flusher from draining the queue
+        results = [buffer.record(self.email_id, 'open') for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertIn('# TYPE tracking_events_dropped_total counter', events_dropped_total.render())
+
+if __name__ == '__main__':
+    unittest.main()
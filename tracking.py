@@ -0,0 +1,200 @@
+import os
+import re
+import html
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from flask import Blueprint, Response, abort, current_app, redirect, request, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Event buffering
+TRACKING_ENABLED = os.environ.get("TRACKING_ENABLED", "true").lower() in ("1", "true", "yes")
+QUEUE_SIZE = int(os.environ.get("TRACKING_QUEUE_SIZE", "10000"))  # events held in memory before new ones are dropped
+FLUSH_SIZE = int(os.environ.get("TRACKING_FLUSH_SIZE", "500"))  # events per batched insert
+FLUSH_INTERVAL = float(os.environ.get("TRACKING_FLUSH_INTERVAL", "1.0"))  # seconds before a partial batch is written
+TOKEN_SALT = 'email-tracking'
+
+# Instrumentation (see metrics.py)
+events_dropped_total = metrics.counter('tracking_events_dropped_total', 'Tracking events dropped because the buffer was full.')
+
+# 1x1 transparent GIF
+PIXEL = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+URL_PATTERN = re.compile(r'https?://[^\s<>"\')\]]+')
+
+tracking_bp = Blueprint('tracking', __name__)
+
+class EventBuffer:
+    """
+    Bounded in-memory queue of tracking events drained by a background flusher.
+
+    record() never blocks: when the queue is full the event is dropped and counted, so a
+    burst of pixel hits cannot stall web workers on the database. The flusher writes a
+    batch once FLUSH_SIZE events are waiting or FLUSH_INTERVAL seconds have passed, using
+    rollups.record_events (one bulk insert plus aggregated counter updates per batch).
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE, flush_size: int = FLUSH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max(1, maxsize))
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "dropped": 0, "flushed": 0, "failed": 0}
+
+    def init_app(self, app) -> None:
+        self._app = app
+
+    def record(self, email_id: int, event_type: str, metadata: Optional[Dict] = None) -> bool:
+        """Queue an event without waiting; returns False if it was dropped."""
+        try:
+            self._queue.put_nowait({
+                'email_id': email_id,
+                'event_type': event_type,
+                'timestamp': datetime.utcnow(),
+                'event_metadata': metadata
+            })
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            events_dropped_total.inc()
+            return False
+        with self._lock:
+            self._stats["recorded"] += 1
+        self._ensure_flusher()
+        return True
+
+    def flush(self) -> None:
+        """Write every queued event now, waiting for batches the flusher is already writing."""
+        while True:
+            batch = self._take(self.flush_size, timeout=0)
+            if not batch:
+                break
+            self._write(batch)
+        self._queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._flush_loop, name='tracking-flusher', daemon=True)
+                    self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            batch = self._take(self.flush_size, timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def _take(self, limit: int, timeout: float) -> List[Dict]:
+        """Collect up to limit events, waiting at most timeout seconds after the first one."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + timeout
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict]) -> None:
+        from rollups import record_events
+
+        try:
+            if self._app is None:
+                raise RuntimeError("event buffer has no app")
+            with self._app.app_context():
+                record_events(batch)
+            with self._lock:
+                self._stats["flushed"] += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} tracking events: {str(e)}")
+            with self._lock:
+                self._stats["failed"] += len(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+event_buffer = EventBuffer()
+
+metrics.gauge('tracking_events_queued', 'Tracking events waiting to be written.', lambda: event_buffer.stats()["queued"])
+
+@atexit.register
+def _flush_on_exit() -> None:
+    event_buffer.flush()
+
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.secret_key, salt=TOKEN_SALT)
+
+def tracking_pixel_url(email_id: int) -> str:
+    """Absolute, signed URL of the open-tracking pixel for an email (needs a request context)."""
+    return url_for('tracking.open_pixel', token=_serializer().dumps(email_id), _external=True)
+
+def tracked_link(email_id: int, url: str) -> str:
+    """Absolute, signed click-tracking URL that redirects to url."""
+    return url_for('tracking.click', token=_serializer().dumps([email_id, url]), _external=True)
+
+def track_links(body: str, email_id: int) -> str:
+    """Rewrite every http(s) link in a plain-text body to its click-tracking URL."""
+    if not TRACKING_ENABLED:
+        return body
+    return URL_PATTERN.sub(lambda match: tracked_link(email_id, match.group(0)), body)
+
+def tracked_html(body: str, email_id: int) -> Optional[str]:
+    """
+    HTML alternative of a plain-text body (its links already tracked) that loads the
+    open-tracking pixel; None when tracking is disabled. Needs a request context.
+    """
+    if not TRACKING_ENABLED:
+        return None
+    text = URL_PATTERN.sub(lambda match: f'<a href="{match.group(0)}">{match.group(0)}</a>', html.escape(body, quote=False))
+    pixel = html.escape(tracking_pixel_url(email_id))
+    return (
+        f'<html><body><div style="white-space: pre-wrap">{text}</div>'
+        f'<img src="{pixel}" width="1" height="1" alt=""></body></html>'
+    )
+
+@tracking_bp.route('/t/o/<token>.gif')
+def open_pixel(token):
+    try:
+        email_id = int(_serializer().loads(token))
+        event_buffer.record(email_id, 'open', {'user_agent': request.user_agent.string})
+    except (BadSignature, TypeError, ValueError):
+        pass  # Always serve the pixel; forged tokens are simply not counted
+    return Response(PIXEL, mimetype='image/gif', headers={
+        'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0',
+        'Pragma': 'no-cache'
+    })
+
+@tracking_bp.route('/t/c/<token>')
+def click(token):
+    try:
+        email_id, url = _serializer().loads(token)
+        email_id = int(email_id)
+    except (BadSignature, TypeError, ValueError):
+        abort(404)
+    if not URL_PATTERN.fullmatch(url):
+        abort(404)
+    event_buffer.record(email_id, 'click', {'url': url, 'user_agent': request.user_agent.string})
+    return redirect(url, code=302)
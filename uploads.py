@@ -0,0 +1,34 @@
+import io
+import os
+import tempfile
+from typing import IO
+from flask import Request
+from werkzeug.datastructures import FileStorage
+
+# Uploads up to this size stay in memory; larger ones roll over to an anonymous temp file
+SPOOL_MAX_SIZE = int(os.environ.get("UPLOAD_SPOOL_MAX_SIZE", str(8 * 1024 * 1024)))
+
+class UploadRequest(Request):
+    """
+    Request whose file parts are parsed straight into SpooledTemporaryFiles.
+
+    Each upload gets its own spool, so concurrent uploads never share a path and small
+    files are read back from memory without touching the disk.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None) -> IO[bytes]:
+        return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='rb+')
+
+def take_upload(file: FileStorage) -> IO[bytes]:
+    """
+    Detach an uploaded file's stream from the request, rewound to the start.
+
+    The request closes its files when it ends; the detached stream stays open so it can be
+    handed to a streaming response or a background job, which must close it. Queued jobs
+    keep their uploads in memory, which is why the job queue is bounded (see
+    jobs.MAX_PENDING_JOBS).
+    """
+    stream = file.stream
+    file.stream = io.BytesIO()  # closed with the request instead
+    stream.seek(0)
+    return stream
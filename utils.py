@@ -1,81 +1,125 @@
 import os
-import smtplib
 import re
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from smtp_pool import get_smtp_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def iter_bounded(func: Callable[[Any], Any], items: Iterable[Any], max_in_flight: int) -> Iterator[Tuple[int, Any, Optional[Exception]]]:
+    """
+    Run func over items on a thread pool with at most max_in_flight calls pending.
+    
+    Items are pulled from the iterable lazily, so generators are never materialized
+    ahead of the workers. Results are yielded in completion order. Each call runs in a
+    copy of the caller's context, so context variables (e.g. per-request upstream
+    timings) carry over to the worker threads.
+    
+    Args:
+        func: Callable applied to each item
+        items: Iterable of inputs
+        max_in_flight: Maximum number of calls running or queued at once
+    
+    Yields:
+        Tuples of (index, result, error); error is None on success and result is
+        None on failure
+    """
+    max_in_flight = max(1, int(max_in_flight))
+    iterator = iter(enumerate(items))
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    
+    try:
+        while True:
+            while len(pending) < max_in_flight:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    break
+                pending[executor.submit(contextvars.copy_context().run, func, item)] = index
+            
+            if not pending:
+                return
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                result = None if error else future.result()
+                yield index, result, error
+    finally:
+        # If the consumer stopped early, drop queued work and don't wait for calls in flight
+        executor.shutdown(wait=not pending, cancel_futures=True)
+
 def validate_email(email: str) -> bool:
     """Validate email address format."""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
 
-def send_email(recipient_email: str, subject: str, body: str) -> None:
-    """Send email using SMTP with enhanced error handling and validation."""
-    # Validate credentials
+def get_smtp_credentials() -> Tuple[str, str]:
+    """Return the configured SMTP username and password."""
     smtp_username = os.environ.get('SMTP_USERNAME')
     smtp_password = os.environ.get('SMTP_PASSWORD')
     
     if not smtp_username or not smtp_password:
         raise ValueError("SMTP credentials not configured")
-    
-    # Validate email address
+    return smtp_username, smtp_password
+
+def build_message(sender: str, recipient_email: str, subject: str, body: str, html: Optional[str] = None) -> MIMEMultipart:
+    """Validate the recipient and build a plain-text message, with an HTML alternative if html is given."""
     if not validate_email(recipient_email):
         raise ValueError(f"Invalid recipient email address: {recipient_email}")
     
-    # Create message
-    msg = MIMEMultipart()
-    msg['From'] = smtp_username
+    msg = MIMEMultipart('alternative') if html is not None else MIMEMultipart()
+    msg['From'] = sender
     msg['To'] = recipient_email
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
+    if html is not None:
+        msg.attach(MIMEText(html, 'html'))
+    return msg
+
+def send_email(recipient_email: str, subject: str, body: str, html: Optional[str] = None) -> None:
+    """Send email over the pooled SMTP connections with enhanced error handling and validation."""
+    smtp_username, smtp_password = get_smtp_credentials()
+    msg = build_message(smtp_username, recipient_email, subject, body, html)
     
-    server = None
-    try:
-        # Connect to SMTP server with enhanced configuration
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.ehlo()  # Initial EHLO
-        server.starttls()  # Enable TLS
-        server.ehlo()  # Second EHLO after TLS
-        
-        # Attempt login
-        try:
-            server.login(smtp_username, smtp_password)
-        except smtplib.SMTPAuthenticationError:
-            logger.error("SMTP authentication failed")
-            raise ValueError("Failed to authenticate with SMTP server. Please check your credentials.")
-        
-        # Send email
-        try:
-            server.send_message(msg)
-            logger.info(f"Email sent successfully to {recipient_email}")
-        except smtplib.SMTPRecipientsRefused:
-            logger.error(f"Recipient refused: {recipient_email}")
-            raise ValueError("Email was refused by recipient server")
-        except smtplib.SMTPSenderRefused:
-            logger.error("Sender address refused")
-            raise ValueError("Sender email address was refused")
-        except smtplib.SMTPDataError as e:
-            logger.error(f"SMTP data error: {str(e)}")
-            raise ValueError(f"Error sending email data: {str(e)}")
-        
-    except smtplib.SMTPConnectError:
-        logger.error("Failed to connect to SMTP server")
-        raise ValueError("Could not connect to email server")
-    except smtplib.SMTPServerDisconnected:
-        logger.error("Server disconnected unexpectedly")
-        raise ValueError("Email server disconnected unexpectedly")
-    except Exception as e:
-        logger.error(f"Unexpected error while sending email: {str(e)}")
-        raise ValueError(f"Failed to send email: {str(e)}")
-    finally:
-        # Ensure server is properly closed
-        if server is not None:
-            try:
-                server.quit()
-            except Exception as e:
-                logger.warning(f"Error while closing SMTP connection: {str(e)}")
+    get_smtp_pool(smtp_username, smtp_password).send(msg)
+    logger.info(f"Email sent successfully to {recipient_email}")
+
+def send_emails(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Send a batch of emails over the pooled SMTP connections.
+    
+    Args:
+        messages: List of dicts with 'email', 'subject' and 'body' keys and an optional
+            'html' alternative of the body
+    
+    Returns:
+        Per-recipient results in input order, each with 'email', 'status' ('sent' or
+        'failed') and, for failures, 'error'
+    """
+    smtp_username, smtp_password = get_smtp_credentials()
+    pool = get_smtp_pool(smtp_username, smtp_password)
+    
+    def send(message: Dict[str, str]) -> None:
+        missing = [key for key in ('email', 'subject', 'body') if not message.get(key)]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        pool.send(build_message(smtp_username, message['email'], message['subject'], message['body'], message.get('html')))
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    for index, _, error in iter_bounded(send, messages, pool.size):
+        recipient = messages[index].get('email')
+        if error is None:
+            logger.info(f"Email sent successfully to {recipient}")
+            results[index] = {'email': recipient, 'status': 'sent'}
+        else:
+            results[index] = {'email': recipient, 'status': 'failed', 'error': str(error)}
+    return results